@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from tracing import span
+
+# Column layout of the .aligned.pqt files written by `chai-lab a3m-to-pqt`
+PQT_SCHEMA = pa.schema([
+    ("sequence", pa.string()),
+    ("source_database", pa.string()),
+    ("pairing_key", pa.string()),
+    ("comment", pa.string()),
+])
+
+
+def iter_a3m_records(a3m_path):
+    """
+    Stream (header, sequence) pairs from an A3M file without reading it all into memory.
+    """
+    header = None
+    seq_data = []
+    with open(a3m_path, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            if line.startswith('>'):
+                if header is not None:
+                    yield header, "".join(seq_data)
+                header = line[1:].rstrip("\n")
+                seq_data = []
+            else:
+                seq_data.append(line.strip())
+    if header is not None:
+        yield header, "".join(seq_data)
+
+
+def pqt_name(query_sequence):
+    """
+    File name chai expects for the MSA of a query sequence.
+    """
+    return hashlib.sha256(query_sequence.upper().encode()).hexdigest() + ".aligned.pqt"
+
+
+def a3m_to_pqt(a3m_dir, output_dir=None, row_group_size=8192):
+    """
+    Convert the A3M files of one chain into a single .aligned.pqt file.
+
+    Equivalent to `chai-lab a3m-to-pqt <a3m_dir>`: every *.a3m in a3m_dir is an
+    alignment against the database named by its file stem, the query row is
+    written once with source_database "query", and the file is named after the
+    SHA-256 of the query. Records are streamed and written one row group at a
+    time, so memory use is bounded by row_group_size rather than alignment depth.
+
+    :param a3m_dir: Directory containing the A3M file(s) of one chain
+    :param output_dir: Directory to write the .aligned.pqt into (default: a3m_dir)
+    :param row_group_size: Number of rows buffered per Parquet row group
+    :return: Path of the written .aligned.pqt file
+    """
+    a3m_dir = Path(a3m_dir)
+    output_dir = Path(output_dir) if output_dir else a3m_dir
+    a3m_files = sorted(a3m_dir.glob("*.a3m"))
+    if not a3m_files:
+        raise FileNotFoundError(f"No .a3m files found in {a3m_dir}.")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".pqt.tmp", dir=output_dir)
+    os.close(fd)
+    tmp_path = Path(tmp_path)
+    columns = {name: [] for name in PQT_SCHEMA.names}
+    query = None
+    rows = 0
+
+    def append(sequence, source_database, comment):
+        nonlocal rows
+        rows += 1
+        columns["sequence"].append(sequence)
+        columns["source_database"].append(source_database)
+        columns["pairing_key"].append("")
+        columns["comment"].append(comment)
+
+    def flush(writer):
+        if columns["sequence"]:
+            writer.write_batch(pa.record_batch([columns[name] for name in PQT_SCHEMA.names], schema=PQT_SCHEMA))
+            for values in columns.values():
+                values.clear()
+
+    try:
+        with span(str(a3m_dir), "a3m_to_pqt") as fields, pq.ParquetWriter(tmp_path, PQT_SCHEMA) as writer:
+            for a3m_file in a3m_files:
+                source_database = a3m_file.stem
+                for i, (header, sequence) in enumerate(iter_a3m_records(a3m_file)):
+                    if i == 0:
+                        # Every A3M starts with the query; keep it once for the whole file
+                        if query is None:
+                            query = sequence
+                            append(sequence, "query", header)
+                        elif sequence != query:
+                            raise ValueError(f"Query of {a3m_file} does not match the query of {a3m_files[0]}.")
+                        continue
+                    append(sequence, source_database, header)
+                    if len(columns["sequence"]) >= row_group_size:
+                        flush(writer)
+            flush(writer)
+            fields["rows"] = rows
+
+        if query is None:
+            raise ValueError(f"No sequences found in the .a3m files of {a3m_dir}.")
+        pqt_path = output_dir / pqt_name(query)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates the file owner-only
+        os.replace(tmp_path, pqt_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    return pqt_path
+
+
+def convert_a3m_dirs(a3m_dirs, output_dir=None, max_workers=None, row_group_size=8192):
+    """
+    Convert many chains with a3m_to_pqt() concurrently inside this process.
+
+    :return: List of .aligned.pqt paths in the same order as a3m_dirs
+    """
+    a3m_dirs = list(a3m_dirs)
+    if not a3m_dirs:
+        return []
+    max_workers = max_workers or min(len(a3m_dirs), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(a3m_to_pqt, a3m_dir, output_dir, row_group_size) for a3m_dir in a3m_dirs]
+        return [future.result() for future in futures]
+
+
+def compare_pqt(path_a, path_b, max_report=10):
+    """
+    Compare two .aligned.pqt files column by column and row by row.
+
+    :return: Dict with "identical_bytes", "schema_equal", "rows" and "mismatched_rows"
+             (the first max_report differing row indices)
+    """
+    with open(path_a, 'rb') as fa, open(path_b, 'rb') as fb:
+        identical_bytes = fa.read() == fb.read()
+    table_a = pq.read_table(path_a)
+    table_b = pq.read_table(path_b)
+    report = {
+        "identical_bytes": identical_bytes,
+        "schema_equal": table_a.schema.remove_metadata().equals(table_b.schema.remove_metadata()),
+        "rows": (table_a.num_rows, table_b.num_rows),
+        "mismatched_rows": [],
+    }
+    if report["schema_equal"] and table_a.num_rows == table_b.num_rows:
+        mismatch = None
+        for name in PQT_SCHEMA.names:
+            differs = pc.fill_null(pc.not_equal(table_a.column(name), table_b.column(name)), True)
+            mismatch = differs if mismatch is None else pc.or_(mismatch, differs)
+        indices = pc.indices_nonzero(mismatch)
+        report["mismatched_rows"] = indices.slice(0, max_report).to_pylist()
+        report["num_mismatched_rows"] = len(indices)
+    return report
+
+
+def main():
+    # Same as `python cli.py convert ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["convert"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
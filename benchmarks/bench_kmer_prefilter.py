@@ -0,0 +1,114 @@
+"""
+Benchmark the k-mer prefilter on a synthetic database of families among decoys.
+
+For each seed and min_shared setting this reports the index build time and
+size, and per query the recall of the family members, the fraction of the
+database kept and the prefilter time. When jackhmmer is on the PATH, each
+query is also searched against the full database and against its subset, and
+the recall is then measured against the hits of the full search.
+
+    python benchmarks/bench_kmer_prefilter.py [--families 20 --decoys 20000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from kmer_index import KmerIndex, build_kmer_index, evaluate  # noqa: E402
+from synthetic import synthetic_database, write_fasta  # noqa: E402
+
+SETTINGS = [
+    {"seed": "1111", "min_shared": 2},
+    {"seed": "1111", "min_shared": 4},
+    {"seed": "11011", "min_shared": 2},
+    {"seed": "11011", "min_shared": 4},
+    {"seed": "110101", "min_shared": 3},
+]
+
+
+def jackhmmer(query_fasta, database_fasta, work_dir, iterations=1, cpus=1):
+    """
+    Run jackhmmer and return (seconds, set of hit names).
+    """
+    table = Path(tempfile.mkstemp(dir=work_dir, suffix=".tbl")[1])
+    start = time.perf_counter()
+    subprocess.run(["jackhmmer", "-N", str(iterations), "--cpu", str(cpus), "--noali", "--tblout", str(table),
+                    str(query_fasta), str(database_fasta)], check=True, stdout=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    hits = set()
+    for line in table.read_text().splitlines():
+        if not line.startswith("#"):
+            hits.add(line.split()[0])
+    return seconds, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--decoys", type=int, default=20000)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    use_jackhmmer = shutil.which("jackhmmer") is not None
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        database = Path(work_dir) / "db.fasta"
+        queries = synthetic_database(database, families=args.families, members=args.members, decoys=args.decoys)
+
+        # Ground truth: the family members, or what jackhmmer finds in the full database
+        full_seconds = {}
+        if use_jackhmmer:
+            for i, (name, sequence, _) in enumerate(queries):
+                query_fasta = Path(work_dir) / f"{name}.fasta"
+                write_fasta(query_fasta, [(name, sequence)])
+                full_seconds[name], hits = jackhmmer(query_fasta, database, work_dir)
+                queries[i] = (name, sequence, hits)
+
+        for settings in SETTINGS:
+            index_dir = Path(work_dir) / f"index_{settings['seed']}"
+            if not index_dir.exists():
+                build_kmer_index(database, index_dir, seed=settings["seed"])
+            index = KmerIndex(index_dir, min_shared=settings["min_shared"])
+            index_bytes = sum(os.path.getsize(index_dir / name) for name in os.listdir(index_dir))
+            for report in evaluate(index, queries):
+                report.update(settings=settings, build_seconds=index.meta["build_seconds"], index_bytes=index_bytes)
+                if use_jackhmmer:
+                    subset = Path(work_dir) / f"{report['query']}.candidates.fasta"
+                    index.write_subset(next(s for n, s, _ in queries if n == report["query"]), subset)
+                    report["full_search_seconds"] = full_seconds[report["query"]]
+                    report["subset_search_seconds"], _ = jackhmmer(Path(work_dir) / f"{report['query']}.fasta",
+                                                                   subset, work_dir)
+                results.append(report)
+
+    print()
+    print(f"Ground truth: {'jackhmmer hits in the full database' if use_jackhmmer else 'family members'}")
+    print("{:<8} {:>10} {:>9} {:>10} {:>11} {:>11} {:>11} {:>10}".format(
+        "seed", "min shared", "build s", "index MB", "mean recall", "min recall", "db fraction", "query ms"))
+    for settings in SETTINGS:
+        rows = [r for r in results if r["settings"] == settings]
+        recalls = [r["recall"] for r in rows if r["recall"] is not None]
+        print("{:<8} {:>10} {:>9.2f} {:>10.1f} {:>11.3f} {:>11.3f} {:>11.4f} {:>10.2f}".format(
+            settings["seed"], settings["min_shared"], rows[0]["build_seconds"], rows[0]["index_bytes"] / 2 ** 20,
+            sum(recalls) / len(recalls), min(recalls), sum(r["fraction_of_database"] for r in rows) / len(rows),
+            1000 * sum(r["query_seconds"] for r in rows) / len(rows)))
+        if use_jackhmmer:
+            full = sum(r["full_search_seconds"] for r in rows)
+            subset = sum(r["subset_search_seconds"] for r in rows)
+            print(f"         jackhmmer {full:.1f} s on the full database, {subset:.1f} s on the subsets")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark MSA depth reduction on the Cetuximab A3Ms shipped with the repo.
+
+For each A3M and filter setting this reports the depth before and after each
+filtering step, the filtering time, and the .aligned.pqt size and conversion
+time with and without filtering.
+
+    python benchmarks/bench_msa_filter.py [--json results.json]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from a3m_to_pqt import a3m_to_pqt  # noqa: E402
+from msa_filter import filter_a3m  # noqa: E402
+
+A3M_FILES = [
+    REPO_DIR / "Cetuximab_heavy_chain_only" / "uniref90.a3m",
+    REPO_DIR / "Cetuximab_light_chain" / "uniref90.a3m",
+]
+
+SETTINGS = [
+    {"max_identity": 1.0},
+    {"max_identity": 0.9},
+    {"max_identity": 0.9, "min_coverage": 0.5},
+    {"max_identity": 0.8, "min_coverage": 0.5},
+    {"max_identity": 0.9, "min_coverage": 0.5, "max_depth": 2048},
+]
+
+
+def convert(a3m_path, work_dir):
+    a3m_dir = Path(tempfile.mkdtemp(dir=work_dir))
+    (a3m_dir / "uniref90.a3m").symlink_to(Path(a3m_path).resolve())
+    start = time.perf_counter()
+    pqt_path = a3m_to_pqt(a3m_dir)
+    return time.perf_counter() - start, pqt_path.stat().st_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for a3m_path in A3M_FILES:
+            base_seconds, base_bytes = convert(a3m_path, work_dir)
+            for settings in SETTINGS:
+                filtered_path = Path(tempfile.mkdtemp(dir=work_dir)) / "uniref90.a3m"
+                report = filter_a3m(a3m_path, filtered_path, **settings)
+                pqt_seconds, pqt_bytes = convert(filtered_path, work_dir)
+                report.update(settings=settings, pqt_bytes_before=base_bytes, pqt_bytes_after=pqt_bytes,
+                              convert_seconds_before=base_seconds, convert_seconds_after=pqt_seconds)
+                results.append(report)
+
+    print()
+    print("{:<28} {:<62} {:>7} {:>7} {:>9} {:>10} {:>10}".format(
+        "a3m", "settings", "depth", "kept", "filter s", "pqt KB", "pqt KB"))
+    for r in results:
+        print("{:<28} {:<62} {:>7} {:>7} {:>9.2f} {:>10.0f} {:>10.0f}".format(
+            Path(r["a3m"]).parent.name, json.dumps(r["settings"]), r["input"], r["output"],
+            r["filter_seconds"], r["pqt_bytes_before"] / 1024, r["pqt_bytes_after"] / 1024))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
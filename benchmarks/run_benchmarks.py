@@ -0,0 +1,158 @@
+"""
+Time the pipeline stages on synthetic inputs, without TGT or a GPU.
+
+MSA search and inference are replaced by the stand-ins in benchmarks/stubs
+(A3M_TGT_Gen.sh, chai-lab and chai_lab.chai1.run_inference) with configurable
+latency, so the numbers measure the pipeline's own overhead: splitting FASTA
+files, a3m -> pqt conversion, file staging and end-to-end throughput.
+
+    python benchmarks/run_benchmarks.py [--scales small medium] [--json results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+STUB_DIR = REPO_DIR / "benchmarks" / "stubs"
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(STUB_DIR))  # chai_lab stand-in, inherited by the spawned inference worker
+
+from a3m_to_pqt import a3m_to_pqt, convert_a3m_dirs  # noqa: E402
+from inference_worker import InferenceWorker  # noqa: E402
+from msa_scheduler import run_msa_jobs  # noqa: E402
+from pipeline import run_pipeline  # noqa: E402
+from synthetic import read_query, synthetic_fastas, write_a3m  # noqa: E402
+from tgt_to_chai import finalize_complex, plan_fasta_files, split_fasta  # noqa: E402
+
+SCALES = {
+    "small": {"files": 4, "chains": 2, "min_length": 110, "max_length": 250, "depth": 500},
+    "medium": {"files": 16, "chains": 2, "min_length": 110, "max_length": 450, "depth": 2000},
+    "large": {"files": 64, "chains": 3, "min_length": 110, "max_length": 450, "depth": 8000},
+}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def bench_split(fasta_paths, work_dir):
+    output_dir = Path(work_dir) / "split"
+    output_dir.mkdir()
+    seconds, chains = timed(lambda: sum(len(split_fasta(str(path), str(output_dir))) for path in fasta_paths))
+    return {"seconds": seconds, "files": len(fasta_paths), "chains": chains}
+
+
+def bench_a3m_to_pqt(fasta_paths, work_dir, depth):
+    # One <chain>/uniref90.a3m directory per chain, as prepare_complex() lays them out
+    split_dir = Path(work_dir) / "split"
+    a3m_dirs = []
+    for i, chain_fasta in enumerate(sorted(split_dir.glob("*.fasta"))):
+        a3m_dir = Path(work_dir) / "a3m" / chain_fasta.stem
+        a3m_dir.mkdir(parents=True)
+        write_a3m(a3m_dir / "uniref90.a3m", read_query(chain_fasta), depth, seed=i)
+        a3m_dirs.append(a3m_dir)
+    a3m_bytes = sum((a3m_dir / "uniref90.a3m").stat().st_size for a3m_dir in a3m_dirs)
+
+    serial_seconds, _ = timed(lambda: [a3m_to_pqt(a3m_dir, Path(work_dir) / "pqt_serial") for a3m_dir in a3m_dirs])
+    threaded_seconds, _ = timed(convert_a3m_dirs, a3m_dirs, Path(work_dir) / "pqt_threaded")
+    # One CLI process per chain, as chai_run.py used to do
+    cli_seconds, _ = timed(lambda: [subprocess.run([str(STUB_DIR / "chai-lab"), "a3m-to-pqt", str(a3m_dir),
+                                                    "--output-directory", str(Path(work_dir) / "pqt_cli")],
+                                                   check=True, stdout=subprocess.DEVNULL) for a3m_dir in a3m_dirs])
+    return {
+        "chains": len(a3m_dirs),
+        "depth": depth,
+        "a3m_bytes": a3m_bytes,
+        "serial_seconds": serial_seconds,
+        "threaded_seconds": threaded_seconds,
+        "cli_seconds": cli_seconds,
+        "serial_mb_per_second": a3m_bytes / 1e6 / serial_seconds,
+    }
+
+
+def bench_staging(fasta_paths, work_dir):
+    input_dir = Path(work_dir) / "staging"
+    input_dir.mkdir()
+    for path in fasta_paths:
+        (input_dir / path.name).write_bytes(path.read_bytes())
+    complexes = plan_fasta_files(str(input_dir))
+    run_msa_jobs([job for c in complexes for job in c["msa_jobs"]], script_path=str(STUB_DIR / "A3M_TGT_Gen.sh"))
+    seconds, _ = timed(lambda: [finalize_complex(c) for c in complexes])
+    return {"seconds": seconds, "complexes": len(complexes)}
+
+
+def bench_end_to_end(fasta_paths, work_dir, total_cpus):
+    input_dir = Path(work_dir) / "end_to_end"
+    input_dir.mkdir()
+    for path in fasta_paths:
+        (input_dir / path.name).write_bytes(path.read_bytes())
+    seconds, results = timed(run_pipeline, str(input_dir), total_cpus=total_cpus,
+                             script_path=str(STUB_DIR / "A3M_TGT_Gen.sh"), worker_factory=InferenceWorker)
+    ok = sum(r["status"] == "ok" for r in results)
+    return {"seconds": seconds, "complexes": len(results), "ok": ok, "complexes_per_minute": 60 * ok / seconds}
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "-C", str(REPO_DIR), "describe", "--always", "--dirty"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=sorted(SCALES))
+    parser.add_argument("--msa-seconds", type=float, default=0.0, help="Latency of the stub MSA search per chain")
+    parser.add_argument("--inference-seconds", type=float, default=0.0, help="Latency of the stub inference per complex")
+    parser.add_argument("--total-cpus", type=int, default=None, help="CPU budget for the MSA stage")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    os.environ["STUB_MSA_SECONDS"] = str(args.msa_seconds)
+    os.environ["STUB_INFERENCE_SECONDS"] = str(args.inference_seconds)
+    report = {
+        "version": git_version(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "scales": {},
+    }
+    for name in args.scales:
+        scale = SCALES[name]
+        os.environ["STUB_MSA_DEPTH"] = str(scale["depth"])
+        with tempfile.TemporaryDirectory() as work_dir:
+            fasta_paths = synthetic_fastas(Path(work_dir) / "input", scale["files"], scale["chains"],
+                                           scale["min_length"], scale["max_length"])
+            report["scales"][name] = {
+                "scale": scale,
+                "split_fasta": bench_split(fasta_paths, work_dir),
+                "a3m_to_pqt": bench_a3m_to_pqt(fasta_paths, work_dir, scale["depth"]),
+                "staging": bench_staging(fasta_paths, work_dir),
+                "end_to_end": bench_end_to_end(fasta_paths, work_dir, args.total_cpus),
+            }
+
+    print()
+    print("{:<8} {:>9} {:>12} {:>12} {:>12} {:>10} {:>12}".format(
+        "scale", "split s", "pqt serial", "pqt thread", "pqt cli", "staging s", "complex/min"))
+    for name, r in report["scales"].items():
+        print("{:<8} {:>9.3f} {:>12.2f} {:>12.2f} {:>12.2f} {:>10.3f} {:>12.1f}".format(
+            name, r["split_fasta"]["seconds"], r["a3m_to_pqt"]["serial_seconds"], r["a3m_to_pqt"]["threaded_seconds"],
+            r["a3m_to_pqt"]["cli_seconds"], r["staging"]["seconds"], r["end_to_end"]["complexes_per_minute"]))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
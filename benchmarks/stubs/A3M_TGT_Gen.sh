@@ -0,0 +1,21 @@
+#!/bin/bash
+# Stand-in for /home2/TGT_Package/A3M_TGT_Gen.sh: same flags, writes a synthetic
+# A3M next to the input FASTA after STUB_MSA_SECONDS (default 0).
+# STUB_MSA_DEPTH sets the number of rows (default 1000); chains whose FASTA name
+# matches the glob STUB_MSA_FAIL exit with an error instead.
+while getopts c:i:o:h:d:n: opt; do
+    case $opt in
+        c) CPUS=$OPTARG;;
+        i) INPUT=$OPTARG;;
+        o) OUTPUT=$OPTARG;;
+        h) PACKAGE=$OPTARG;;
+        d) DATABASE=$OPTARG;;
+        n) ITERATIONS=$OPTARG;;
+    esac
+done
+sleep "${STUB_MSA_SECONDS:-0}"
+if [[ -n "$STUB_MSA_FAIL" && "$(basename "$INPUT")" == $STUB_MSA_FAIL ]]; then
+    echo "stub failure for $INPUT" >&2
+    exit 1
+fi
+exec python "$(dirname "$0")/../synthetic.py" a3m -i "$INPUT" -o "${INPUT%.fasta}.a3m" --depth "${STUB_MSA_DEPTH:-1000}"
@@ -0,0 +1,44 @@
+"""
+Stand-in for chai_lab.chai1.run_inference with the same signature and return shape.
+
+Sleeps STUB_INFERENCE_SECONDS (default 0) plus STUB_INFERENCE_SECONDS_PER_KTOKEN2
+per (thousand tokens)^2, then writes empty pred.model_idx_*.cif files and
+scores.model_idx_*.npz files. Put benchmarks/stubs on PYTHONPATH to use it
+with inference_worker.chai_backend().
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+
+@dataclass
+class RankingData:
+    aggregate_score: float
+
+
+@dataclass
+class StructureCandidates:
+    cif_paths: list = field(default_factory=list)
+    ranking_data: list = field(default_factory=list)
+
+
+def run_inference(fasta_file, output_dir, use_esm_embeddings=True, msa_directory=None, use_msa_server=False,
+                  num_trunk_recycles=3, num_diffn_timesteps=200, seed=None, device=None, num_models=5, **kwargs):
+    tokens = sum(len(line.strip()) for line in Path(fasta_file).read_text().splitlines() if not line.startswith('>'))
+    time.sleep(float(os.environ.get("STUB_INFERENCE_SECONDS", 0))
+               + float(os.environ.get("STUB_INFERENCE_SECONDS_PER_KTOKEN2", 0)) * (tokens / 1000) ** 2)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    candidates = StructureCandidates()
+    for i in range(num_models):
+        cif_path = output_dir / f"pred.model_idx_{i}.cif"
+        cif_path.write_text("data_stub\n")
+        np.savez(output_dir / f"scores.model_idx_{i}.npz", aggregate_score=np.array([0.5]), ptm=np.array([0.5]),
+                 iptm=np.array([0.5]), has_inter_chain_clashes=np.array([False]))
+        candidates.cif_paths.append(cif_path)
+        candidates.ranking_data.append(RankingData(aggregate_score=0.5))
+    return candidates
@@ -0,0 +1,157 @@
+"""
+Synthetic inputs shaped like the Cetuximab files shipped with the repo.
+
+FASTA files hold several chains wrapped at 60 columns, and A3Ms start with a
+"#<length>\t1" line and the query as ">101", followed by hits with UniRef100
+style headers whose rows carry substitutions, gaps and lower-case insertions.
+
+    python benchmarks/synthetic.py fasta -o out_dir --files 8 --chains 2
+    python benchmarks/synthetic.py a3m -i chain.fasta -o chain.a3m --depth 2000
+    python benchmarks/synthetic.py database -o db.fasta --queries queries.fasta --families 20
+"""
+import argparse
+import random
+from pathlib import Path
+
+AMINO_ACIDS = "ARNDCQEGHILKMFPSTWYV"
+
+
+def random_sequence(length, rng):
+    return "".join(rng.choice(AMINO_ACIDS) for _ in range(length))
+
+
+def write_fasta(path, chains, width=60):
+    """
+    Write (name, sequence) pairs as a FASTA file wrapped at width columns.
+    """
+    with open(path, 'w') as f:
+        for name, sequence in chains:
+            f.write(f">{name}\n")
+            for i in range(0, len(sequence), width):
+                f.write(sequence[i:i + width] + "\n")
+
+
+def synthetic_fastas(output_dir, files=4, chains=2, min_length=110, max_length=450, seed=0):
+    """
+    Write files multi-chain FASTA files, one complex each.
+
+    :return: List of the written paths
+    """
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(files):
+        complex_chains = [(f"synthetic {i} chain {c}", random_sequence(rng.randint(min_length, max_length), rng))
+                          for c in range(chains)]
+        path = output_dir / f"synthetic_{i:04d}.fasta"
+        write_fasta(path, complex_chains)
+        paths.append(path)
+    return paths
+
+
+def synthetic_hit(query, identity, rng, gap_rate=0.03, insert_rate=0.01):
+    """
+    An A3M row aligned to query: match columns (upper case or '-') plus lower-case insertions.
+    """
+    row = []
+    for residue in query:
+        r = rng.random()
+        if r < gap_rate:
+            row.append("-")
+        elif rng.random() < identity:
+            row.append(residue)
+        else:
+            row.append(rng.choice(AMINO_ACIDS))
+        if rng.random() < insert_rate:
+            row.append(random_sequence(rng.randint(1, 4), rng).lower())
+    return "".join(row)
+
+
+def write_a3m(path, query, depth, seed=0, min_identity=0.3, max_identity=0.95):
+    """
+    Write an A3M with the query and depth - 1 hits of random identity to it.
+    """
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write(f"#{len(query)}\t1\n>101\n{query}\n")
+        for i in range(depth - 1):
+            identity = rng.uniform(min_identity, max_identity)
+            score = 1.0 / (1 + i)
+            f.write(f">UniRef100_SYN{i:08X}\t{len(query) + 10}\t{identity:.3f}\t{score:.3E}\t0\t{len(query) - 1}"
+                    f"\t{len(query)}\t0\t{len(query) - 1}\t{len(query)}\n")
+            f.write(synthetic_hit(query, identity, rng) + "\n")
+
+
+def synthetic_database(path, queries_path=None, families=20, members=50, decoys=5000, min_length=110,
+                       max_length=450, min_identity=0.3, max_identity=0.95, seed=0):
+    """
+    Write a search database of protein families hidden among unrelated decoys.
+
+    Each family has a random founder (the query) and members homologous to it
+    at random identity, with substitutions and short indels but no gaps, so a
+    full search should find exactly the members. Records are shuffled.
+
+    :param queries_path: Optional FASTA file the family founders are written to
+    :return: List of (query name, query sequence, set of member names)
+    """
+    rng = random.Random(seed)
+    records = []
+    queries = []
+    for f in range(families):
+        query = random_sequence(rng.randint(min_length, max_length), rng)
+        names = set()
+        for m in range(members):
+            hit = synthetic_hit(query, rng.uniform(min_identity, max_identity), rng)
+            name = f"SYNDB_F{f:04d}_M{m:04d}"
+            records.append((name, hit.replace("-", "").upper()))
+            names.add(name)
+        queries.append((f"family_{f:04d}", query, names))
+    for d in range(decoys):
+        records.append((f"SYNDB_DECOY_{d:07d}", random_sequence(rng.randint(min_length, max_length), rng)))
+    rng.shuffle(records)
+    write_fasta(path, records)
+    if queries_path is not None:
+        write_fasta(queries_path, [(name, query) for name, query, _ in queries])
+    return queries
+
+
+def read_query(fasta_path):
+    with open(fasta_path, 'r') as f:
+        return "".join(line.strip() for line in f if not line.startswith('>'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+    fasta = subparsers.add_parser("fasta", help="Write multi-chain FASTA files")
+    fasta.add_argument("-o", "--output-dir", required=True)
+    fasta.add_argument("--files", type=int, default=4)
+    fasta.add_argument("--chains", type=int, default=2)
+    fasta.add_argument("--min-length", type=int, default=110)
+    fasta.add_argument("--max-length", type=int, default=450)
+    fasta.add_argument("--seed", type=int, default=0)
+    a3m = subparsers.add_parser("a3m", help="Write an A3M for the sequence of a single-chain FASTA file")
+    a3m.add_argument("-i", "--input", required=True)
+    a3m.add_argument("-o", "--output", required=True)
+    a3m.add_argument("--depth", type=int, default=1000)
+    a3m.add_argument("--seed", type=int, default=0)
+    database = subparsers.add_parser("database", help="Write a search database of families among decoys")
+    database.add_argument("-o", "--output", required=True)
+    database.add_argument("--queries", help="Write the family founders to this FASTA file")
+    database.add_argument("--families", type=int, default=20)
+    database.add_argument("--members", type=int, default=50)
+    database.add_argument("--decoys", type=int, default=5000)
+    database.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.kind == "fasta":
+        synthetic_fastas(args.output_dir, args.files, args.chains, args.min_length, args.max_length, args.seed)
+    elif args.kind == "a3m":
+        write_a3m(args.output, read_query(args.input), args.depth, args.seed)
+    else:
+        synthetic_database(args.output, args.queries, args.families, args.members, args.decoys, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+"""
+Command line entry point of the pipeline.
+
+    python cli.py plan batch/                        # what is left to do, without doing any of it
+    python cli.py msa batch/                         # MSA search for every chain of every FASTA file
+    python cli.py predict batch/X_final_output ...   # convert the A3Ms of complexes and predict them
+    python cli.py run batch/                         # all stages overlapped, on every visible GPU
+    python cli.py pair --heavy H.fasta --light L.fasta -o pairs/   # every heavy x light combination
+    python cli.py variants parent.fasta mutations.txt -o screen/   # point mutants from the parent's MSAs
+    python cli.py queue submit|cpu-worker|inference-worker|status|local ...   # batches drained by many hosts
+
+and the tools behind them:
+
+    python cli.py convert a3m_dir/ ... [-o out/] [--compare test_output/]   # A3M -> .aligned.pqt
+    python cli.py msa-stats chain.a3m ...            # depth, coverage, Neff and gate route of A3Ms
+    python cli.py kmer build|query|evaluate ...      # k-mer prefilter of the MSA database
+    python cli.py coords write|verify store/ name pred.model_idx_*.cif
+    python cli.py results top|compact results/ ...
+    python cli.py cost [--recalibrate]               # inference cost model and its timing log
+    python cli.py supervise --tool msa --log job.log -- A3M_TGT_Gen.sh ...
+
+The modules these commands come from forward their own `python <module>.py`
+to the same command, so both spellings keep working.
+
+Heavy modules (numpy, pyarrow, torch, chai_lab) are imported only by the
+commands that need them, so `plan` and `--help` start instantly.
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+
+from msa_cache import DEFAULT_CACHE_DIR
+from msa_scheduler import TGT_SCRIPT
+from planner import plan_batch, print_plan
+
+
+def _cache(args):
+    from msa_cache import MSACache
+
+    return None if args.no_cache else MSACache(args.cache_dir)
+
+
+def _supervisor(args):
+    from supervisor import Supervisor
+
+    policy = {key: value for key, value in (("timeout", args.msa_timeout), ("retries", args.msa_retries))
+              if value is not None}
+    return Supervisor(policies={"msa": policy})
+
+
+def _msa_gate(args):
+    if args.min_neff is None and args.skip_below_neff is None:
+        return None
+    # Only the thresholds given apply; route_msa()'s default min_neff would otherwise drop MSAs unasked
+    return {"min_neff": args.min_neff or 0.0, "skip_below_neff": args.skip_below_neff}
+
+
+def _msa_filter(args):
+    options = {"max_identity": args.max_identity, "min_coverage": args.min_coverage, "max_depth": args.max_depth}
+    if all(value is None for value in options.values()):
+        return None
+    # Unset options keep filter_a3m()'s defaults
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _prefilter(args):
+    if not args.prefilter_index:
+        return None
+    from kmer_index import KmerIndex
+
+    return KmerIndex(args.prefilter_index, min_shared=args.min_shared, max_candidates=args.max_candidates)
+
+
+def plan_command(args):
+    start = time.perf_counter()
+    complexes = plan_batch(args.input_fasta_dir, cache_dir=None if args.no_cache else args.cache_dir,
+                           package=args.package, database=args.database, iterations=args.iterations)
+    if args.json:
+        print(json.dumps(complexes, indent=1))
+    else:
+        print_plan(complexes, verbose=args.verbose)
+        print(f"Planned in {time.perf_counter() - start:.3f} s")
+
+
+def _results_store(args):
+    if not args.results_dir:
+        return None
+    from results_store import ResultsStore
+
+    return ResultsStore(args.results_dir)
+
+
+def msa_command(args):
+    from tgt_to_chai import gather_outputs, process_fasta_files1
+
+    with _supervisor(args) as supervisor:
+        directory_list = process_fasta_files1(args.input_fasta_dir, cpu_num=args.cpu_num, package=args.package,
+                                              database=args.database, iterations=args.iterations,
+                                              total_cpus=args.total_cpus, script_path=args.script,
+                                              cache=_cache(args), prefilter=_prefilter(args),
+                                              supervisor=supervisor)
+    for directory in directory_list or []:
+        print(f"Ready for prediction: {directory}")
+    if args.gather_dir and directory_list:
+        gather_outputs(directory_list, args.gather_dir)
+
+
+def predict_command(args):
+    from inference_worker import InferenceWorker
+    from tgt_to_chai import process_fasta_files2
+
+    results_store = _results_store(args)
+    cache = _cache(args)
+    params = {"device": args.device} if args.device else None
+    policy = {"job_timeout": args.timeout} if args.timeout is not None else {}
+    with InferenceWorker(**policy) as worker:
+        for input_dir in args.input_dirs:
+            process_fasta_files2(input_dir, cache=cache, package=args.package, database=args.database,
+                                 iterations=args.iterations, worker=worker, msa_filter=_msa_filter(args),
+                                 msa_gate=_msa_gate(args), results_store=results_store, params=params)
+
+
+def run_command(args):
+    from cost_model import CostModel
+    from dispatcher import InferenceDispatcher
+    from pipeline import run_pipeline
+
+    stores = {"results_store": _results_store(args)}
+    if args.coords_dir:
+        from coord_store import CoordinateStore
+        stores["coordinate_store"] = CoordinateStore(args.coords_dir)
+
+    # MSA generation and inference overlap: every aligned complex is handed to the dispatcher, which starts
+    # the waiting ones longest predicted first on whichever GPU has room
+    dispatcher = InferenceDispatcher(cost_model=CostModel.load(), workers_per_device=args.workers_per_device,
+                                     token_budget=args.token_budget)
+    with dispatcher, _supervisor(args) as supervisor:
+        run_pipeline(input_fasta_dir=args.input_fasta_dir, cpu_num=args.cpu_num, total_cpus=args.total_cpus,
+                     script_path=args.script, package=args.package, database=args.database,
+                     iterations=args.iterations, cache=_cache(args), worker=dispatcher,
+                     trace_dir=args.trace_dir, msa_filter=_msa_filter(args), msa_gate=_msa_gate(args),
+                     prefilter=_prefilter(args), supervisor=supervisor, **stores)
+
+
+def pair_command(args):
+    from pairing import run_pairing
+
+    with _supervisor(args) as supervisor:
+        results = run_pairing(args.heavy, args.light, args.work_dir, cpu_num=args.cpu_num, total_cpus=args.total_cpus,
+                              script_path=args.script, package=args.package, database=args.database,
+                              iterations=args.iterations, cache=_cache(args), msa_filter=_msa_filter(args),
+                              msa_gate=_msa_gate(args),
+                              results_store=_results_store(args), supervisor=supervisor)
+    for result in results:
+        print(f"{result['status']:<8} {result['name']}")
+
+
+def variants_command(args):
+    from variants import run_variant_screen
+
+    with _supervisor(args) as supervisor:
+        results = run_variant_screen(args.parent_fasta, args.mutation_file, args.work_dir, cpu_num=args.cpu_num,
+                                     total_cpus=args.total_cpus, script_path=args.script, package=args.package,
+                                     database=args.database, iterations=args.iterations, cache=_cache(args),
+                                     msa_filter=_msa_filter(args), supervisor=supervisor)
+    for result in results:
+        print(f"{result['status']:<8} {result['name']}")
+
+
+def queue_command(args):
+    import work_queue
+
+    queue_kwargs = {"lease_seconds": args.lease_seconds}
+    if args.action == "submit":
+        work_queue.submit_batch(args.queue_dir, args.input_fasta_dir, script_path=args.script,
+                                cache_dir=args.cache_dir, msa_filter=_msa_filter(args), msa_gate=_msa_gate(args),
+                                results_dir=args.results_dir, msa_timeout=args.msa_timeout,
+                                prefilter=_prefilter(args), **queue_kwargs)
+    elif args.action == "cpu-worker":
+        work_queue.cpu_worker(args.queue_dir, cpus=args.cpus, **queue_kwargs)
+    elif args.action == "inference-worker":
+        work_queue.inference_worker(args.queue_dir, **queue_kwargs)
+    elif args.action == "local":
+        work_queue.run_local(args.queue_dir, args.cpu_workers, args.inference_workers, **queue_kwargs)
+    else:
+        work_queue.print_status(work_queue.WorkQueue(args.queue_dir, **queue_kwargs))
+
+
+def convert_command(args):
+    from pathlib import Path
+
+    from a3m_to_pqt import compare_pqt, convert_a3m_dirs
+
+    for pqt_path in convert_a3m_dirs(args.a3m_dirs, args.output_dir):
+        print(f"Wrote {pqt_path}")
+        if args.compare:
+            reference = Path(args.compare) / pqt_path.name
+            if not reference.exists():
+                print(f"  no reference {reference}")
+                continue
+            report = compare_pqt(pqt_path, reference)
+            print(f"  rows {report['rows']}, schema equal: {report['schema_equal']}, "
+                  f"identical bytes: {report['identical_bytes']}, "
+                  f"mismatched rows: {report.get('num_mismatched_rows', 'n/a')}")
+
+
+def msa_stats_command(args):
+    from msa_stats import alignment_stats, read_a3m_matrix, route_msa
+
+    print("{:<40} {:>7} {:>7} {:>9} {:>9} {:>8} {:>16}".format(
+        "a3m", "length", "depth", "Neff", "coverage", "time s", "route"))
+    for a3m_path in args.a3m_files:
+        start = time.perf_counter()
+        stats = alignment_stats(read_a3m_matrix(a3m_path), args.identity)
+        route = route_msa(stats, args.min_neff, args.min_coverage, args.skip_below_neff)
+        print("{:<40} {:>7} {:>7} {:>9.1f} {:>9.2f} {:>8.2f} {:>16}".format(
+            a3m_path[-40:], stats["query_length"], stats["depth"], stats["neff"], stats["coverage_mean"],
+            time.perf_counter() - start, route))
+
+
+def kmer_command(args):
+    from fasta_index import FastaIndex
+    from kmer_index import KmerIndex, a3m_hit_names, build_kmer_index, evaluate, print_evaluation
+
+    if args.action == "build":
+        build_kmer_index(args.database, args.index_dir, seed=args.seed, chunk_size=args.chunk_size)
+        return
+
+    index = KmerIndex(args.index_dir, min_shared=args.min_shared, max_candidates=args.max_candidates)
+    if args.action == "query":
+        sequence = next(iter(FastaIndex(args.query_fasta))).sequence
+        print(f"Wrote {index.write_subset(sequence, args.output)} candidates to {args.output}")
+        return
+    queries = []
+    for fasta_path, a3m_path in zip(args.pairs[::2], args.pairs[1::2]):
+        record = next(iter(FastaIndex(fasta_path)))
+        queries.append((record.name, record.sequence, a3m_hit_names(a3m_path)))
+    reports = evaluate(index, queries)
+    print_evaluation(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=1)
+
+
+def coords_command(args):
+    from coord_store import CoordinateStore, verify_structure
+
+    store = CoordinateStore(args.root, compress=args.compress)
+    if args.action == "write":
+        path = store.write(args.name, args.cif_files)
+        size = sum(p.stat().st_size for p in ([path] if path.is_file() else path.iterdir()))
+        print(f"Stored {args.name} in {path} ({size / 1024:.0f} KiB, "
+              f"{sum(os.path.getsize(p) for p in args.cif_files) / 1024:.0f} KiB of CIF)")
+        return
+    problems = verify_structure(store.open(args.name), args.cif_files)
+    for problem in problems:
+        print(f"MISMATCH {problem}")
+    print("Round trip OK" if not problems else f"{len(problems)} mismatches")
+    raise SystemExit(1 if problems else 0)
+
+
+def results_command(args):
+    import pyarrow.dataset as ds
+
+    from results_store import ResultsStore, print_top, sanitize_name
+
+    store = ResultsStore(args.root)
+    if args.action == "compact":
+        print(f"Merged {store.compact(args.batch)} files")
+        return
+    filter = None
+    for condition in [ds.field("batch") == sanitize_name(args.batch) if args.batch else None,
+                      ds.field("iptm") >= args.min_iptm if args.min_iptm is not None else None,
+                      ~ds.field("has_inter_chain_clashes") if args.no_clashes else None]:
+        if condition is not None:
+            filter = condition if filter is None else filter & condition
+    print_top(store.top_k(args.k, by=args.by, filter=filter, best_model_only=not args.all_models))
+
+
+def cost_command(args):
+    from cost_model import DEFAULT_LOG_PATH, DEFAULT_MODEL_PATH, CostModel, print_cost_report
+
+    model_path = args.model or DEFAULT_MODEL_PATH
+    model = CostModel.load(model_path, log_path=args.log or DEFAULT_LOG_PATH)
+    print_cost_report(model.read_log())
+    if args.recalibrate and model.recalibrate() is not None:
+        model.save(model_path)
+        print(f"Saved {model.coefficients} to {model_path}")
+
+
+def supervise_command(args):
+    from supervisor import TOOL_POLICIES, run_tool, tool_environment
+
+    if args.tool not in TOOL_POLICIES:
+        raise SystemExit(f"Error: unknown tool policy {args.tool}, expected one of {', '.join(sorted(TOOL_POLICIES))}.")
+    command = args.tool_command[1:] if args.tool_command[:1] == ["--"] else args.tool_command
+    if not command:
+        raise SystemExit("Error: no command given.")
+    overrides = {key: value for key, value in (("timeout", args.timeout), ("retries", args.retries))
+                 if value is not None}
+    try:
+        stats = run_tool(command, args.tool, log_path=args.log, env=tool_environment(args.env_prefix), **overrides)
+    except subprocess.SubprocessError as e:
+        print(f"Failed: {e}")
+        raise SystemExit(1)
+    print(f"Finished in {stats['seconds']:.1f} s after {stats['attempts']} attempt(s), "
+          f"peak RSS {stats['max_rss_kb'] / 1024:.0f} MiB")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search = argparse.ArgumentParser(add_help=False)
+    search.add_argument("--package", default="jackhmm", help="MSA package (default: jackhmm)")
+    search.add_argument("--database", default="uniref90", help="MSA database (default: uniref90)")
+    search.add_argument("--iterations", type=int, default=3, help="Search iterations (default: 3)")
+    search.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="MSACache directory")
+    search.add_argument("--no-cache", action="store_true", help="Do not use the MSA cache")
+
+    msa = argparse.ArgumentParser(add_help=False)
+    msa.add_argument("--cpu-num", type=int, default=8, help="Maximum number of CPUs given to a single chain")
+    msa.add_argument("--total-cpus", type=int, help="Core budget shared by all chains (default: all cores)")
+    msa.add_argument("--script", default=TGT_SCRIPT, help="Path of A3M_TGT_Gen.sh")
+    msa.add_argument("--msa-timeout", type=float, help="Seconds a single MSA search may run")
+    msa.add_argument("--msa-retries", type=int, help="Attempts after a failed or timed-out search")
+
+    gate = argparse.ArgumentParser(add_help=False)
+    gate.add_argument("--min-neff", type=float, help="Predict chains with a lower MSA Neff without their MSA")
+    gate.add_argument("--skip-below-neff", type=float, help="Skip complexes with a chain below this MSA Neff")
+
+    reduce = argparse.ArgumentParser(add_help=False)
+    reduce.add_argument("--max-identity", type=float,
+                        help="Drop MSA rows at least this identical to a kept row before conversion (default: 0.9 "
+                             "once any filter option is given)")
+    reduce.add_argument("--min-coverage", type=float, help="Drop MSA rows covering less of the query than this")
+    reduce.add_argument("--max-depth", type=int, help="Keep at most this many MSA rows")
+
+    candidates = argparse.ArgumentParser(add_help=False)
+    candidates.add_argument("--min-shared", type=int, default=3,
+                            help="k-mers a database sequence must share with a chain to be searched (default: 3)")
+    candidates.add_argument("--max-candidates", type=int, default=20000,
+                            help="Most database sequences searched per chain (default: 20000)")
+
+    prefilter = argparse.ArgumentParser(add_help=False, parents=[candidates])
+    prefilter.add_argument("--prefilter-index", metavar="DIR",
+                           help="k-mer index of the database (`kmer build`); each chain is searched against "
+                                "its candidate sequences only")
+
+    plan = subparsers.add_parser("plan", parents=[search], help="List the work left in a batch, without running it")
+    plan.add_argument("input_fasta_dir", nargs="?", default=".")
+    plan.add_argument("-v", "--verbose", action="store_true", help="List every chain")
+    plan.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    plan.set_defaults(func=plan_command)
+
+    msa_parser = subparsers.add_parser("msa", parents=[search, msa, prefilter], help="Run the MSA search of a batch")
+    msa_parser.add_argument("input_fasta_dir", nargs="?", default=".")
+    msa_parser.add_argument("-o", "--gather-dir",
+                            help="Also stage every complex's A3Ms and FASTA file into this one directory")
+    msa_parser.set_defaults(func=msa_command)
+
+    predict = subparsers.add_parser("predict", parents=[search, gate, reduce],
+                                    help="Convert and predict <name>_final_output directories")
+    predict.add_argument("input_dirs", nargs="*", default=["."])
+    predict.add_argument("--results-dir", help="ResultsStore directory to record the scores in")
+    predict.add_argument("--device", help="Device chai runs on (default: cuda:0)")
+    predict.add_argument("--timeout", type=float, help="Seconds a prediction may run")
+    predict.set_defaults(func=predict_command)
+
+    run = subparsers.add_parser("run", parents=[search, msa, gate, reduce, prefilter], help="Run every stage of a batch")
+    run.add_argument("input_fasta_dir", nargs="?", default=".")
+    run.add_argument("--trace-dir", help="Write a trace of every stage there")
+    run.add_argument("--results-dir", help="ResultsStore directory to record the scores in")
+    run.add_argument("--coords-dir", help="CoordinateStore directory to store the models in")
+    run.add_argument("--workers-per-device", type=int, default=1,
+                     help="Inference workers per GPU; more than one lets small complexes share a GPU")
+    run.add_argument("--token-budget", type=int,
+                     help="Most tokens in flight on one GPU when it runs several complexes (default: no limit)")
+    run.set_defaults(func=run_command)
+
+    pair = subparsers.add_parser("pair", parents=[search, msa, gate, reduce],
+                                 help="Predict every heavy x light pair of two chain libraries")
+    pair.add_argument("--heavy", nargs="+", required=True, help="FASTA file(s) of the heavy chain library")
+    pair.add_argument("--light", nargs="+", required=True, help="FASTA file(s) of the light chain library")
+    pair.add_argument("-o", "--work-dir", default="pairing_output", help="Run directory")
+    pair.add_argument("--results-dir", help="ResultsStore directory to record the scores in")
+    pair.set_defaults(func=pair_command)
+
+    variants = subparsers.add_parser("variants", parents=[search, msa, reduce],
+                                     help="Predict point mutants of a complex from the parent's MSAs")
+    variants.add_argument("parent_fasta")
+    variants.add_argument("mutation_file", help="One '[name] A:Y32F,B:N93A' variant per line")
+    variants.add_argument("-o", "--work-dir", default="variants_output", help="Run directory")
+    variants.set_defaults(func=variants_command)
+
+    work_queue = subparsers.add_parser("queue", help="Drain a batch through a work queue on a shared filesystem")
+    queue_actions = work_queue.add_subparsers(dest="action", required=True)
+    lease = argparse.ArgumentParser(add_help=False)
+    lease.add_argument("queue_dir")
+    lease.add_argument("--lease-seconds", type=float, default=120.0)
+    submit = queue_actions.add_parser("submit", parents=[lease, gate, reduce, prefilter], help="Queue a batch of FASTA files")
+    submit.add_argument("input_fasta_dir")
+    submit.add_argument("--script", default=TGT_SCRIPT, help="Path of A3M_TGT_Gen.sh on the workers")
+    submit.add_argument("--cache-dir", help="Shared MSACache directory")
+    submit.add_argument("--results-dir", help="Shared ResultsStore directory")
+    submit.add_argument("--msa-timeout", type=float, help="Seconds an MSA search may run")
+    cpu = queue_actions.add_parser("cpu-worker", parents=[lease], help="Run MSA and prepare jobs")
+    cpu.add_argument("--cpus", type=int, default=8, help="Maximum number of CPUs given to a single chain")
+    queue_actions.add_parser("inference-worker", parents=[lease], help="Run inference jobs")
+    queue_actions.add_parser("status", parents=[lease], help="Print job counts per stage")
+    local = queue_actions.add_parser("local", parents=[lease], help="Drain a queue with local worker processes")
+    local.add_argument("--cpu-workers", type=int, default=2)
+    local.add_argument("--inference-workers", type=int, default=1)
+    work_queue.set_defaults(func=queue_command)
+
+    convert = subparsers.add_parser("convert", help="Convert A3M directories to chai .aligned.pqt files")
+    convert.add_argument("a3m_dirs", nargs="+", help="Directories each holding the A3M file(s) of one chain")
+    convert.add_argument("-o", "--output-dir", help="Directory to write the .aligned.pqt files into")
+    convert.add_argument("--compare", help="Reference directory of .aligned.pqt files to check the output against")
+    convert.set_defaults(func=convert_command)
+
+    stats = subparsers.add_parser("msa-stats", help="Depth, coverage, Neff and gate route of A3M files")
+    stats.add_argument("a3m_files", nargs="+")
+    stats.add_argument("--identity", type=float, default=0.8, help="Identity threshold for the Neff weights")
+    stats.add_argument("--min-neff", type=float, default=16.0)
+    stats.add_argument("--min-coverage", type=float, default=0.0)
+    stats.add_argument("--skip-below-neff", type=float, default=None)
+    stats.set_defaults(func=msa_stats_command)
+
+    kmer = subparsers.add_parser("kmer", help="k-mer prefilter for the MSA search database")
+    kmer_actions = kmer.add_subparsers(dest="action", required=True)
+    build = kmer_actions.add_parser("build", help="Index a database FASTA")
+    build.add_argument("database")
+    build.add_argument("index_dir")
+    build.add_argument("--seed", default="11011", help="Spaced seed, e.g. 11011, or 1111 for plain 4-mers")
+    build.add_argument("--chunk-size", type=int, default=10000, help="Sequences whose k-mers are held in memory")
+    query = kmer_actions.add_parser("query", parents=[candidates], help="Write the candidate subset for a query")
+    query.add_argument("index_dir")
+    query.add_argument("query_fasta")
+    query.add_argument("-o", "--output", required=True)
+    evaluation = kmer_actions.add_parser("evaluate", parents=[candidates], help="Recall against full-search A3Ms")
+    evaluation.add_argument("index_dir")
+    evaluation.add_argument("pairs", nargs="+", help="Alternating query FASTA and full-search A3M paths")
+    evaluation.add_argument("--json", help="Write the report to this JSON file")
+    kmer.set_defaults(func=kmer_command)
+
+    coords = subparsers.add_parser("coords", help="Binary store of predicted structures")
+    coords_actions = coords.add_subparsers(dest="action", required=True)
+    for action in ("write", "verify"):
+        sub = coords_actions.add_parser(action)
+        sub.add_argument("root")
+        sub.add_argument("name")
+        sub.add_argument("cif_files", nargs="+")
+        sub.add_argument("--compress", action="store_true", help="Store as one compressed .npz")
+    coords.set_defaults(func=coords_command)
+
+    results = subparsers.add_parser("results", help="Columnar store of prediction results")
+    results_actions = results.add_subparsers(dest="action", required=True)
+    top = results_actions.add_parser("top", help="Print the best complexes")
+    top.add_argument("root")
+    top.add_argument("-k", type=int, default=10)
+    top.add_argument("--by", default="aggregate_score", choices=["aggregate_score", "ptm", "iptm", "plddt"])
+    top.add_argument("--batch", help="Only this batch")
+    top.add_argument("--min-iptm", type=float, help="Only models with at least this ipTM")
+    top.add_argument("--no-clashes", action="store_true", help="Only models without inter-chain clashes")
+    top.add_argument("--all-models", action="store_true", help="Rank models rather than complexes")
+    compact = results_actions.add_parser("compact", help="Merge small result files")
+    compact.add_argument("root")
+    compact.add_argument("--batch")
+    results.set_defaults(func=results_command)
+
+    # Defaults come from cost_model at run time, so building the parser does not import numpy
+    cost = subparsers.add_parser("cost", help="Show and refit the inference cost model from its timing log")
+    cost.add_argument("--log", help="Timing log written by the dispatcher (default: the shared log)")
+    cost.add_argument("--model", help="Coefficient file to update (default: the shared model)")
+    cost.add_argument("--recalibrate", action="store_true", help="Refit the coefficients and save them")
+    cost.set_defaults(func=cost_command)
+
+    supervise = subparsers.add_parser("supervise", help="Run an external tool with a timeout, retries and a log")
+    supervise.add_argument("--tool", default="default", help="Policy of supervisor.TOOL_POLICIES to apply")
+    supervise.add_argument("--log", help="Log file of the command's output")
+    supervise.add_argument("--timeout", type=float, help="Seconds per attempt")
+    supervise.add_argument("--retries", type=int, help="Attempts after the first one")
+    supervise.add_argument("--env-prefix", help="conda env or virtualenv whose bin/ goes first on PATH")
+    supervise.add_argument("tool_command", nargs=argparse.REMAINDER)
+    supervise.set_defaults(func=supervise_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if hasattr(args, "input_fasta_dir") and not os.path.isdir(args.input_fasta_dir):
+        raise SystemExit(f"Error: The directory {args.input_fasta_dir} does not exist.")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
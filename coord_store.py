@@ -0,0 +1,261 @@
+"""
+Binary store of predicted structures, so analyses do not reparse text mmCIF.
+
+All models of a complex (pred.model_idx_*.cif) share one atom layout, so a
+complex is stored as
+
+    <root>/<complex>/coords.npy        float32 (models, atoms, 3)
+                     plddt.npy         float32 (models, atoms), the CIF B-factor
+                     atom_name.npy, element.npy, residue_name.npy   fixed-width bytes (atoms,), as wide as
+                                       the longest value (ligand atom and CCD names can exceed PDB widths)
+                     residue_seq.npy   int32 (atoms,)
+                     chain_offsets.npy int64 (chains + 1,), atoms of chain i are [offsets[i], offsets[i + 1])
+                     meta.json         chain ids, model indices, source CIFs
+
+and read back memory-mapped, so loading one chain's CA trace touches only
+those pages. With compress=True the arrays go to <root>/<complex>.npz
+instead, which is smaller but decompressed array by array on access.
+
+    python cli.py coords write store/ complex_name test_output/pred.model_idx_*.cif
+    python cli.py coords verify store/ complex_name test_output/pred.model_idx_*.cif
+"""
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from fasta_index import sanitize_name
+from mmcif import read_atom_site
+from tracing import span
+
+# Array name -> (atom_site field, minimum width in bytes); longer values widen the array instead of being cut
+ATOM_ARRAYS = {
+    "atom_name": ("label_atom_id", 4),
+    "element": ("type_symbol", 2),
+    "residue_name": ("label_comp_id", 3),
+}
+
+
+def fixed_width(values, min_width):
+    """
+    String array as fixed-width bytes, wide enough for its longest value.
+
+    :raises UnicodeEncodeError: On a non-ASCII value
+    """
+    width = max(min_width, int(np.char.str_len(values).max()) if values.size else 0)
+    return np.char.encode(values, "ascii").astype(f"S{width}")
+
+
+def model_index(cif_path, default):
+    match = re.search(r"model_idx_(\d+)", Path(cif_path).name)
+    return int(match.group(1)) if match else default
+
+
+def read_structures(cif_paths):
+    """
+    Parse the models of one complex into the arrays of the store.
+
+    :return: (dict of arrays, meta dict)
+    :raises ValueError: If the models do not share one atom layout or a chain is not contiguous
+    """
+    cif_paths = sorted(cif_paths, key=lambda p: model_index(p, 0))
+    coords, plddt = [], []
+    arrays = None
+    for cif_path in cif_paths:
+        atom_site = read_atom_site(cif_path)
+        if not atom_site:
+            raise ValueError(f"No _atom_site records in {cif_path}.")
+        layout = {name: fixed_width(atom_site[field], width) for name, (field, width) in ATOM_ARRAYS.items()}
+        layout["residue_seq"] = atom_site["label_seq_id"].astype(np.int32)
+        layout["chain"] = atom_site["auth_asym_id"]
+        if arrays is None:
+            arrays = layout
+        elif any(not np.array_equal(arrays[name], layout[name]) for name in layout):
+            raise ValueError(f"Atoms of {cif_path} differ from those of {cif_paths[0]}.")
+        coords.append(np.stack([atom_site[f"Cartn_{axis}"].astype(np.float32) for axis in "xyz"], axis=1))
+        plddt.append(atom_site["B_iso_or_equiv"].astype(np.float32))
+
+    chain = arrays.pop("chain")
+    starts = np.flatnonzero(np.concatenate(([True], chain[1:] != chain[:-1])))
+    chain_ids = [str(c) for c in chain[starts]]
+    if len(set(chain_ids)) != len(chain_ids):
+        raise ValueError(f"Chains of {cif_paths[0]} are not contiguous.")
+    arrays.update(coords=np.stack(coords), plddt=np.stack(plddt),
+                  chain_offsets=np.append(starts, len(chain)).astype(np.int64))
+    meta = {
+        "chain_ids": chain_ids,
+        "models": [model_index(p, i) for i, p in enumerate(cif_paths)],
+        "atoms": int(len(chain)),
+        "source": [str(Path(p).resolve()) for p in cif_paths],
+    }
+    return arrays, meta
+
+
+class Structure:
+    """
+    Lazy view of the stored models of one complex.
+
+    Arrays are memory-mapped (or, for a compressed store, decompressed) on
+    first access. chain() returns views, so nothing is copied.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.compressed = self.path.suffix == ".npz"
+        if self.compressed:
+            self._npz = np.load(self.path)
+            self.meta = json.loads(str(self._npz["meta"]))
+        else:
+            self.meta = json.loads((self.path / "meta.json").read_text())
+        self._arrays = {}
+
+    def array(self, name):
+        if name not in self._arrays:
+            if self.compressed:
+                self._arrays[name] = self._npz[name]
+            else:
+                self._arrays[name] = np.load(self.path / f"{name}.npy", mmap_mode='r')
+        return self._arrays[name]
+
+    coords = property(lambda self: self.array("coords"))
+    plddt = property(lambda self: self.array("plddt"))
+    atom_name = property(lambda self: self.array("atom_name"))
+    element = property(lambda self: self.array("element"))
+    residue_name = property(lambda self: self.array("residue_name"))
+    residue_seq = property(lambda self: self.array("residue_seq"))
+
+    @property
+    def chain_ids(self):
+        return self.meta["chain_ids"]
+
+    def chain_slice(self, chain_id):
+        i = self.chain_ids.index(chain_id)
+        offsets = self.array("chain_offsets")
+        return slice(int(offsets[i]), int(offsets[i + 1]))
+
+    def chain(self, chain_id, model=None):
+        """
+        Arrays of one chain; coords and plddt of one model (by position) or of all models.
+        """
+        atoms = self.chain_slice(chain_id)
+        models = slice(None) if model is None else model
+        return {
+            "coords": self.coords[models, atoms],
+            "plddt": self.plddt[models, atoms],
+            "atom_name": self.atom_name[atoms],
+            "element": self.element[atoms],
+            "residue_name": self.residue_name[atoms],
+            "residue_seq": self.residue_seq[atoms],
+        }
+
+    def ca(self, chain_id=None, model=None):
+        """
+        CA coordinates and pLDDT of a chain (or of the whole complex).
+
+        :return: (coords of shape (models, residues, 3) or (residues, 3), matching plddt)
+        """
+        atoms = self.chain_slice(chain_id) if chain_id is not None else slice(None)
+        mask = np.flatnonzero(self.atom_name[atoms] == b"CA") + (atoms.start or 0)
+        models = slice(None) if model is None else model
+        return self.coords[models][..., mask, :], self.plddt[models][..., mask]
+
+
+class CoordinateStore:
+    """
+    Directory of stored complexes, see the module docstring.
+    """
+
+    def __init__(self, root, compress=False):
+        self.root = Path(root)
+        self.compress = compress
+
+    def path(self, name):
+        name = sanitize_name(name)
+        return self.root / (f"{name}.npz" if self.compress else name)
+
+    def write(self, name, cif_paths):
+        """
+        Store the models of a complex, replacing any earlier copy.
+
+        :return: Path of the stored complex
+        """
+        with span(name, "coord_store") as fields:
+            arrays, meta = read_structures(cif_paths)
+            fields["atoms"] = meta["atoms"]
+        path = self.path(name)
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.compress:
+            fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".npz", dir=self.root)
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates the file owner-only
+            os.replace(tmp_path, path)
+            return path
+
+        # Written under a temporary name and swapped in, so readers never see half a complex
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".", dir=self.root))
+        for array_name, array in arrays.items():
+            np.save(tmp_dir / f"{array_name}.npy", array)
+        (tmp_dir / "meta.json").write_text(json.dumps(meta))
+        os.chmod(tmp_dir, 0o755)
+        if path.exists():
+            old_dir = Path(tempfile.mkdtemp(prefix=".", dir=self.root))
+            os.replace(path, old_dir / "old")
+            os.replace(tmp_dir, path)
+            shutil.rmtree(old_dir)
+        else:
+            os.replace(tmp_dir, path)
+        return path
+
+    def open(self, name):
+        return Structure(self.path(name))
+
+    def names(self):
+        if not self.root.exists():
+            return []
+        return sorted(p.stem if p.suffix == ".npz" else p.name for p in self.root.iterdir()
+                      if not p.name.startswith("."))
+
+
+def verify_structure(structure, cif_paths, tolerance=1e-3):
+    """
+    Check a stored complex against the CIF files it was written from.
+
+    :return: List of mismatch descriptions (empty if the round trip is exact)
+    """
+    arrays, meta = read_structures(cif_paths)
+    problems = []
+    if meta["chain_ids"] != structure.chain_ids or meta["models"] != structure.meta["models"]:
+        problems.append(f"chains/models {structure.chain_ids}/{structure.meta['models']} "
+                        f"!= {meta['chain_ids']}/{meta['models']}")
+    for name, expected in arrays.items():
+        stored = structure.array(name)
+        if stored.shape != expected.shape:
+            problems.append(f"{name}: shape {stored.shape} != {expected.shape}")
+        elif expected.dtype.kind == 'f':
+            error = float(np.abs(stored - expected).max()) if expected.size else 0.0
+            if error > tolerance:
+                problems.append(f"{name}: max abs error {error:.2e}")
+        elif not np.array_equal(stored, expected):
+            problems.append(f"{name}: values differ")
+    for chain_id in structure.chain_ids:
+        atoms = structure.chain_slice(chain_id)
+        if not np.array_equal(structure.chain(chain_id)["coords"], arrays["coords"][:, atoms]):
+            problems.append(f"chain {chain_id}: coordinates differ")
+    return problems
+
+
+def main():
+    # Same as `python cli.py coords ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["coords"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
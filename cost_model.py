@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from a3m_to_pqt import pqt_name
+from dispatcher import estimate_memory
+from tgt_to_chai import read_fasta_records
+
+DEFAULT_MODEL_PATH = os.path.expanduser("~/.cache/chai_pipeline/cost_model.json")
+DEFAULT_LOG_PATH = os.path.expanduser("~/.cache/chai_pipeline/inference_timings.jsonl")
+
+# chai subsamples deeper MSAs, so rows beyond this add no cost
+MAX_MSA_DEPTH = 16384
+
+FEATURES = ("intercept", "tokens_squared", "msa_cells")
+
+# Starting point until recalibrate() has seen real timings: ~50 s for 1000 tokens
+DEFAULT_COEFFICIENTS = {"intercept": 30.0, "tokens_squared": 2e-5, "msa_cells": 1e-7}
+
+
+def pqt_rows(pqt_path):
+    """
+    Number of MSA rows in a .aligned.pqt file, read from the footer only.
+    """
+    return pq.ParquetFile(pqt_path).metadata.num_rows
+
+
+def complex_features(job):
+    """
+    Cost features of an inference job from its FASTA and the .aligned.pqt files in its msa_directory.
+
+    :return: Dict with "tokens", "msa_rows" (per chain) and the FEATURES values
+    """
+    lengths = []
+    msa_rows = []
+    for _, sequence in read_fasta_records(job["fasta_file"]):
+        pqt_path = Path(job["msa_directory"]) / pqt_name(sequence)
+        lengths.append(len(sequence))
+        msa_rows.append(pqt_rows(pqt_path) if pqt_path.exists() else 1)
+    tokens = sum(lengths)
+    return {
+        "tokens": tokens,
+        "msa_rows": msa_rows,
+        "intercept": 1.0,
+        "tokens_squared": float(tokens) ** 2,
+        "msa_cells": float(sum(min(rows, MAX_MSA_DEPTH) * length for rows, length in zip(msa_rows, lengths))),
+    }
+
+
+class CostModel:
+    """
+    Linear model of inference runtime in FEATURES, plus a token-count memory estimate.
+
+    Runtime is dominated by the pair representation, which grows with the
+    square of the token count, and by the MSA module, which grows with MSA
+    depth times chain length. Every finished job can be record()ed to a JSONL
+    log of predicted against actual seconds, and recalibrate() refits the
+    coefficients to that log.
+    """
+
+    def __init__(self, coefficients=None, log_path=DEFAULT_LOG_PATH, memory_model=estimate_memory):
+        self.coefficients = dict(DEFAULT_COEFFICIENTS, **(coefficients or {}))
+        self.log_path = log_path
+        self.memory_model = memory_model
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH, **kwargs):
+        """
+        Load saved coefficients, falling back to the defaults if there are none yet.
+        """
+        coefficients = None
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                coefficients = json.load(f)["coefficients"]
+        return cls(coefficients, **kwargs)
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"coefficients": self.coefficients, "saved": time.time()}, f, indent=1)
+        os.replace(tmp_path, path)
+
+    def features(self, job):
+        return complex_features(job)
+
+    def predict_seconds(self, features):
+        return sum(self.coefficients[name] * features[name] for name in FEATURES)
+
+    def predict_memory(self, features):
+        return self.memory_model(features["tokens"])
+
+    def record(self, job, features, predicted_seconds, actual_seconds, device=None):
+        """
+        Append one predicted-vs-actual entry to the timing log.
+        """
+        if self.log_path is None or actual_seconds is None:
+            return
+        entry = {
+            "name": job.get("name"),
+            "device": device,
+            "features": {name: features[name] for name in ("tokens", "msa_rows") + FEATURES},
+            "predicted_seconds": predicted_seconds,
+            "actual_seconds": actual_seconds,
+            "time": time.time(),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def read_log(self):
+        if self.log_path is None or not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def recalibrate(self, min_samples=5):
+        """
+        Refit the coefficients to the timing log by least squares.
+
+        Coefficients are kept non-negative (a negative cost per token would
+        predict negative runtimes for large complexes); features that come out
+        negative are dropped and the rest refitted.
+
+        :return: Dict with the sample count and the mean absolute error before and after,
+                 or None if the log has fewer than min_samples entries
+        """
+        entries = self.read_log()
+        if len(entries) < min_samples:
+            return None
+        X = np.array([[entry["features"][name] for name in FEATURES] for entry in entries])
+        y = np.array([entry["actual_seconds"] for entry in entries])
+        before = np.abs(X @ np.array([self.coefficients[name] for name in FEATURES]) - y).mean()
+
+        # Scale columns so tokens_squared (~1e6) and intercept (1) are equally well conditioned
+        scale = np.abs(X).max(axis=0)
+        scale[scale == 0] = 1.0
+        active = np.ones(len(FEATURES), dtype=bool)
+        while True:
+            coef = np.zeros(len(FEATURES))
+            coef[active] = np.linalg.lstsq(X[:, active] / scale[active], y, rcond=None)[0] / scale[active]
+            if (coef >= 0).all():
+                break
+            active &= coef > 0
+        after = np.abs(X @ coef - y).mean()
+
+        self.coefficients = {name: float(c) for name, c in zip(FEATURES, coef)}
+        print(f"Recalibrated cost model on {len(entries)} jobs: mean abs error {before:.1f} s -> {after:.1f} s")
+        return {"samples": len(entries), "mae_before": float(before), "mae_after": float(after)}
+
+
+def print_cost_report(entries):
+    """
+    Print predicted against actual runtimes from a timing log.
+    """
+    print("{:<30} {:>7} {:>11} {:>9} {:>7}".format("complex", "tokens", "predicted", "actual", "ratio"))
+    for entry in entries:
+        ratio = entry["actual_seconds"] / entry["predicted_seconds"] if entry["predicted_seconds"] else float("nan")
+        print("{:<30} {:>7} {:>10.1f}s {:>8.1f}s {:>7.2f}".format(
+            str(entry["name"])[:30], entry["features"]["tokens"], entry["predicted_seconds"],
+            entry["actual_seconds"], ratio))
+
+
+def main():
+    # Same as `python cli.py cost ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["cost"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
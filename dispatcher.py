@@ -0,0 +1,295 @@
+import itertools
+import threading
+import time
+
+from inference_worker import InferenceWorker, chai_backend
+from supervisor import TOOL_POLICIES
+from tgt_to_chai import read_fasta_records
+
+GiB = 1024 ** 3
+
+
+class Device:
+    """
+    One inference device and the memory reserved on it by running jobs.
+    """
+
+    def __init__(self, name, memory):
+        self.name = name
+        self.memory = memory
+        self.reserved = 0
+        self.tokens = 0     # Tokens of the jobs in flight
+        self.workers = []
+        self.busy = set()   # Workers with a job in flight
+
+    @property
+    def free(self):
+        return self.memory - self.reserved
+
+    def idle_worker(self):
+        for worker in self.workers:
+            if worker not in self.busy:
+                return worker
+        return None
+
+    def __repr__(self):
+        return f"Device({self.name!r}, {self.memory / GiB:.0f} GiB)"
+
+
+def detect_devices():
+    """
+    List the visible CUDA devices with their total memory, or [] if torch or CUDA is unavailable.
+    """
+    try:
+        import torch
+    except ImportError:
+        return []
+    if not torch.cuda.is_available():
+        return []
+    return [Device(f"cuda:{i}", torch.cuda.get_device_properties(i).total_memory)
+            for i in range(torch.cuda.device_count())]
+
+
+def count_tokens(fasta_file):
+    """
+    Number of tokens chai builds for a protein-only complex: one per residue.
+    """
+    return sum(len(sequence) for _, sequence in read_fasta_records(fasta_file))
+
+
+def estimate_memory(tokens, base=6 * GiB, per_token_pair=16 * 1024):
+    """
+    Rough peak GPU memory of one prediction.
+
+    The pair representation dominates and grows with the square of the token
+    count; on top of that come the model weights and ESM embeddings. The
+    defaults put a 2048-token complex at about 70 GiB, close to what fits on
+    an 80 GiB card.
+    """
+    return base + per_token_pair * tokens * tokens
+
+
+def is_oom_error(error):
+    return error is not None and ("out of memory" in error.lower() or "OutOfMemoryError" in error)
+
+
+class InferenceDispatcher:
+    """
+    Spread inference jobs over a pool of devices, each with its own InferenceWorker(s).
+
+    Every job is given a memory estimate from its token count, and is placed on
+    the smallest device with an idle worker and enough unreserved memory for
+    it, so the large devices stay free for the large complexes. A job that
+    fails with an out-of-memory error is queued again for a device with more
+    memory than the one it failed on. A job larger than every device is tried
+    on the largest one once that device is otherwise idle.
+
+    With a CostModel, memory comes from the model and waiting jobs are started
+    longest predicted runtime first (LPT), so a huge complex submitted last
+    does not run alone at the end of the batch; every finished job's runtime
+    is logged against its prediction for recalibration. With a token_budget
+    and workers_per_device > 1, small complexes share a device as long as the
+    tokens in flight on it stay within the budget.
+
+    The device list and backend are injectable: with fake Device objects and
+    stub_backend() the scheduling runs on a machine without a GPU.
+
+    Offers the same submit/poll/results/run/close interface as InferenceWorker,
+    and run() may be called from several threads at once. Ordering only helps
+    if the dispatcher sees several waiting jobs, so callers with a batch should
+    submit() all of it and collect with poll() or results(), as
+    pipeline.run_pipeline() does.
+    """
+
+    def __init__(self, devices=None, backend_factory=chai_backend, memory_model=estimate_memory,
+                 workers_per_device=1, max_attempts=3, poll_interval=0.05, cost_model=None, token_budget=None,
+                 job_timeout=TOOL_POLICIES["predict"]["timeout"]):
+        self.devices = detect_devices() if devices is None else list(devices)
+        if not self.devices:
+            raise RuntimeError("No inference devices found.")
+        self.devices.sort(key=lambda device: device.memory)
+        self.backend_factory = backend_factory
+        self.memory_model = memory_model
+        self.workers_per_device = workers_per_device
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.cost_model = cost_model
+        self.token_budget = token_budget
+        self.job_timeout = job_timeout
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+        self._queue = []       # Jobs waiting for a device, in submission order
+        self._running = {}     # (worker, worker job_id) -> (job, device)
+        self._finished = {}    # job_id -> result
+        self._unclaimed = []   # job_ids finished but not yet returned by results()
+        self._waiting = set()  # job_ids a run() call is waiting for
+        self._thread = None
+        self._closing = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        for device in self.devices:
+            device.workers = [InferenceWorker(backend_factory=self.backend_factory, job_timeout=self.job_timeout)
+                              for _ in range(self.workers_per_device)]
+            for worker in device.workers:
+                worker.start()
+        self._thread = threading.Thread(target=self._schedule, name="dispatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """
+        Queue a job and return its job_id.
+        """
+        self.start()
+        if self.cost_model is not None:
+            features = self.cost_model.features(job)
+            job = dict(job, features=features, tokens=features["tokens"],
+                       memory=self.cost_model.predict_memory(features),
+                       predicted_seconds=self.cost_model.predict_seconds(features))
+        else:
+            tokens = job.get("tokens") or count_tokens(job["fasta_file"])
+            job = dict(job, tokens=tokens, memory=self.memory_model(tokens), predicted_seconds=None)
+        job.update(job_id=next(self._ids), min_device_memory=0, attempts=0, devices_tried=[])
+        with self._cond:
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job["job_id"]
+
+    def _pick_device(self, job):
+        eligible = [d for d in self.devices if d.memory >= job["min_device_memory"]]
+        if not eligible:
+            return None
+        # Estimates above every device are tried on the largest one, alone
+        memory = min(job["memory"], eligible[-1].memory)
+        for device in eligible:
+            if device.idle_worker() is None or memory > device.free:
+                continue
+            if self.token_budget and device.tokens and device.tokens + job["tokens"] > self.token_budget:
+                continue
+            return device
+        return None
+
+    def _place(self):
+        with self._cond:
+            # Requeued jobs first, then longest predicted runtime first; submission order without a cost model
+            self._queue.sort(key=lambda job: (job["attempts"] == 0, -(job["predicted_seconds"] or 0)))
+            for job in list(self._queue):
+                if job["min_device_memory"] > self.devices[-1].memory:
+                    self._queue.remove(job)
+                    self._finish(job, None, {"status": "failed", "error": job["last_error"],
+                                             "cif_paths": [], "aggregate_scores": [], "seconds": None})
+                    continue
+                device = self._pick_device(job)
+                if device is None:
+                    continue
+                self._queue.remove(job)
+                worker = device.idle_worker()
+                device.busy.add(worker)
+                job["reserved"] = min(job["memory"], device.memory)
+                device.reserved += job["reserved"]
+                device.tokens += job["tokens"]
+                job["attempts"] += 1
+                job["devices_tried"].append(device.name)
+                params = dict(job.get("params", {}), device=device.name)
+                worker_job_id = worker.submit(dict(job, params=params))
+                self._running[(worker, worker_job_id)] = (job, device)
+                print(f"Dispatching {job.get('name')} ({job['tokens']} tokens, "
+                      f"~{job['memory'] / GiB:.1f} GiB) to {device.name}")
+
+    def _collect(self):
+        collected = False
+        for worker in {worker for worker, _ in list(self._running)}:
+            for result in worker.poll():
+                collected = True
+                with self._cond:
+                    job, device = self._running.pop((worker, result["job_id"]))
+                    device.busy.discard(worker)
+                    device.reserved -= job["reserved"]
+                    device.tokens -= job["tokens"]
+                    if result["status"] != "ok" and is_oom_error(result["error"]) \
+                            and job["attempts"] < self.max_attempts:
+                        # Only a device with more memory than this one can help
+                        job["min_device_memory"] = device.memory + 1
+                        job["memory"] = max(job["memory"], device.memory)
+                        job["last_error"] = result["error"]
+                        print(f"{job.get('name')} ran out of memory on {device.name}, requeueing for a larger device")
+                        self._queue.insert(0, job)
+                    else:
+                        self._finish(job, device, result)
+                    self._cond.notify_all()
+        return collected
+
+    def _finish(self, job, device, result):
+        result.update(job_id=job["job_id"], name=job.get("name"), output_dir=job["output_dir"],
+                      device=device.name if device else None, attempts=job["attempts"],
+                      devices_tried=job["devices_tried"], tokens=job["tokens"])
+        if self.cost_model is not None and device is not None and result["status"] == "ok":
+            result["predicted_seconds"] = job["predicted_seconds"]
+            self.cost_model.record(job, job["features"], job["predicted_seconds"], result["seconds"], device.name)
+        self._finished[job["job_id"]] = result
+        if job["job_id"] not in self._waiting:
+            self._unclaimed.append(job["job_id"])
+        self._cond.notify_all()
+
+    def _schedule(self):
+        while not self._closing:
+            self._place()
+            if not self._collect():
+                time.sleep(self.poll_interval)
+
+    def _busy(self):
+        return bool(self._queue or self._running)
+
+    def results(self):
+        """
+        Yield result dicts as jobs finish until every submitted job has a result.
+        """
+        while True:
+            with self._cond:
+                while not self._unclaimed and self._busy():
+                    self._cond.wait()
+                if not self._unclaimed:
+                    return
+                result = self._finished.pop(self._unclaimed.pop(0))
+            yield result
+
+    def poll(self, timeout=0.0):
+        """
+        Wait up to timeout seconds for a job to finish and return the results finished so far.
+        """
+        with self._cond:
+            if not self._unclaimed and self._busy():
+                self._cond.wait(timeout)
+            finished = [self._finished.pop(job_id) for job_id in self._unclaimed]
+            self._unclaimed.clear()
+        return finished
+
+    def run(self, job):
+        """
+        Run a single job on the first suitable device and wait for its result.
+        """
+        with self._cond:
+            job_id = self.submit(job)
+            self._waiting.add(job_id)
+            while job_id not in self._finished:
+                self._cond.wait()
+            self._waiting.discard(job_id)
+            return self._finished.pop(job_id)
+
+    def close(self):
+        self._closing = True
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for device in self.devices:
+            for worker in device.workers:
+                worker.close()
+            device.workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
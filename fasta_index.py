@@ -0,0 +1,279 @@
+import os
+
+from tracing import span
+
+INDEX_SUFFIX = ".fai"
+
+
+def sanitize_name(name):
+    # Function to sanitize the name (you can adjust this depending on your needs)
+    return name.replace(" ", "_").replace("/", "_")
+
+
+def iter_fasta_records(fasta_path):
+    """
+    Stream (name, sequence) pairs from a FASTA file, one record in memory at a time.
+    """
+    name = None
+    seq_data = []
+    with open(fasta_path, 'r') as f:
+        for line in f:
+            if line.startswith('>'):
+                if name is not None:
+                    yield name, "".join(seq_data)
+                name = line[1:].strip()
+                seq_data = []
+            else:
+                seq_data.append(line.strip())
+    if name is not None:
+        yield name, "".join(seq_data)
+
+
+def iter_fasta_blocks(fasta_path):
+    """
+    Stream (name, sequence, offset, size) of every record of a FASTA file, one record in memory at a time.
+
+    offset is the byte offset of the header line and size the number of bytes
+    up to the next header, so the record can later be copied back verbatim
+    with a single seek and read. Names are the header up to the first tab, as
+    in build_fasta_index().
+    """
+    name = None
+    seq_data = []
+    with open(fasta_path, 'rb') as f:
+        position = start = 0
+        for line in f:
+            if line.startswith(b'>'):
+                if name is not None:
+                    yield name, b"".join(seq_data).decode(), start, position - start
+                name = line[1:].decode().rstrip("\r\n").split("\t")[0].strip()
+                seq_data = []
+                start = position
+            elif name is not None:
+                seq_data.append(line.strip())
+            position += len(line)
+    if name is not None:
+        yield name, b"".join(seq_data).decode(), start, position - start
+
+
+def build_fasta_index(fasta_path):
+    """
+    Index a FASTA file in one streaming pass, in samtools .fai layout.
+
+    Each entry is (name, length, offset, line_bases, line_bytes): the number of
+    residues, the byte offset of the first sequence line, and the residues and
+    bytes per full line. Records whose lines are not all the same width (apart
+    from the last) get line_bases = line_bytes = 0 and are read up to the next
+    header instead. Names are the header up to the first tab.
+
+    :raises ValueError: On a name used by two records, reported with both line numbers
+    """
+    entries = []
+    seen = {}
+    current = None
+
+    def finish(entry):
+        if entry is None:
+            return
+        name, length, offset, line_bases, line_bytes, irregular, _ = entry
+        if irregular:
+            line_bases = line_bytes = 0
+        entries.append((name, length, offset, line_bases, line_bytes))
+
+    with open(fasta_path, 'rb') as f:
+        position = 0
+        for line_number, line in enumerate(f, start=1):
+            if line.startswith(b'>'):
+                finish(current)
+                name = line[1:].decode().rstrip("\r\n").split("\t")[0].strip()
+                if name in seen:
+                    raise ValueError(f"Duplicate FASTA name '{name}' in {fasta_path} "
+                                     f"(lines {seen[name]} and {line_number}).")
+                seen[name] = line_number
+                # [name, length, offset, line_bases, line_bytes, irregular, last line was short]
+                current = [name, 0, position + len(line), 0, 0, False, False]
+            elif current is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                if not bases:
+                    # Blank lines are only harmless after the last sequence line
+                    current[5] = current[5] or current[3] == 0
+                    current[6] = True
+                else:
+                    if current[3] == 0:
+                        current[3], current[4] = bases, len(line)
+                    elif current[6] or bases > current[3]:
+                        current[5] = True  # A line after a short one, or longer than the first
+                    current[6] = bases < current[3]
+                    current[1] += bases
+            position += len(line)
+        finish(current)
+    return entries
+
+
+def write_fasta_index(entries, index_path):
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        for entry in entries:
+            f.write("\t".join(str(value) for value in entry) + "\n")
+    os.replace(tmp_path, index_path)
+
+
+def read_fasta_index(index_path):
+    entries = []
+    with open(index_path, 'r') as f:
+        for line in f:
+            name, length, offset, line_bases, line_bytes = line.rstrip("\n").split("\t")[:5]
+            entries.append((name, int(length), int(offset), int(line_bases), int(line_bytes)))
+    return entries
+
+
+def index_matches(fasta_path, entries):
+    """
+    Check that index entries still describe a FASTA file, without reading more than its last record.
+
+    The last record's header must sit right before its offset, and the record
+    must end where the file does (trailing blank lines aside), so a FASTA that
+    was rewritten within the mtime resolution or restored with an old mtime is
+    caught.
+    """
+    size = os.path.getsize(fasta_path)
+    if not entries:
+        return size == 0
+    name, length, offset, line_bases, line_bytes = entries[-1]
+    if offset > size:
+        return False
+    with open(fasta_path, 'rb') as f:
+        start = max(0, offset - len(name.encode()) - 4096)
+        f.seek(start)
+        header = f.read(offset - start).rstrip(b"\r\n").rsplit(b"\n", 1)[-1]
+        if not header.startswith(b'>') or header[1:].decode(errors="replace").split("\t")[0].strip() != name:
+            return False
+        if not line_bases:
+            # Irregular lines: the rest of the file is the record
+            tail = f.read()
+            return b'>' not in tail and len(b"".join(tail.split())) == length
+        full_lines, remainder = divmod(length, line_bases)
+        end = offset + full_lines * line_bytes + (remainder + line_bytes - line_bases if remainder else 0)
+        # The last line may lack its newline
+        if end > size + line_bytes - line_bases:
+            return False
+        f.seek(min(end, size))
+        return not f.read().strip()
+
+
+class FastaRecord:
+    """
+    Lazy view of one record of an indexed FASTA file; the sequence is read from the source file on access.
+    """
+
+    def __init__(self, fasta_path, name, length, offset, line_bases, line_bytes):
+        self.fasta_path = fasta_path
+        self.name = name
+        self.length = length
+        self.offset = offset
+        self.line_bases = line_bases
+        self.line_bytes = line_bytes
+
+    def read_bytes(self):
+        """
+        The raw sequence lines of the record, newlines included.
+        """
+        with open(self.fasta_path, 'rb') as f:
+            f.seek(self.offset)
+            if self.line_bases:
+                full_lines, remainder = divmod(self.length, self.line_bases)
+                size = full_lines * self.line_bytes + (remainder + self.line_bytes - self.line_bases if remainder else 0)
+                return f.read(size)
+            data = []
+            for line in f:
+                if line.startswith(b'>'):
+                    break
+                data.append(line)
+            return b"".join(data)
+
+    @property
+    def sequence(self):
+        return b"".join(self.read_bytes().split()).decode()
+
+    def write(self, path):
+        """
+        Write the record as a single-record FASTA file, copying its lines as they are.
+        """
+        data = self.read_bytes()
+        with open(path, 'wb') as f:
+            f.write(f">{self.name}\n".encode())
+            f.write(data if data.endswith(b"\n") else data + b"\n")
+
+    def __repr__(self):
+        return f"FastaRecord({self.name!r}, length={self.length})"
+
+
+class FastaIndex:
+    """
+    Random access by name to the records of a FASTA file, backed by a .fai-style index.
+
+    The index is stored next to the FASTA as <fasta>.fai and rebuilt whenever
+    the FASTA is newer or no longer matches it (see index_matches()). Records are FastaRecord views, so iterating over a
+    200k-sequence library holds only the index in memory.
+    """
+
+    def __init__(self, fasta_path, index_path=None, write_index=True):
+        self.fasta_path = str(fasta_path)
+        self.index_path = index_path or self.fasta_path + INDEX_SUFFIX
+        entries = None
+        if os.path.exists(self.index_path) and os.path.getmtime(self.index_path) >= os.path.getmtime(self.fasta_path):
+            try:
+                entries = read_fasta_index(self.index_path)
+            except ValueError:
+                pass  # Truncated or not a .fai
+            if entries is not None and not index_matches(self.fasta_path, entries):
+                entries = None
+        if entries is None:
+            with span(os.path.basename(self.fasta_path), "fasta_index"):
+                entries = build_fasta_index(self.fasta_path)
+            if write_index:
+                try:
+                    write_fasta_index(entries, self.index_path)
+                except OSError:
+                    pass  # Read-only input directory; the index just is not reused
+        self._records = {entry[0]: FastaRecord(self.fasta_path, *entry) for entry in entries}
+
+    @property
+    def names(self):
+        return list(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, name):
+        return name in self._records
+
+    def __getitem__(self, name):
+        return self._records[name]
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+
+def split_fasta(fasta_path, output_dir, index=None):
+    """
+    Split a FASTA file into individual sequences and save them as separate files.
+    Each sequence file name is sanitized before saving.
+
+    Records are copied straight from the source file through its index, and
+    names that collide once sanitized are rejected instead of silently
+    overwriting each other's files.
+
+    :return: List of the written FASTA paths
+    """
+    if index is None:
+        index = FastaIndex(fasta_path)
+    files = {}
+    for record in index:
+        sanitized_name = sanitize_name(record.name)
+        if sanitized_name in files:
+            raise ValueError(f"FASTA names in {fasta_path} collide as '{sanitized_name}'.")
+        seq_file_path = os.path.join(output_dir, f"{sanitized_name}.fasta")
+        record.write(seq_file_path)
+        files[sanitized_name] = seq_file_path
+    return list(files.values())
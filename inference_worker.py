@@ -0,0 +1,289 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import resource
+import time
+import traceback
+from functools import partial
+from pathlib import Path
+
+from supervisor import TERMINATE_GRACE, TOOL_POLICIES
+
+# run_inference keyword arguments used when a job does not override them
+DEFAULT_PARAMS = {
+    "num_trunk_recycles": 3,
+    "num_diffn_timesteps": 200,
+    "seed": 42,
+    "device": "cuda:0",
+    "use_esm_embeddings": True,
+}
+
+
+def chai_backend():
+    """
+    Backend factory for real predictions; runs inside the worker process.
+
+    chai_lab and torch are imported once per worker, so every job after the
+    first skips interpreter startup and the import cost.
+    """
+    from chai_lab.chai1 import run_inference
+    try:
+        import torch
+        cuda = torch.cuda.is_available()
+    except ImportError:  # The benchmark stand-in for chai_lab runs without torch
+        cuda = False
+
+    def run(job):
+        params = dict(DEFAULT_PARAMS, **job.get("params", {}))
+        if cuda:
+            torch.cuda.reset_peak_memory_stats(params["device"])
+        candidates = run_inference(
+            fasta_file=Path(job["fasta_file"]),
+            output_dir=Path(job["output_dir"]),
+            msa_directory=Path(job["msa_directory"]),
+            use_msa_server=False,
+            **params,
+        )
+        return {
+            "cif_paths": [str(p) for p in candidates.cif_paths],
+            "aggregate_scores": [float(rd.aggregate_score) for rd in candidates.ranking_data],
+            "peak_gpu_bytes": torch.cuda.max_memory_allocated(params["device"]) if cuda else None,
+        }
+
+    return run
+
+
+def stub_backend(delay=0.0, num_models=5, fail_names=(), crash_names=(), oom=None):
+    """
+    Backend factory that mimics chai without a GPU, for exercising the worker.
+
+    Each job sleeps for delay seconds and writes empty pred.model_idx_*.cif files.
+    Jobs whose name is in fail_names raise, and jobs whose name is in
+    crash_names kill the worker process outright. If oom is given, it is called
+    with each job and jobs for which it returns True fail with a CUDA
+    out-of-memory error, as a job too large for its device would.
+    """
+    def run(job):
+        if job.get("name") in crash_names:
+            os._exit(1)
+        if job.get("name") in fail_names:
+            raise RuntimeError(f"stub failure for {job['name']}")
+        if oom is not None and oom(job):
+            raise RuntimeError(f"CUDA out of memory on {job.get('params', {}).get('device')} (stub)")
+        time.sleep(delay)
+        output_dir = Path(job["output_dir"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        cif_paths = []
+        for i in range(num_models):
+            cif_path = output_dir / f"pred.model_idx_{i}.cif"
+            cif_path.write_text("data_stub\n")
+            cif_paths.append(str(cif_path))
+        return {"cif_paths": cif_paths, "aggregate_scores": [0.0] * num_models}
+
+    return run
+
+
+def _worker_main(backend_factory, job_queue, result_queue, current_job, started_at, batch_size):
+    backend = backend_factory()
+    result_queue.put(("ready", None, None))
+    while True:
+        # Take up to batch_size queued jobs at once
+        batch = [job_queue.get()]
+        while batch[-1] is not None and len(batch) < batch_size:
+            try:
+                batch.append(job_queue.get_nowait())
+            except queue.Empty:
+                break
+        for job in batch:
+            if job is None:
+                return
+            # Shared memory rather than a queue message, so the parent sees it even after a hard crash
+            start = time.monotonic()
+            started_at.value = start
+            current_job.value = job["job_id"]
+            try:
+                result = dict(backend(job), status="ok", error=None)
+            except Exception as e:
+                result = {"status": "failed", "error": f"{e}\n{traceback.format_exc()}",
+                          "cif_paths": [], "aggregate_scores": []}
+            result["seconds"] = time.monotonic() - start
+            result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Peak of the worker so far
+            result_queue.put(("done", job["job_id"], result))
+            current_job.value = -1
+
+
+class InferenceWorker:
+    """
+    Long-lived inference process that takes jobs from a queue.
+
+    The backend is built once when the process starts (chai_backend() by default),
+    so import and setup costs are paid once rather than once per complex. If the
+    process dies, it is restarted and the unfinished jobs are queued again. The
+    job that was running when it died counts one attempt and is reported as
+    failed after max_attempts.
+
+    A job running longer than job_timeout (a hung CUDA kernel, a deadlocked
+    data loader) gets the same treatment: the process is terminated, killed if
+    it lingers, and restarted, as supervisor.supervise() does with the tools it
+    runs.
+
+    A job is a dict with "fasta_file", "msa_directory" and "output_dir", plus an
+    optional "name", "params" (keyword arguments for run_inference) and
+    "timeout" (seconds, overriding job_timeout).
+
+    :param job_timeout: Seconds a job may run (default: the "predict" policy of supervisor.TOOL_POLICIES;
+                        None: no limit)
+    """
+
+    def __init__(self, backend_factory=chai_backend, batch_size=1, max_restarts=3, max_attempts=2,
+                 job_timeout=TOOL_POLICIES["predict"]["timeout"]):
+        self.backend_factory = backend_factory
+        self.batch_size = batch_size
+        self.max_restarts = max_restarts
+        self.max_attempts = max_attempts
+        self.job_timeout = job_timeout
+        self.restarts = 0
+        self._ids = itertools.count()
+        self._ctx = mp.get_context("spawn")  # CUDA cannot be used in forked children
+        self._process = None
+        self._pending = {}     # job_id -> job, in submission order
+        self._attempts = {}
+        self._finished = []
+
+    def start(self):
+        self._job_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._current_job = self._ctx.Value('q', -1, lock=False)
+        self._started_at = self._ctx.Value('d', 0.0, lock=False)  # time.monotonic() is the same clock in the child
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.backend_factory, self._job_queue, self._result_queue, self._current_job, self._started_at,
+                  self.batch_size),
+            daemon=True,
+        )
+        self._process.start()
+        for job in self._pending.values():
+            self._job_queue.put(job)
+
+    def submit(self, job):
+        """
+        Queue a job and return its job_id.
+        """
+        if self._process is None:
+            self.start()
+        job = dict(job, job_id=next(self._ids))
+        self._pending[job["job_id"]] = job
+        self._attempts[job["job_id"]] = 0
+        self._job_queue.put(job)
+        return job["job_id"]
+
+    def _finish(self, job_id, result):
+        job = self._pending.pop(job_id)
+        result.update(job_id=job_id, name=job.get("name"), output_dir=job["output_dir"],
+                      attempts=self._attempts.pop(job_id))
+        self._finished.append(result)
+
+    def _handle_crash(self, error=None):
+        exitcode = self._process.exitcode
+        print(f"Inference worker exited with code {exitcode}")
+        job_id = self._current_job.value
+        if job_id in self._pending:
+            self._attempts[job_id] += 1
+            if self._attempts[job_id] >= self.max_attempts:
+                self._finish(job_id, {"status": "failed", "error": error or f"worker crashed (exit code {exitcode})",
+                                      "cif_paths": [], "aggregate_scores": [], "seconds": None})
+        if self.restarts >= self.max_restarts:
+            for job_id in list(self._pending):
+                self._finish(job_id, {"status": "failed", "error": "inference worker restart limit reached",
+                                      "cif_paths": [], "aggregate_scores": [], "seconds": None})
+            self._process = None
+            return
+        self.restarts += 1
+        print(f"Restarting inference worker ({self.restarts}/{self.max_restarts})")
+        self.start()
+
+    def _check_deadline(self):
+        """
+        Terminate and restart the worker process if its current job has run past its timeout.
+        """
+        job = self._pending.get(self._current_job.value)
+        timeout = job.get("timeout", self.job_timeout) if job is not None else None
+        if timeout is None:
+            return
+        elapsed = time.monotonic() - self._started_at.value
+        if elapsed <= timeout:
+            return
+        print(f"Inference job {job.get('name') or job['job_id']} still running after {elapsed:.0f} s, "
+              f"terminating the worker")
+        self._process.terminate()
+        self._process.join(TERMINATE_GRACE)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._handle_crash(f"timed out after {timeout:g} s")
+
+    def _poll(self, timeout):
+        try:
+            kind, job_id, result = self._result_queue.get(timeout=timeout)
+        except queue.Empty:
+            if self._process is not None and not self._process.is_alive():
+                self._handle_crash()
+            elif self._process is not None:
+                self._check_deadline()
+            return
+        if kind == "done":
+            self._attempts[job_id] += 1
+            self._finish(job_id, result)
+
+    def poll(self, timeout=0.0):
+        """
+        Wait up to timeout seconds for progress and return the results finished so far.
+        """
+        if not self._finished and self._pending:
+            self._poll(timeout)
+        finished, self._finished = self._finished, []
+        return finished
+
+    def results(self, poll_interval=0.5):
+        """
+        Yield result dicts as jobs finish until every submitted job has a result.
+        """
+        while self._pending or self._finished:
+            if self._finished:
+                yield self._finished.pop(0)
+                continue
+            self._poll(poll_interval)
+
+    def run(self, job):
+        """
+        Run a single job and wait for its result.
+        """
+        job_id = self.submit(job)
+        while True:
+            for i, result in enumerate(self._finished):
+                if result["job_id"] == job_id:
+                    return self._finished.pop(i)
+            self._poll(0.5)
+
+    def close(self):
+        if self._process is not None and self._process.is_alive():
+            self._job_queue.put(None)
+            self._process.join(timeout=30)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stub_worker(**kwargs):
+    """
+    InferenceWorker backed by stub_backend(), with kwargs passed to the backend.
+    """
+    return InferenceWorker(backend_factory=partial(stub_backend, **kwargs))
@@ -0,0 +1,330 @@
+"""
+k-mer prefilter for the MSA search database.
+
+An index is built once, offline, over a sequence database FASTA. For each
+query chain, the index returns the database sequences that share enough
+(spaced) k-mers with the query. Only that subset is handed to the MSA tool as
+its target database, so jackhmmer scans thousands of sequences instead of all
+of uniref90.
+
+    python cli.py kmer build uniref90.fasta uniref90.kmer --seed 11011
+    python cli.py kmer query uniref90.kmer chain.fasta -o candidates.fasta
+    python cli.py kmer evaluate uniref90.kmer chain1.fasta chain1.a3m [chain2.fasta chain2.a3m ...]
+    python cli.py run batch/ --prefilter-index uniref90.kmer   # also msa and queue submit
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from fasta_index import iter_fasta_blocks, iter_fasta_records
+from tracing import span
+
+ALPHABET = b"ACDEFGHIKLMNPQRSTVWY"
+UNKNOWN = 255
+
+_CODES = np.full(256, UNKNOWN, dtype=np.uint8)
+for _i, _aa in enumerate(ALPHABET):
+    _CODES[_aa] = _i
+    _CODES[ord(chr(_aa).lower())] = _i
+
+
+def seed_positions(seed):
+    """
+    Positions used by a spaced seed such as "11011" (a plain k-mer is "1" * k).
+    """
+    positions = np.array([i for i, c in enumerate(seed) if c == "1"], dtype=np.int64)
+    if not len(positions) or seed[0] != "1" or seed[-1] != "1":
+        raise ValueError(f"Invalid seed '{seed}': it must start and end with '1'.")
+    return positions
+
+
+def kmer_codes(sequence, positions):
+    """
+    Distinct k-mer codes of a sequence for the given seed positions; windows with non-standard residues are skipped.
+    """
+    codes = _CODES[np.frombuffer(sequence.encode(), dtype=np.uint8)].astype(np.int64)
+    windows = len(codes) - int(positions[-1])
+    if windows <= 0:
+        return np.empty(0, dtype=np.int64)
+    columns = codes[np.arange(windows)[:, None] + positions[None, :]]
+    valid = (columns != UNKNOWN).all(axis=1)
+    weights = len(ALPHABET) ** np.arange(len(positions) - 1, -1, -1, dtype=np.int64)
+    return np.unique(columns[valid] @ weights)
+
+
+def _chunk_codes(sequences, positions, chunk_size):
+    """
+    (k-mer codes, database positions) of every (k-mer, sequence) pair, chunk_size sequences at a time.
+    """
+    codes_buffer, ids_buffer = [], []
+    for seq_id, sequence in enumerate(sequences):
+        codes = kmer_codes(sequence, positions)
+        codes_buffer.append(codes)
+        ids_buffer.append(np.full(len(codes), seq_id, dtype=np.uint32))
+        if len(codes_buffer) >= chunk_size:
+            yield np.concatenate(codes_buffer), np.concatenate(ids_buffer)
+            codes_buffer, ids_buffer = [], []
+    if codes_buffer:
+        yield np.concatenate(codes_buffer), np.concatenate(ids_buffer)
+
+
+def _save_spooled(tmp_path, path, dtype):
+    """
+    Turn a file of raw dtype values into an .npy file, without loading it into memory.
+    """
+    count = os.path.getsize(tmp_path) // np.dtype(dtype).itemsize
+    array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(count,))
+    if count:
+        array[:] = np.memmap(tmp_path, dtype=dtype, mode='r')
+    array.flush()
+    del array
+    os.remove(tmp_path)
+
+
+def _scan_records(database_fasta, index_dir, counter):
+    """
+    Stream the sequences of a database FASTA, spooling the record table to index_dir on the way.
+
+    record_offsets.npy gets the byte offset of every record's header plus the
+    end of the last record, so record i is the bytes between entries i and i+1.
+    name_offsets.npy and names.npy hold the first word of every header (the
+    name MSA tools report hits under) as one byte string with CSR offsets.
+
+    :param counter: Dict whose "num_sequences" is set once the stream is exhausted
+    """
+    paths = {name: os.path.join(index_dir, f"{name}.npy") for name in ("record_offsets", "name_offsets", "names")}
+    with open(f"{paths['record_offsets']}.tmp", 'wb') as offsets_file, \
+            open(f"{paths['name_offsets']}.tmp", 'wb') as name_offsets_file, \
+            open(f"{paths['names']}.tmp", 'wb') as names_file:
+        name_end = end = num_sequences = 0
+        name_offsets_file.write(struct.pack("q", 0))
+        for name, sequence, offset, size in iter_fasta_blocks(database_fasta):
+            word = name.split()[0].encode() if name.split() else b""
+            names_file.write(word)
+            name_end += len(word)
+            name_offsets_file.write(struct.pack("q", name_end))
+            offsets_file.write(struct.pack("q", offset))
+            end = offset + size
+            num_sequences += 1
+            yield sequence
+        offsets_file.write(struct.pack("q", end))
+    _save_spooled(f"{paths['record_offsets']}.tmp", paths["record_offsets"], np.int64)
+    _save_spooled(f"{paths['name_offsets']}.tmp", paths["name_offsets"], np.int64)
+    _save_spooled(f"{paths['names']}.tmp", paths["names"], np.uint8)
+    counter["num_sequences"] = num_sequences
+
+
+def build_kmer_index(database_fasta, index_dir, seed="11011", chunk_size=10000):
+    """
+    Build a CSR k-mer -> sequence index of a database FASTA.
+
+    offsets.npy has one entry per possible k-mer code plus one, and
+    postings.npy holds the database positions (in FASTA order) of the
+    sequences containing each k-mer. Both are loaded memory-mapped.
+
+    The database is streamed twice: a first pass counts the sequences of every
+    k-mer, which gives the offsets, and spools the record table (see
+    _scan_records()) that queries use to copy candidates out of the FASTA; a
+    second pass writes each chunk's postings into their slots of a
+    memory-mapped postings.npy. Memory use is the offsets plus one chunk of
+    k-mers, however large the database.
+
+    :param chunk_size: Number of sequences whose k-mers are held in memory at once
+    :return: Dict of index metadata
+    """
+    positions = seed_positions(seed)
+    num_codes = len(ALPHABET) ** len(positions)
+    os.makedirs(index_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    with span(os.path.basename(str(database_fasta)), "kmer_index_build"):
+        counts = np.zeros(num_codes, dtype=np.int64)
+        scanned = {}
+        for codes, _ in _chunk_codes(_scan_records(database_fasta, index_dir, scanned), positions, chunk_size):
+            counts += np.bincount(codes, minlength=num_codes)
+        offsets = np.zeros(num_codes + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        del counts
+
+        postings_path = os.path.join(index_dir, "postings.npy")
+        tmp_path = f"{postings_path}.tmp"
+        postings = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint32, shape=(int(offsets[-1]),))
+        # Next free slot of every k-mer's posting list; chunks come in database order, so the lists stay sorted
+        cursor = offsets[:-1].copy()
+        sequences = (sequence for _, sequence in iter_fasta_records(database_fasta))
+        for codes, ids in _chunk_codes(sequences, positions, chunk_size):
+            order = np.argsort(codes, kind="stable")
+            codes, ids = codes[order], ids[order]
+            unique, first, run_lengths = np.unique(codes, return_index=True, return_counts=True)
+            rank = np.arange(len(codes)) - np.repeat(first, run_lengths)
+            postings[cursor[codes] + rank] = ids
+            cursor[unique] += run_lengths
+        postings.flush()
+        num_postings = len(postings)
+        del postings
+        os.replace(tmp_path, postings_path)
+
+    np.save(os.path.join(index_dir, "offsets.npy"), offsets)
+    meta = {
+        "database": os.path.abspath(str(database_fasta)),
+        "database_size": os.path.getsize(database_fasta),
+        "database_mtime": os.path.getmtime(database_fasta),
+        "num_sequences": scanned["num_sequences"],
+        "seed": seed,
+        "num_postings": int(num_postings),
+        "build_seconds": time.perf_counter() - start,
+    }
+    with open(os.path.join(index_dir, "meta.json"), 'w') as f:
+        json.dump(meta, f, indent=1)
+    print(f"Indexed {meta['num_sequences']} sequences ({meta['num_postings']} postings) "
+          f"in {meta['build_seconds']:.1f} s")
+    return meta
+
+
+class KmerIndex:
+    """
+    Query side of a k-mer index built by build_kmer_index().
+
+    A database sequence is a candidate for a query when it shares at least
+    min_shared distinct k-mers with it. k-mers found in more than
+    max_frequency of the database (low-complexity stretches, linkers) are
+    ignored, and at most max_candidates sequences are kept, those sharing
+    the most k-mers first.
+    """
+
+    def __init__(self, index_dir, min_shared=3, max_candidates=20000, max_frequency=0.05):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+        self.positions = seed_positions(self.meta["seed"])
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode='r')
+        self.postings = np.load(os.path.join(index_dir, "postings.npy"), mmap_mode='r')
+        if not os.path.exists(os.path.join(index_dir, "record_offsets.npy")):
+            raise FileNotFoundError(f"k-mer index {index_dir} has no record table; rebuild it with "
+                                    f"`python cli.py kmer build`.")
+        self.record_offsets = np.load(os.path.join(index_dir, "record_offsets.npy"), mmap_mode='r')
+        self.name_offsets = np.load(os.path.join(index_dir, "name_offsets.npy"), mmap_mode='r')
+        self.names = np.load(os.path.join(index_dir, "names.npy"), mmap_mode='r')
+        self.min_shared = min_shared
+        self.max_candidates = max_candidates
+        self.max_frequency = max_frequency
+
+    def settings(self):
+        """
+        Constructor arguments of this index, as JSON, so queue workers on other hosts can open the same one.
+        """
+        return {"index_dir": os.path.abspath(self.index_dir), "min_shared": self.min_shared,
+                "max_candidates": self.max_candidates, "max_frequency": self.max_frequency}
+
+    def name(self, seq_id):
+        """
+        Name (first header word) of the database sequence at a position.
+        """
+        return self.names[self.name_offsets[seq_id]:self.name_offsets[seq_id + 1]].tobytes().decode()
+
+    def label(self, database):
+        """
+        Name for searches against this index's subsets, so their MSAs are never mixed up with full searches.
+        """
+        settings = json.dumps([self.meta["database"], self.meta["database_mtime"], self.meta["seed"],
+                               self.min_shared, self.max_candidates, self.max_frequency])
+        return f"{database}@kmer-{hashlib.sha256(settings.encode()).hexdigest()[:12]}"
+
+    def candidates(self, sequence):
+        """
+        Database positions of the candidate sequences for a query, best first.
+        """
+        codes = kmer_codes(sequence, self.positions)
+        starts = self.offsets[codes]
+        lengths = self.offsets[codes + 1] - starts
+        keep = lengths <= max(1, self.max_frequency * self.meta["num_sequences"])
+        hits = [self.postings[s:s + n] for s, n in zip(starts[keep], lengths[keep]) if n]
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+        shared = np.bincount(np.concatenate(hits), minlength=self.meta["num_sequences"])
+        selected = np.flatnonzero(shared >= self.min_shared)
+        order = np.argsort(-shared[selected], kind="stable")
+        return selected[order][:self.max_candidates]
+
+    def write_subset(self, sequence, output_fasta):
+        """
+        Write the candidate sequences for a query as a FASTA database.
+
+        :return: Number of sequences written
+        """
+        with span(os.path.basename(str(output_fasta)), "kmer_prefilter") as fields:
+            ids = self.candidates(sequence)
+            # Records are copied as they are in the database, header included, one seek each in file order
+            with open(self.meta["database"], 'rb') as database, open(output_fasta, 'wb') as f:
+                for seq_id in np.sort(ids):
+                    start, end = self.record_offsets[seq_id:seq_id + 2]
+                    database.seek(int(start))
+                    data = database.read(int(end - start))
+                    f.write(data if data.endswith(b"\n") else data + b"\n")
+            fields.update(candidates=len(ids), database_sequences=self.meta["num_sequences"])
+        return len(ids)
+
+
+def a3m_hit_names(a3m_path):
+    """
+    Names of the hits in an A3M (first word of each header, query excluded).
+    """
+    names = set()
+    with open(a3m_path, 'r') as f:
+        first = True
+        for line in f:
+            if line.startswith('>'):
+                if not first:
+                    names.add(line[1:].split()[0])
+                first = False
+    return names
+
+
+def evaluate(index, queries):
+    """
+    Recall and search-space reduction of the prefilter against full-search results.
+
+    :param index: KmerIndex
+    :param queries: List of (query name, sequence, set of database names a full search found)
+    :return: List of per-query report dicts
+    """
+    reports = []
+    for name, sequence, truth in queries:
+        start = time.perf_counter()
+        ids = index.candidates(sequence)
+        seconds = time.perf_counter() - start
+        found = {index.name(i) for i in ids}
+        reports.append({
+            "query": name,
+            "true_hits": len(truth),
+            "candidates": len(ids),
+            "recall": len(found & truth) / len(truth) if truth else None,
+            "fraction_of_database": len(ids) / index.meta["num_sequences"],
+            "query_seconds": seconds,
+        })
+    return reports
+
+
+def print_evaluation(reports):
+    print("{:<30} {:>9} {:>11} {:>8} {:>10} {:>9}".format(
+        "query", "true hits", "candidates", "recall", "db frac", "query s"))
+    for r in reports:
+        recall = "n/a" if r["recall"] is None else f"{r['recall']:.3f}"
+        print("{:<30} {:>9} {:>11} {:>8} {:>10.4f} {:>9.3f}".format(
+            r["query"][:30], r["true_hits"], r["candidates"], recall, r["fraction_of_database"], r["query_seconds"]))
+
+
+def main():
+    # Same as `python cli.py kmer ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["kmer"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
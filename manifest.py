@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = "pipeline_manifest.json"
+
+
+def sha256_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    Per-run record of every stage's inputs, parameters, outputs and status.
+
+    Stage entries are keyed by (stage, key), e.g. ("msa", "<complex>/<chain>")
+    or ("inference", "<complex>"). A stage counts as done only if it finished,
+    its input hashes and parameters match the current ones, and its outputs
+    still exist, so a rerun redoes exactly what changed or failed.
+
+    Content hashes are memoized by (size, mtime), so replanning a large batch
+    does not re-read unchanged alignments.
+
+    Every update is appended to <path>.journal as one JSON line holding the
+    changed entry and the file hashes computed since the previous line, so an
+    update costs the same however large the batch is. save() writes the whole
+    manifest atomically and empties the journal; it runs every compact_every
+    updates and when a pipeline finishes. Loading replays the journal over the
+    last snapshot, so a run killed at any point leaves a valid manifest.
+    """
+
+    def __init__(self, path, compact_every=1000):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._new_files = set()  # Hashes not yet written to the journal or a snapshot
+        self._journal_lines = 0
+        self.data = {"stages": {}, "files": {}}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.data = json.load(f)
+        if os.path.exists(self.journal_path):
+            self._replay()
+
+    def _replay(self):
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # The last line of a run killed mid-write
+                self.data["files"].update(record["files"])
+                self.data["stages"].setdefault(record["stage"], {})[record["key"]] = record["entry"]
+                self._journal_lines += 1
+
+    def save(self):
+        """
+        Write the whole manifest and empty the journal.
+        """
+        with self._lock:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.data, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            # Replaying a journal that outlived the snapshot would only rewrite the same entries
+            with open(self.journal_path, 'w'):
+                pass
+            self._new_files.clear()
+            self._journal_lines = 0
+
+    def fingerprint(self, path):
+        """
+        Content hash of a file, recomputed only when its size or mtime changed.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            known = self.data["files"].get(path)
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known["sha256"]
+        digest = sha256_file(path)
+        with self._lock:
+            self.data["files"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            self._new_files.add(path)
+        return digest
+
+    def fingerprints(self, paths):
+        return {os.path.abspath(p): self.fingerprint(p) for p in paths}
+
+    def entry(self, stage, key):
+        with self._lock:
+            return self.data["stages"].get(stage, {}).get(key)
+
+    def is_done(self, stage, key, inputs, params=None):
+        entry = self.entry(stage, key)
+        if entry is None or entry["status"] != "done":
+            return False
+        if entry["inputs"] != inputs or entry["params"] != (params or {}):
+            return False
+        return all(os.path.exists(p) for p in entry["outputs"])
+
+    def _update(self, stage, key, **fields):
+        with self._lock:
+            entry = self.data["stages"].setdefault(stage, {}).setdefault(key, {})
+            entry.update(fields, updated=time.time())
+            if self._journal_lines >= self.compact_every:
+                self.save()
+                return
+            record = {"stage": stage, "key": key, "entry": entry,
+                      "files": {path: self.data["files"][path] for path in self._new_files}}
+            with open(self.journal_path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+            self._new_files.clear()
+            self._journal_lines += 1
+
+    def mark_running(self, stage, key, inputs, params=None):
+        self._update(stage, key, status="running", inputs=inputs, params=params or {}, outputs=[], error=None)
+
+    def mark_done(self, stage, key, inputs, params=None, outputs=(), **extra):
+        self._update(stage, key, status="done", inputs=inputs, params=params or {},
+                     outputs=[os.path.abspath(p) for p in outputs], error=None, **extra)
+
+    def mark_failed(self, stage, key, inputs, params=None, error=None):
+        self._update(stage, key, status="failed", inputs=inputs, params=params or {}, outputs=[], error=error)
+
+    def summary(self):
+        """
+        Count entries per stage and status, e.g. {"msa": {"done": 10, "failed": 1}}.
+        """
+        counts = {}
+        with self._lock:
+            for stage, entries in self.data["stages"].items():
+                for entry in entries.values():
+                    counts.setdefault(stage, {}).setdefault(entry["status"], 0)
+                    counts[stage][entry["status"]] += 1
+        return counts
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def read_atom_site(cif_path):
+    """
+    Read the _atom_site loop of an mmCIF file such as chai's pred.model_idx_*.cif.
+
+    Values are split on whitespace, which holds for the atom_site records chai
+    writes (no quoted values with spaces).
+
+    :return: Dict of field name (without the "_atom_site." prefix) -> numpy string array;
+             empty if the file has no atom_site loop
+    """
+    fields = []
+    rows = []
+    with open(cif_path, 'r') as f:
+        lines = iter(f)
+        for line in lines:
+            if line.startswith("_atom_site."):
+                fields.append(line.strip()[len("_atom_site."):])
+                break
+        for line in lines:
+            if line.startswith("_atom_site."):
+                fields.append(line.strip()[len("_atom_site."):])
+                continue
+            if not line.strip() or line.startswith(("#", "loop_", "_", "data_")):
+                break
+            rows.append(line.split())
+    if not fields:
+        return {}
+    if any(len(row) != len(fields) for row in rows):
+        raise ValueError(f"Malformed _atom_site loop in {cif_path}.")
+    table = np.array(rows, dtype=str).reshape(len(rows), len(fields))
+    return {name: table[:, i] for i, name in enumerate(fields)}
+
+
+def chain_plddt(atom_site):
+    """
+    Mean pLDDT per chain from the B-factor column, in order of first appearance.
+
+    :param atom_site: Dict from read_atom_site()
+    :return: (list of chain ids, numpy array of mean pLDDT per chain)
+    """
+    if not atom_site:
+        return [], np.empty(0)
+    chains, first, inverse = np.unique(atom_site["auth_asym_id"], return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    plddt = atom_site["B_iso_or_equiv"].astype(np.float64)
+    means = np.bincount(inverse, weights=plddt) / np.bincount(inverse)
+    return [str(c) for c in chains[order]], means[order]
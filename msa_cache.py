@@ -0,0 +1,252 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from staging import DEFAULT_METHODS, LINK_METHODS, stage_file
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/chai_pipeline/msa")
+# An eviction frees the cache down to this fraction of max_bytes, so the next puts need not evict again
+EVICT_TO = 0.9
+
+
+def sequence_hash(sequence):
+    """
+    SHA-256 of the upper-cased sequence, the same hash chai uses to name .aligned.pqt files.
+    """
+    return hashlib.sha256(sequence.upper().encode()).hexdigest()
+
+
+def msa_cache_key(sequence, package, database, iterations, msa_filter=None):
+    """
+    Cache key combining the sequence hash with the parameters of the MSA search
+    and, if the alignment was reduced before conversion, the msa_filter settings.
+    """
+    params = {
+        "sequence": sequence_hash(sequence),
+        "package": package,
+        "database": database,
+        "iterations": int(iterations),
+    }
+    if msa_filter:
+        params["msa_filter"] = msa_filter
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def read_a3m_query(a3m_path):
+    """
+    Return the query (first) sequence of an A3M file.
+    """
+    seq_data = []
+    with open(a3m_path, 'r') as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            if line.startswith('>'):
+                if seq_data:
+                    break
+                continue
+            seq_data.append(line.strip())
+    return "".join(seq_data)
+
+
+class MSACache:
+    """
+    Persistent content-addressed store of A3M/.aligned.pqt pairs.
+
+    Entries live under <cache_dir>/<key[:2]>/<key>/ and are keyed by msa_cache_key().
+    The mtime of each entry's meta.json is its last-use time for LRU eviction.
+    Several pipeline processes may share one cache directory: entries are
+    published with an atomic rename, and readers hold a shared flock on
+    <cache_dir>/.lock while eviction holds it exclusively.
+
+    The total size of all entries is kept in <cache_dir>/.size, updated under the
+    lock by every put, so only a put that takes the cache over max_bytes scans
+    the entries; eviction recounts them and corrects the counter.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=50 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @contextmanager
+    def _lock(self, mode):
+        with open(os.path.join(self.cache_dir, ".lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _add_size(self, n):
+        """
+        Add n bytes to the size counter and return the new total; call with the exclusive lock held.
+
+        A cache without a counter (e.g. one written before it existed) is counted once.
+        """
+        size_path = os.path.join(self.cache_dir, ".size")
+        try:
+            with open(size_path, 'r') as f:
+                total = int(f.read()) + n
+        except (FileNotFoundError, ValueError):
+            total = sum(size for _, size, _ in self._entries())
+        self._write_size(total)
+        return total
+
+    def _write_size(self, total):
+        size_path = os.path.join(self.cache_dir, ".size")
+        tmp_path = f"{size_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(total))
+        os.replace(tmp_path, size_path)
+
+    def contains(self, sequence, package, database, iterations, msa_filter=None):
+        """
+        Whether an entry is cached, without taking the lock or marking it as used (e.g. for a dry run).
+        """
+        key = msa_cache_key(sequence, package, database, iterations, msa_filter)
+        return os.path.exists(os.path.join(self._entry_dir(key), "meta.json"))
+
+    def get(self, sequence, package, database, iterations, msa_filter=None):
+        """
+        Return the metadata of a cached entry, or None on a miss.
+        """
+        key = msa_cache_key(sequence, package, database, iterations, msa_filter)
+        meta_path = os.path.join(self._entry_dir(key), "meta.json")
+        with self._lock(fcntl.LOCK_SH):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                os.utime(meta_path)  # Mark the entry as recently used
+            except FileNotFoundError:
+                return None
+        meta["path"] = self._entry_dir(key)
+        return meta
+
+    def fetch(self, sequence, package, database, iterations, dest_dir, a3m=False, msa_filter=None):
+        """
+        Stage a cached .aligned.pqt (and optionally the A3M) into dest_dir, see staging.stage_file().
+
+        Reflinks, hardlinks (of the pqt, which is only ever replaced by a rename) and copies survive
+        eviction of the entry, so no symlinks are used.
+
+        :return: List of staged file paths, or None on a miss
+        """
+        key = msa_cache_key(sequence, package, database, iterations, msa_filter)
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        copied = []
+        with self._lock(fcntl.LOCK_SH):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+            except FileNotFoundError:
+                return None
+            names = [meta["pqt"]]
+            if a3m and meta.get("a3m"):
+                names.append(meta["a3m"])
+            os.makedirs(dest_dir, exist_ok=True)
+            for name in names:
+                dest = os.path.join(dest_dir, name)
+                methods = LINK_METHODS if name == meta["pqt"] else DEFAULT_METHODS
+                stage_file(os.path.join(entry_dir, name), dest, methods)
+                copied.append(dest)
+            os.utime(meta_path)
+        print(f"MSA cache hit for {meta['sequence_hash'][:12]}..., staged {len(copied)} file(s) in {dest_dir}")
+        return copied
+
+    def put(self, sequence, package, database, iterations, pqt_path, a3m_path=None, msa_filter=None):
+        """
+        Store a converted MSA in the cache and evict old entries if that takes it over max_bytes.
+
+        If another process already published the same key, its entry is kept.
+        """
+        key = msa_cache_key(sequence, package, database, iterations, msa_filter)
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return entry_dir
+
+        # Stage the entry next to its final location so the publish is a single rename
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(entry_dir))
+        try:
+            meta = {
+                "sequence_hash": sequence_hash(sequence),
+                "package": package,
+                "database": database,
+                "iterations": int(iterations),
+                "msa_filter": msa_filter,
+                "pqt": os.path.basename(pqt_path),
+                "a3m": None,
+                "created": time.time(),
+            }
+            stage_file(pqt_path, os.path.join(tmp_dir, meta["pqt"]), LINK_METHODS)
+            # The A3M is never linked: the search that produced it rewrites it in place when rerun
+            if a3m_path:
+                meta["a3m"] = f"{database}.a3m"
+                stage_file(a3m_path, os.path.join(tmp_dir, meta["a3m"]))
+            meta["size"] = sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir))
+            with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+                json.dump(meta, f)
+
+            total = None
+            with self._lock(fcntl.LOCK_EX):
+                try:
+                    os.rename(tmp_dir, entry_dir)
+                except OSError:
+                    # Lost the race against another process storing the same key
+                    pass
+                else:
+                    total = self._add_size(meta["size"])
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if total is not None and total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+        return entry_dir
+
+    def _entries(self):
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if prefix.startswith('.') or not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                meta_path = os.path.join(prefix_dir, key, "meta.json")
+                if key.startswith('.') or not os.path.exists(meta_path):
+                    continue
+                with open(meta_path, 'r') as f:
+                    size = json.load(f).get("size", 0)
+                yield os.path.getmtime(meta_path), size, os.path.join(prefix_dir, key)
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+
+        :return: List of removed entry directories
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = []
+        with self._lock(fcntl.LOCK_EX):
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_dir in entries:
+                if total <= max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                removed.append(entry_dir)
+            self._write_size(total)
+        for entry_dir in removed:
+            print(f"Evicted {entry_dir} from the MSA cache")
+        return removed
@@ -0,0 +1,164 @@
+import time
+from pathlib import Path
+
+import numpy as np
+
+from a3m_to_pqt import iter_a3m_records
+from tracing import span
+
+AMINO_ACIDS = b"ARNDCQEGHILKMFPSTWYV"
+UNKNOWN = len(AMINO_ACIDS)   # X, B, Z, U, O and anything else upper-case
+GAP = UNKNOWN + 1
+
+# Byte -> residue code; lower-case letters and '.' are insertions and, like whitespace, carry no column
+_CODES = np.full(256, UNKNOWN, dtype=np.uint8)
+for _i, _aa in enumerate(AMINO_ACIDS):
+    _CODES[_aa] = _i
+_CODES[ord('-')] = GAP
+_IS_COLUMN = np.ones(256, dtype=bool)
+_IS_COLUMN[ord('a'):ord('z') + 1] = False
+for _c in b".\n\r\t ":
+    _IS_COLUMN[_c] = False
+
+
+def encode_alignment(sequences):
+    """
+    Encode A3M rows as an (N, L) uint8 matrix of residue codes over the query columns.
+
+    Insertions (lower-case letters and '.') are removed, so every row is left
+    with exactly one code per query column.
+    """
+    buffer = np.frombuffer("\n".join(sequences).encode(), dtype=np.uint8)
+    columns = buffer[_IS_COLUMN[buffer]]
+    if columns.size % len(sequences):
+        raise ValueError("A3M rows do not all have the same number of match columns.")
+    return _CODES[columns].reshape(len(sequences), -1)
+
+
+def one_hot(matrix):
+    """
+    Flattened float32 one-hot encoding of the 20 standard residues; gaps and unknowns are all-zero.
+
+    The dot product of two encoded rows is the number of columns where both
+    rows have the same standard residue. At 80 bytes per residue this is meant
+    for a block of rows at a time, never for a whole alignment.
+    """
+    n, length = matrix.shape
+    encoded = np.zeros((n, length, len(AMINO_ACIDS)), dtype=np.float32)
+    rows, cols = np.nonzero(matrix < UNKNOWN)
+    encoded[rows, cols, matrix[rows, cols]] = 1.0
+    return encoded.reshape(n, -1)
+
+
+def _identity(matches, lengths_a, lengths_b):
+    # Identity relative to the shorter (fewer non-gap columns) of the two sequences
+    shorter = np.minimum(lengths_a[:, None], lengths_b[None, :])
+    return matches / np.maximum(shorter, 1)
+
+
+def filter_alignment(matrix, max_identity=0.9, min_coverage=0.0, max_depth=None, block_size=512):
+    """
+    Select the rows of an encoded alignment to keep, similar to hhfilter -id/-cov.
+
+    Steps, each vectorised over the whole alignment or a block of rows:
+    exact duplicates are dropped, rows covering less than min_coverage of the
+    query columns are dropped, and then rows are kept greedily in order unless
+    they are at least max_identity identical to a row already kept. The query
+    (row 0) is always kept. Identities are computed block by block as one-hot
+    matrix products, so there is no per-pair Python loop. Kept rows are held as
+    indices into matrix and expanded to one-hot a block at a time, so the memory
+    used besides matrix is bounded by block_size, not by the filtered depth.
+
+    :param matrix: (N, L) uint8 matrix from encode_alignment()
+    :param max_identity: Maximum pairwise identity between kept rows (1.0 disables clustering)
+    :param min_coverage: Minimum fraction of query columns a row must cover
+    :param max_depth: Keep at most this many rows, query included
+    :param block_size: Number of candidate rows compared at once
+    :return: (sorted array of kept row indices, dict of depths after each step)
+    """
+    depths = {"input": len(matrix)}
+
+    # Exact duplicates: keep the first occurrence of every distinct row
+    _, first = np.unique(matrix, axis=0, return_index=True)
+    keep = np.zeros(len(matrix), dtype=bool)
+    keep[first] = True
+    keep[0] = True
+    depths["dedup"] = int(keep.sum())
+
+    lengths = (matrix != GAP).sum(axis=1)
+    if min_coverage > 0:
+        keep &= lengths >= min_coverage * matrix.shape[1]
+        keep[0] = True
+    depths["coverage"] = int(keep.sum())
+
+    candidates = np.flatnonzero(keep)
+    if max_identity < 1.0:
+        kept = candidates[:1]
+        for start in range(1, len(candidates), block_size):
+            block = candidates[start:start + block_size]
+            block_onehot = one_hot(matrix[block])
+            block_lengths = lengths[block]
+
+            # Against everything kept so far, one block of kept rows at a time; rows found redundant drop out
+            alive = np.arange(len(block))
+            for reps_start in range(0, len(kept), block_size):
+                reps = kept[reps_start:reps_start + block_size]
+                identity = _identity(block_onehot[alive] @ one_hot(matrix[reps]).T, block_lengths[alive],
+                                     lengths[reps])
+                alive = alive[identity.max(axis=1) < max_identity]
+                if not len(alive):
+                    break
+
+            # Within the block, earlier rows win
+            identity = _identity(block_onehot[alive] @ block_onehot[alive].T,
+                                 block_lengths[alive], block_lengths[alive])
+            redundant = np.triu(identity >= max_identity, k=1)
+            selected = np.ones(len(alive), dtype=bool)
+            for i in range(len(alive)):
+                if selected[i]:
+                    selected[redundant[i]] = False
+
+            kept = np.concatenate([kept, block[alive[selected]]])
+            if max_depth and len(kept) >= max_depth:
+                break
+        candidates = kept
+    depths["identity"] = len(candidates)
+
+    if max_depth:
+        candidates = candidates[:max_depth]
+    depths["output"] = len(candidates)
+    return np.sort(candidates), depths
+
+
+def filter_a3m(a3m_path, output_path, max_identity=0.9, min_coverage=0.0, max_depth=None):
+    """
+    Write a reduced copy of an A3M file, keeping the original records of the selected rows.
+
+    :return: Report dict with the depth after each filtering step and timings in seconds
+    """
+    with span(str(a3m_path), "filter") as fields:
+        start = time.perf_counter()
+        records = list(iter_a3m_records(a3m_path))
+        headers = [header for header, _ in records]
+        sequences = [sequence for _, sequence in records]
+        matrix = encode_alignment(sequences)
+        encoded = time.perf_counter()
+
+        kept, depths = filter_alignment(matrix, max_identity=max_identity, min_coverage=min_coverage,
+                                        max_depth=max_depth)
+        filtered = time.perf_counter()
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'w') as f:
+            for i in kept:
+                f.write(f">{headers[i]}\n{sequences[i]}\n")
+        fields.update(depth_in=depths["input"], depth_out=depths["output"])
+
+    report = dict(depths, a3m=str(a3m_path), length=matrix.shape[1],
+                  encode_seconds=encoded - start, filter_seconds=filtered - encoded,
+                  total_seconds=time.perf_counter() - start)
+    print(f"Filtered {a3m_path}: depth {depths['input']} -> {depths['output']} "
+          f"(dedup {depths['dedup']}, coverage {depths['coverage']}, identity {depths['identity']}) "
+          f"in {report['total_seconds']:.2f} s")
+    return report
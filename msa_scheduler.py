@@ -0,0 +1,265 @@
+import heapq
+import itertools
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import record_wait, run_command, span
+
+TGT_SCRIPT = "/home2/TGT_Package/A3M_TGT_Gen.sh"
+
+
+def read_fasta_sequence(fasta_path):
+    """
+    Return the concatenated sequence of a single-record FASTA file.
+    """
+    seq_data = []
+    with open(fasta_path, 'r') as f:
+        for line in f:
+            if not line.startswith('>'):
+                seq_data.append(line.strip())
+    return "".join(seq_data)
+
+
+def threads_for_length(length, max_threads, short_chain_length=150):
+    """
+    Pick the number of jackhmmer threads for a chain of the given length.
+
+    jackhmmer parallelises over database chunks, and short queries finish each
+    chunk so fast that extra threads mostly wait on I/O. Short chains therefore
+    get half the per-job cap so more of them can run side by side.
+
+    :param length: Length of the query sequence
+    :param max_threads: Upper bound on threads for a single job
+    :param short_chain_length: Chains at or below this length count as short
+    """
+    if length <= short_chain_length:
+        return max(1, max_threads // 2)
+    return max(1, max_threads)
+
+
+class CpuBudget:
+    """
+    Counting budget of CPU cores shared by all concurrently running MSA jobs.
+
+    Cores are granted strictly in order: a waiting job blocks every job behind it,
+    even ones small enough to fit in the cores already free, so the longest chain
+    queued first is not overtaken by short ones while it waits for its share.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.free = total
+        self._cond = threading.Condition()
+        self._waiting = []  # Heap of (priority, arrival) of the jobs waiting for cores
+        self._arrivals = itertools.count()
+
+    def acquire(self, n, priority=0):
+        """
+        Wait until n cores are free and this job is the first waiting one, then take the cores.
+
+        :param priority: Jobs with a lower value are granted first; equal ones in order of arrival
+        :return: The number of cores taken
+        """
+        # Never ask for more than the whole budget, or the job would wait forever
+        n = min(n, self.total)
+        with self._cond:
+            ticket = (priority, next(self._arrivals))
+            heapq.heappush(self._waiting, ticket)
+            while self._waiting[0] != ticket or self.free < n:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self.free -= n
+            # The next job in line may fit in what is left
+            self._cond.notify_all()
+        return n
+
+    def release(self, n):
+        with self._cond:
+            self.free += n
+            self._cond.notify_all()
+
+
+def build_msa_command(job, cpus, script_path=TGT_SCRIPT, package="jackhmm", database="uniref90", iterations=3):
+    """
+    Construct the A3M_TGT_Gen.sh command line for one chain.
+    """
+    return [
+        script_path,
+        "-c", str(cpus),              # CPU cores for this job
+        "-i", job["fasta"],           # Input individual FASTA file
+        "-o", job["output_dir"],      # Output directory
+        "-h", package,                # Package (e.g., jackhmm)
+        "-d", database,               # Database (e.g., uniref90)
+        "-n", str(iterations)         # Number of iterations (default: 3)
+    ]
+
+
+def run_msa_job(job, cpus, script_path=TGT_SCRIPT, package="jackhmm", database="uniref90", iterations=3,
+                prefilter=None, supervisor=None):
+    """
+    Run A3M_TGT_Gen.sh for a single chain and return a result record.
+
+    Failures are reported in the record instead of raised so that one bad chain
+    does not abort the rest of the batch.
+
+    With a prefilter (a kmer_index.KmerIndex), the chain is searched against
+    <output_dir>/candidates.fasta, the database sequences the prefilter picked
+    for it, instead of the full database.
+
+    With a supervisor (a supervisor.Supervisor), the script runs under its "msa"
+    timeout and retry policy and logs to <output_dir>/msa.log.
+
+    An A3M left next to the FASTA by an earlier search is unlinked first, so
+    the script writes a new file instead of rewriting one that later stages
+    hardlinked (see staging.LINK_METHODS).
+    """
+    result = {
+        "name": job["name"],
+        "fasta": job["fasta"],
+        "output_dir": job["output_dir"],
+        "length": job.get("length"),
+        "cpus": cpus,
+        "candidates": None,
+        "returncode": None,
+        "attempts": 1,
+        "status": "ok",
+        "error": None,
+    }
+    start = time.monotonic()
+    with span(job["name"], "msa", cpus=cpus, length=job.get("length")) as fields:
+        try:
+            try:
+                os.unlink(os.path.splitext(job["fasta"])[0] + ".a3m")
+            except FileNotFoundError:
+                pass
+            if prefilter is not None:
+                database = os.path.join(job["output_dir"], "candidates.fasta")
+                result["candidates"] = prefilter.write_subset(read_fasta_sequence(job["fasta"]), database)
+                print(f"Prefilter kept {result['candidates']} of {prefilter.meta['num_sequences']} "
+                      f"sequences for {job['name']}")
+            command = build_msa_command(job, cpus, script_path, package, database, iterations)
+            print("Running command: {}".format(" ".join(command)))
+            if supervisor is None:
+                result["returncode"], stats = run_command(command)
+            else:
+                stats = supervisor.run(command, tool="msa", name=job["name"],
+                                       log_path=os.path.join(job["output_dir"], "msa.log"))
+                result["returncode"] = stats["returncode"]
+                result["attempts"] = stats["attempts"]
+            fields.update(stats)
+            print(f"Successfully processed {job['fasta']} and saved results to {job['output_dir']}.")
+        except subprocess.CalledProcessError as e:
+            fields.update(e.stats)
+            result["returncode"] = e.returncode
+            result["status"] = "failed"
+            result["error"] = str(e)
+            print(f"Error processing {job['fasta']}: {e}")
+        except subprocess.TimeoutExpired as e:
+            fields.update(e.stats)
+            result["attempts"] = e.stats["attempts"]
+            result["status"] = "timeout"
+            result["error"] = str(e)
+            print(f"Error processing {job['fasta']}: {e}")
+        except OSError as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+            print(f"Error processing {job['fasta']}: {e}")
+        fields["status"] = result["status"]
+    result["seconds"] = time.monotonic() - start
+    result["max_rss_kb"] = fields.get("max_rss_kb")
+    return result
+
+
+def run_msa_jobs(jobs, total_cpus=None, max_threads=8, script_path=TGT_SCRIPT, package="jackhmm", database="uniref90", iterations=3,
+                 longest_first=True, on_done=None, prefilter=None, supervisor=None):
+    """
+    Run many per-chain MSA jobs concurrently under a shared CPU budget.
+
+    Each job is given a thread count from threads_for_length() and may only start
+    once that many cores are free in the budget. By default jobs are started
+    longest chain first so the slowest searches do not end up straggling at the
+    end of a batch.
+
+    :param jobs: List of dicts with "name", "fasta" and "output_dir" keys, and optionally "length"
+    :param total_cpus: Total cores shared by all jobs (default: os.cpu_count())
+    :param max_threads: Maximum number of threads given to any single job (default: 8)
+    :param script_path: Path of the MSA generation script (a stub may be used for testing)
+    :param package: The package to use (default: "jackhmm")
+    :param database: The database to use (default: "uniref90")
+    :param iterations: The number of iterations to run (default: 3)
+    :param longest_first: Start the longest chains first; if False, jobs start in the given order
+    :param on_done: Optional callback called as on_done(job, result) when each job finishes
+    :param prefilter: Optional kmer_index.KmerIndex; each chain is searched against its candidate subset only
+    :param supervisor: Optional supervisor.Supervisor that runs the script with a timeout and retries
+    :return: List of result dicts in the same order as jobs
+    """
+    if not jobs:
+        return []
+
+    total_cpus = total_cpus or os.cpu_count() or 1
+    max_threads = max(1, min(max_threads, total_cpus))
+    budget = CpuBudget(total_cpus)
+
+    for job in jobs:
+        if job.get("length") is None:
+            job["length"] = len(read_fasta_sequence(job["fasta"]))
+
+    order = list(range(len(jobs)))
+    if longest_first:
+        order.sort(key=lambda i: jobs[i]["length"], reverse=True)
+    results = [None] * len(jobs)
+
+    def run(rank, index):
+        job = jobs[index]
+        queued_at = time.perf_counter()
+        cpus = budget.acquire(threads_for_length(job["length"], max_threads), priority=rank)
+        record_wait(job["name"], queued_at, "cpu_wait")
+        try:
+            results[index] = run_msa_job(job, cpus, script_path, package, database, iterations, prefilter,
+                                         supervisor)
+        finally:
+            budget.release(cpus)
+        if on_done is not None:
+            on_done(job, results[index])
+
+    # Enough workers for every job to hold the smallest possible share of the budget
+    max_workers = min(len(jobs), max(1, total_cpus // max(1, max_threads // 2)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Submission order decides start order, also among jobs waiting for cores
+        for future in [executor.submit(run, rank, i) for rank, i in enumerate(order)]:
+            future.result()
+
+    return results
+
+
+def find_chain_a3ms(job):
+    """
+    Locate the .a3m file(s) produced for a chain.
+
+    A3M_TGT_Gen.sh leaves the alignment next to the input FASTA; failing that,
+    any .a3m directly in the job's output directory is used.
+    """
+    a3m_path = os.path.splitext(job["fasta"])[0] + ".a3m"
+    if os.path.exists(a3m_path):
+        return [a3m_path]
+    if not os.path.isdir(job["output_dir"]):
+        return []
+    return sorted(os.path.join(job["output_dir"], name) for name in os.listdir(job["output_dir"])
+                  if name.endswith(".a3m"))
+
+
+def print_msa_report(results):
+    """
+    Print a per-job success/failure table for a batch of MSA jobs.
+    """
+    failed = [r for r in results if r["status"] != "ok"]
+    print(f"MSA jobs: {len(results) - len(failed)} succeeded, {len(failed)} failed")
+    for r in results:
+        print("  {:<8} {:>6} aa {:>3} cpus {:>9.1f} s  {}".format(
+            r["status"], r["length"], r["cpus"], r["seconds"], r["name"]))
+    for r in failed:
+        print(f"  FAILED {r['name']}: {r['error']}")
+    return failed
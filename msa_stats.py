@@ -0,0 +1,231 @@
+"""
+MSA quality statistics and the routing gate applied before inference.
+
+Depth, per-position coverage and Neff are computed from a memory-mapped A3M
+and stored next to the chain's .aligned.pqt as <pqt>.stats.json. The gate then
+decides per chain whether it goes to inference with its MSA ("full"), without
+it ("single_sequence"), or whether the complex is not worth GPU time ("skip").
+
+    python cli.py msa-stats chain1.a3m [chain2.a3m ...] [--min-neff 16]
+"""
+import json
+import mmap
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from msa_filter import _CODES, _IS_COLUMN, GAP, UNKNOWN, encode_alignment, one_hot
+from tracing import span
+
+STATS_SUFFIX = ".stats.json"
+ROUTES = ("full", "single_sequence", "skip")
+
+
+class LowQualityMSAError(RuntimeError):
+    """
+    Raised when the MSA gate decides a complex should not be run at all.
+    """
+
+
+def stats_path(pqt_path):
+    return Path(f"{pqt_path}{STATS_SUFFIX}")
+
+
+def parse_a3m_buffer(buffer):
+    """
+    Encode the rows of an A3M held in a uint8 buffer as an (N, L) matrix, without a Python loop over rows.
+
+    Header ('>') and comment ('#') lines are dropped, as are insertions, so
+    every row is left with one code per query column.
+    """
+    newline = buffer == ord('\n')
+    line_starts = np.concatenate(([0], np.flatnonzero(newline) + 1))
+    line_starts = line_starts[line_starts < len(buffer)]
+    if not len(line_starts):
+        raise ValueError("Empty A3M.")
+    line_lengths = np.diff(np.append(line_starts, len(buffer)))
+    first = buffer[line_starts]
+    is_header = first == ord('>')
+    is_sequence = ~is_header & (first != ord('#'))
+    record_of_line = np.cumsum(is_header) - 1
+    if (record_of_line[is_sequence] < 0).any():
+        raise ValueError("A3M has sequence lines before its first header.")
+
+    columns = np.repeat(is_sequence, line_lengths) & _IS_COLUMN[buffer]
+    codes = _CODES[buffer[columns]]
+    per_line = np.add.reduceat(columns, line_starts, dtype=np.int64)
+    per_record = np.bincount(record_of_line[is_sequence], weights=per_line[is_sequence],
+                             minlength=int(is_header.sum()))
+    length = int(per_record[0]) if len(per_record) else 0
+    if not length or (per_record != length).any():
+        raise ValueError("A3M rows do not all have the same number of match columns.")
+    return codes.reshape(len(per_record), length)
+
+
+def read_a3m_matrix(a3m_path):
+    """
+    Memory-map an A3M file and encode it with parse_a3m_buffer().
+    """
+    with open(a3m_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty A3M {a3m_path}.")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            buffer = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                return parse_a3m_buffer(buffer)
+            finally:
+                del buffer  # The map cannot be closed while an array still points into it
+
+
+def read_pqt_matrix(pqt_path):
+    """
+    Encode the rows of an .aligned.pqt file, for chains whose A3M is gone (e.g. fetched from the cache).
+    """
+    table = pq.read_table(pqt_path, columns=["sequence"], memory_map=True)
+    return encode_alignment(table.column("sequence").to_pylist())
+
+
+def sequence_weights(matrix, identity=0.8, block_size=1024):
+    """
+    Weight of each row: one over the number of rows (itself included) at least identity identical to it.
+
+    Identity is relative to the shorter of the two rows, as in msa_filter.
+    Pairs are compared block against block as one-hot matrix products over
+    the upper triangle only, so memory stays at two blocks of one-hot rows
+    however deep the alignment is.
+    """
+    n = len(matrix)
+    lengths = (matrix < UNKNOWN).sum(axis=1)
+    neighbours = np.zeros(n, dtype=np.int64)
+    for i in range(0, n, block_size):
+        block_i = one_hot(matrix[i:i + block_size])
+        lengths_i = lengths[i:i + block_size]
+        for j in range(i, n, block_size):
+            block_j = block_i if j == i else one_hot(matrix[j:j + block_size])
+            lengths_j = lengths[j:j + block_size]
+            shorter = np.maximum(np.minimum(lengths_i[:, None], lengths_j[None, :]), 1)
+            close = (block_i @ block_j.T) >= identity * shorter - 1e-3
+            neighbours[i:i + block_size] += close.sum(axis=1)
+            if j != i:
+                neighbours[j:j + block_size] += close.sum(axis=0)
+    # Rows without a single standard residue still count as one sequence
+    return 1.0 / np.maximum(neighbours, 1)
+
+
+def alignment_stats(matrix, identity=0.8, low_coverage=0.1):
+    """
+    Depth, Neff and per-position coverage of an encoded alignment (row 0 is the query).
+
+    Coverage of a position is the fraction of hits (query excluded) with a
+    residue rather than a gap there.
+    """
+    depth, length = matrix.shape
+    hits = matrix[1:]
+    coverage = (hits != GAP).mean(axis=0) if len(hits) else np.zeros(length)
+    return {
+        "query_length": int(length),
+        "depth": int(depth),
+        "neff": float(sequence_weights(matrix, identity).sum()),
+        "neff_identity": identity,
+        "coverage_mean": float(coverage.mean()),
+        "coverage_min": float(coverage.min()),
+        "low_coverage_fraction": float((coverage < low_coverage).mean()),
+        "coverage": [round(float(c), 4) for c in coverage],
+    }
+
+
+def write_msa_stats(pqt_path, a3m_path=None, identity=0.8):
+    """
+    Compute the stats of a chain's MSA and write them to <pqt_path>.stats.json.
+
+    :param a3m_path: A3M the pqt was converted from; the pqt itself is read if omitted
+    :return: Stats dict
+    """
+    source = a3m_path or pqt_path
+    with span(str(source), "msa_stats") as fields:
+        start = time.perf_counter()
+        matrix = read_a3m_matrix(a3m_path) if a3m_path else read_pqt_matrix(pqt_path)
+        stats = alignment_stats(matrix, identity)
+        stats.update(source=str(source), seconds=time.perf_counter() - start)
+        fields.update(depth=stats["depth"], neff=stats["neff"])
+
+    path = stats_path(pqt_path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(stats))
+    os.replace(tmp_path, path)
+    return stats
+
+
+def load_msa_stats(pqt_path, identity=0.8):
+    """
+    Stats of a chain's MSA from its sidecar, computed from the pqt if the sidecar is missing or stale.
+    """
+    path = stats_path(pqt_path)
+    if path.exists() and path.stat().st_mtime >= Path(pqt_path).stat().st_mtime:
+        stats = json.loads(path.read_text())
+        if stats.get("neff_identity") == identity:
+            return stats
+    return write_msa_stats(pqt_path, identity=identity)
+
+
+def route_msa(stats, min_neff=16.0, min_coverage=0.0, skip_below_neff=None):
+    """
+    Decide how a chain goes to inference from its MSA stats.
+
+    :param min_neff: Chains with a lower Neff do not get their MSA
+    :param min_coverage: Chains whose mean coverage is lower do not get their MSA
+    :param skip_below_neff: Complexes with a chain below this Neff are not run at all
+    :return: One of ROUTES
+    """
+    if skip_below_neff is not None and stats["neff"] < skip_below_neff:
+        return "skip"
+    if stats["neff"] < min_neff or stats["coverage_mean"] < min_coverage:
+        return "single_sequence"
+    return "full"
+
+
+def gate_msa_directory(msa_dir, identity=0.8, **thresholds):
+    """
+    Apply route_msa() to every .aligned.pqt of a complex.
+
+    Chains routed to "single_sequence" have their pqt moved to <msa_dir>/gated,
+    out of chai's sight, so they are predicted without an MSA.
+
+    :param thresholds: route_msa() keyword arguments
+    :return: Dict of pqt name -> (route, stats)
+    :raises LowQualityMSAError: If any chain is routed to "skip"
+    """
+    msa_dir = Path(msa_dir)
+    routes = {}
+    for pqt_path in sorted(msa_dir.glob("*.aligned.pqt")):
+        stats = load_msa_stats(pqt_path, identity)
+        routes[pqt_path.name] = (route_msa(stats, **thresholds), stats)
+    for name, (route, stats) in routes.items():
+        print(f"MSA gate: {name[:12]} depth {stats['depth']}, Neff {stats['neff']:.1f}, "
+              f"coverage {stats['coverage_mean']:.2f} -> {route}")
+
+    skipped = [name for name, (route, _) in routes.items() if route == "skip"]
+    if skipped:
+        raise LowQualityMSAError(f"MSA too shallow for {', '.join(name[:12] for name in skipped)}; "
+                                 f"complex skipped before inference.")
+    for name, (route, _) in routes.items():
+        if route == "single_sequence":
+            (msa_dir / "gated").mkdir(exist_ok=True)
+            for path in (msa_dir / name, stats_path(msa_dir / name)):
+                os.replace(path, msa_dir / "gated" / path.name)
+    return routes
+
+
+def main():
+    # Same as `python cli.py msa-stats ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["msa-stats"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
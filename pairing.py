@@ -0,0 +1,233 @@
+import os
+import sys
+from pathlib import Path
+
+from a3m_to_pqt import convert_a3m_dirs, pqt_name
+from inference_worker import InferenceWorker
+from msa_cache import sequence_hash
+from msa_filter import filter_a3m
+from msa_scheduler import TGT_SCRIPT, find_chain_a3ms, run_msa_jobs, print_msa_report
+from msa_stats import load_msa_stats, route_msa, write_msa_stats
+from staging import LINK_METHODS, stage_file
+from tgt_to_chai import read_fasta_records, sanitize_name, to_chai_fasta
+
+
+def read_library(fasta_paths):
+    """
+    Read a chain library spread over one or more FASTA files.
+
+    A chain listed twice with the same sequence is kept once; the same name
+    with two different sequences is an error, since complexes are named after
+    their chains.
+
+    :param fasta_paths: FASTA file path or list of paths
+    :return: List of (sanitized name, upper-cased sequence) in file order
+    """
+    if isinstance(fasta_paths, (str, os.PathLike)):
+        fasta_paths = [fasta_paths]
+    chains = {}
+    for fasta_path in fasta_paths:
+        for name, sequence in read_fasta_records(fasta_path):
+            name = sanitize_name(name)
+            sequence = sequence.upper()
+            if name in chains and chains[name] != sequence:
+                raise ValueError(f"Chain {name} appears with two different sequences (second in {fasta_path}).")
+            chains[name] = sequence
+    return list(chains.items())
+
+
+def unique_sequences(*libraries):
+    """
+    Collect the distinct sequences of all libraries, keyed by sequence_hash().
+
+    A chain used in both libraries, or under several names, is aligned only once.
+    """
+    sequences = {}
+    for library in libraries:
+        for _, sequence in library:
+            sequences.setdefault(sequence_hash(sequence), sequence)
+    return sequences
+
+
+def compute_chain_msas(sequences, work_dir, cpu_num=8, total_cpus=None, script_path=TGT_SCRIPT, package="jackhmm",
+                       database="uniref90", iterations=3, cache=None, msa_filter=None, supervisor=None,
+                       msa_stats=False):
+    """
+    Produce one .aligned.pqt per unique sequence in the shared <work_dir>/msas store.
+
+    Sequences already in the store (from an earlier run) or in the cache are not
+    searched again; the rest are aligned together under one CPU budget and then
+    converted in-process.
+
+    :param sequences: Dict of sequence_hash() -> sequence, see unique_sequences()
+    :param work_dir: Run directory; MSA jobs run in <work_dir>/chains/<hash>
+    :param supervisor: Optional supervisor.Supervisor that runs A3M_TGT_Gen.sh with a timeout and retries
+    :param msa_stats: Write <pqt>.stats.json for every new chain (needed by an MSA gate; Neff is O(depth^2))
+    :return: Path of the shared .aligned.pqt directory
+    """
+    msa_dir = Path(work_dir) / "msas"
+    chains_dir = Path(work_dir) / "chains"
+    msa_dir.mkdir(parents=True, exist_ok=True)
+    chains_dir.mkdir(parents=True, exist_ok=True)
+
+    msa_jobs = []
+    sequence_of = {}
+    for key, sequence in sequences.items():
+        if (msa_dir / pqt_name(sequence)).exists():
+            continue
+        if cache is not None and cache.fetch(sequence, package, database, iterations, msa_dir, msa_filter=msa_filter):
+            continue
+        fasta_path = chains_dir / f"{key}.fasta"
+        fasta_path.write_text(f">{key}\n{sequence}\n")
+        chain_dir = chains_dir / key
+        chain_dir.mkdir(exist_ok=True)
+        msa_jobs.append({
+            "name": key[:12],
+            "complex": "chains",
+            "fasta": str(fasta_path),
+            "output_dir": str(chain_dir),
+            "length": len(sequence),
+        })
+        sequence_of[key[:12]] = sequence
+
+    print(f"{len(sequences)} unique chains, {len(msa_jobs)} need an MSA search")
+    results = run_msa_jobs(msa_jobs, total_cpus=total_cpus, max_threads=cpu_num, script_path=script_path,
+                           package=package, database=database, iterations=iterations, supervisor=supervisor)
+    print_msa_report(results)
+
+    # Give each chain's alignment the uniref90.a3m name a3m_to_pqt() expects, optionally reducing it first
+    a3m_dirs = []
+    for job, result in zip(msa_jobs, results):
+        a3m_paths = find_chain_a3ms(job)
+        if result["status"] != "ok" or not a3m_paths:
+            print(f"No MSA for chain {job['name']}, its complexes will be skipped")
+            continue
+        a3m_dir = Path(job["output_dir"])
+        # The search unlinks its old A3M before writing a new one, so a hardlink stays the searched alignment
+        stage_file(a3m_paths[0], a3m_dir / "uniref90.a3m", LINK_METHODS)
+        if msa_filter:
+            filter_a3m(a3m_dir / "uniref90.a3m", a3m_dir / "filtered" / "uniref90.a3m", **msa_filter)
+            a3m_dir = a3m_dir / "filtered"
+        a3m_dirs.append((job, a3m_dir))
+
+    pqt_paths = convert_a3m_dirs([a3m_dir for _, a3m_dir in a3m_dirs], msa_dir)
+    for (job, a3m_dir), pqt_path in zip(a3m_dirs, pqt_paths):
+        print(f"Converted {a3m_dir / 'uniref90.a3m'} to {pqt_path}")
+        if msa_stats:
+            write_msa_stats(pqt_path, a3m_dir / "uniref90.a3m")
+        if cache is not None:
+            cache.put(sequence_of[job["name"]], package, database, iterations, pqt_path,
+                      a3m_path=a3m_dir / "uniref90.a3m", msa_filter=msa_filter)
+    return msa_dir
+
+
+def layout_pairs(heavy_chains, light_chains, msa_dir, complexes_dir, msa_gate=None):
+    """
+    Lay out one inference job directory per heavy x light pair.
+
+    Each <complexes_dir>/<heavy>__<light>/ holds the chai FASTA of the pair and
+    links to the two chains' .aligned.pqt files in the shared store (see staging.stage_file()), so the
+    N x M complexes cost no extra MSA storage. Pairs with a chain whose MSA is
+    missing are skipped.
+
+    :param heavy_chains: List of (name, sequence), see read_library()
+    :param light_chains: List of (name, sequence), see read_library()
+    :param msa_dir: Shared .aligned.pqt directory, see compute_chain_msas()
+    :param complexes_dir: Directory under which the complex directories are created
+    :param msa_gate: Optional msa_stats.route_msa() keyword arguments; chains routed to "single_sequence" are
+                     not linked, so chai predicts them without an MSA, and pairs with a chain routed to "skip"
+                     are left out
+    :return: List of inference job dicts
+    """
+    msa_dir = Path(msa_dir)
+    routes = {}
+    if msa_gate is not None:
+        for pqt_path in msa_dir.glob("*.aligned.pqt"):
+            routes[pqt_path.name] = route_msa(load_msa_stats(pqt_path), **msa_gate)
+        print("MSA gate: " + ", ".join(f"{sum(r == route for r in routes.values())} {route}"
+                                       for route in ("full", "single_sequence", "skip")))
+    jobs = []
+    for heavy_name, heavy_sequence in heavy_chains:
+        for light_name, light_sequence in light_chains:
+            pqt_paths = [msa_dir / pqt_name(heavy_sequence), msa_dir / pqt_name(light_sequence)]
+            if not all(pqt_path.exists() for pqt_path in pqt_paths):
+                continue
+            if any(routes.get(pqt_path.name) == "skip" for pqt_path in pqt_paths):
+                continue
+            name = f"{heavy_name}__{light_name}"
+            complex_dir = Path(complexes_dir) / name
+            complex_dir.mkdir(parents=True, exist_ok=True)
+            for pqt_path in pqt_paths:
+                if routes.get(pqt_path.name, "full") == "full":
+                    stage_file(pqt_path, complex_dir / pqt_path.name, LINK_METHODS)
+                elif (complex_dir / pqt_path.name).exists():
+                    (complex_dir / pqt_path.name).unlink()  # Linked by an earlier run with other thresholds
+
+            fasta_path = complex_dir / f"{name}.chai.fasta"
+            fasta_path.write_text(to_chai_fasta(f">{heavy_name}\n{heavy_sequence}\n>{light_name}\n{light_sequence}\n"))
+            jobs.append({
+                "name": name,
+                "fasta_file": str(fasta_path),
+                "msa_directory": str(complex_dir),
+                "output_dir": str(complex_dir / "predictions"),
+            })
+    return jobs
+
+
+def run_pairing(heavy_fastas, light_fastas, work_dir, cpu_num=8, total_cpus=None, script_path=TGT_SCRIPT,
+                package="jackhmm", database="uniref90", iterations=3, cache=None, msa_filter=None, worker=None,
+                msa_gate=None, results_store=None, supervisor=None):
+    """
+    Predict every heavy x light combination of two chain libraries.
+
+    The MSA search runs once per unique chain across all input files, rather
+    than once per chain per complex as with one FASTA file per pair.
+
+    :param heavy_fastas: FASTA file(s) of the heavy chain library
+    :param light_fastas: FASTA file(s) of the light chain library
+    :param work_dir: Run directory holding chains/, msas/ and complexes/
+    :param worker: InferenceWorker to run the predictions on; one is started if omitted
+    :param msa_gate: Optional msa_stats.route_msa() keyword arguments, see layout_pairs()
+    :param results_store: Optional ResultsStore the completed predictions are appended to, in a batch named
+                          after work_dir
+    :param supervisor: Optional supervisor.Supervisor for the MSA searches, see compute_chain_msas()
+    :return: List of inference result dicts in heavy-major order
+    """
+    heavy_chains = read_library(heavy_fastas)
+    light_chains = read_library(light_fastas)
+    sequences = unique_sequences(heavy_chains, light_chains)
+
+    msa_dir = compute_chain_msas(sequences, work_dir, cpu_num=cpu_num, total_cpus=total_cpus,
+                                 script_path=script_path, package=package, database=database,
+                                 iterations=iterations, cache=cache, msa_filter=msa_filter,
+                                 supervisor=supervisor, msa_stats=msa_gate is not None)
+    jobs = layout_pairs(heavy_chains, light_chains, msa_dir, Path(work_dir) / "complexes", msa_gate=msa_gate)
+    print(f"Prepared {len(jobs)} of {len(heavy_chains) * len(light_chains)} complexes "
+          f"from {len(sequences)} unique chain MSAs")
+
+    own_worker = worker is None
+    if own_worker:
+        worker = InferenceWorker()
+    try:
+        for job in jobs:
+            worker.submit(job)
+        results = sorted(worker.results(), key=lambda r: r["job_id"])
+    finally:
+        if own_worker:
+            worker.close()
+    if results_store is not None:
+        for job, result in zip(jobs, results):
+            if result["status"] == "ok":
+                results_store.append(job["name"], result, batch=Path(work_dir).resolve().name)
+    return results
+
+
+def main():
+    # Same as `python cli.py pair ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["pair"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
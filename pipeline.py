@@ -0,0 +1,394 @@
+import os
+import queue
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from inference_worker import InferenceWorker
+from manifest import MANIFEST_NAME, Manifest
+from msa_scheduler import TGT_SCRIPT, find_chain_a3ms, read_fasta_sequence, run_msa_jobs, print_msa_report
+from msa_stats import LowQualityMSAError
+from tgt_to_chai import plan_fasta_files, finalize_complex, prepare_complex
+from tracing import record_wait, span, start_tracing, stop_tracing
+
+# Marks the end of a stage's input
+_DONE = None
+
+
+def _msa_order(complexes):
+    """
+    Order MSA jobs so that whole complexes finish as early as possible.
+
+    Complexes with the most total sequence go first, matching the longest
+    predicted first order of the inference dispatcher: the largest complexes
+    take longest on the GPU too, and started last they would run alone at the
+    end of the batch. Within a complex the longest chain starts first.
+    """
+    for complex_info in complexes:
+        for job in complex_info["msa_jobs"]:
+            if job.get("length") is None:
+                job["length"] = len(read_fasta_sequence(job["fasta"]))
+    ordered = sorted(complexes, key=lambda c: sum(job["length"] for job in c["msa_jobs"]), reverse=True)
+    jobs = []
+    for complex_info in ordered:
+        jobs.extend(sorted(complex_info["msa_jobs"], key=lambda job: job["length"], reverse=True))
+    return jobs
+
+
+def _describe(error):
+    """
+    Error message that also names the exception type, for exceptions no stage expects.
+    """
+    return f"{type(error).__name__}: {error}"
+
+
+def record_outputs(name, result, batch, results_store=None, coordinate_store=None):
+    """
+    Append a prediction to the results and coordinate stores; a failure is reported but does not affect the run.
+    """
+    try:
+        if results_store is not None:
+            results_store.append(name, result, batch=batch)
+        if coordinate_store is not None:
+            coordinate_store.write(name, result["cif_paths"])
+    except (OSError, ValueError) as e:
+        print(f"Could not record the outputs of {name}: {e}")
+
+
+def run_pipeline(input_fasta_dir, cpu_num=8, total_cpus=None, script_path=TGT_SCRIPT, package="jackhmm",
+                 database="uniref90", iterations=3, cache=None, worker_factory=InferenceWorker,
+                 prepare_workers=2, inference_workers=1, queue_size=8, manifest=None, msa_filter=None, worker=None,
+                 trace_dir=None, prefilter=None, msa_gate=None, results_store=None, coordinate_store=None,
+                 supervisor=None):
+    """
+    Run MSA generation, pqt preparation and inference as overlapping stages.
+
+    A complex is handed to preparation (a3m -> pqt) as soon as the last of its
+    chains has an MSA, and then to inference, while the MSA stage keeps working
+    through the remaining chains. The stages are linked by bounded queues, so a
+    slow inference stage eventually holds back MSA generation instead of letting
+    prepared complexes pile up without limit. A shared worker (an
+    InferenceDispatcher) is the exception: it is handed every prepared complex
+    at once so it can choose the order, and only holds their job descriptions.
+
+    Every stage is recorded in a Manifest (by default pipeline_manifest.json in
+    input_fasta_dir). A rerun skips every chain and complex whose inputs,
+    parameters and outputs are unchanged since it last completed, so an
+    interrupted batch resumes where it stopped.
+
+    :param input_fasta_dir: Directory containing the FASTA files to process
+    :param cpu_num: Maximum number of CPUs given to a single chain (default: 8)
+    :param total_cpus: Core budget shared by all concurrently running chains (default: all cores)
+    :param script_path: Path of the A3M_TGT_Gen.sh script
+    :param package: The package to use (default: "jackhmm")
+    :param database: The database to use (default: "uniref90")
+    :param iterations: The number of iterations to run (default: 3)
+    :param cache: Optional MSACache shared by the MSA and preparation stages
+    :param worker_factory: Callable returning an InferenceWorker; called once per inference slot
+    :param prepare_workers: Number of complexes converted to pqt at the same time
+    :param inference_workers: Number of inference workers started with worker_factory (e.g. one per GPU)
+    :param queue_size: Capacity of each queue between stages
+    :param manifest: Manifest to record progress in (default: <input_fasta_dir>/pipeline_manifest.json)
+    :param msa_filter: Optional filter_a3m() keyword arguments used to reduce each A3M before conversion
+    :param worker: Optional shared worker, e.g. an InferenceDispatcher over several GPUs, used instead of
+                   worker_factory; every prepared complex is submitted to it as soon as it is ready, so it can
+                   order and pack the waiting jobs. It is not closed when the pipeline finishes
+    :param trace_dir: If given, time every stage and write pipeline_trace.jsonl and the Chrome trace
+                      pipeline_trace.json there, and print a summary of the slowest stages and chains
+    :param prefilter: Optional kmer_index.KmerIndex over the database; each chain is searched against its
+                      candidate subset only, and the MSAs are cached and recorded under prefilter.label(database)
+    :param msa_gate: Optional msa_stats.route_msa() keyword arguments (min_neff, min_coverage, skip_below_neff);
+                     chains with a poor MSA are predicted without it, and complexes the gate skips are
+                     reported as "skipped" without using the GPU
+    :param results_store: Optional ResultsStore that every completed prediction is appended to, in a batch
+                          named after input_fasta_dir
+    :param coordinate_store: Optional CoordinateStore every completed prediction's models are written to
+    :param supervisor: Optional supervisor.Supervisor that runs A3M_TGT_Gen.sh with a timeout and retries,
+                       logging each chain to <output_dir>/msa.log
+    :return: List of per-complex result dicts
+    """
+    if not os.path.isdir(input_fasta_dir):
+        print(f"Error: The directory {input_fasta_dir} does not exist.")
+        return []
+
+    if trace_dir is not None:
+        start_tracing(os.path.join(trace_dir, "pipeline_trace.jsonl"), os.path.join(trace_dir, "pipeline_trace.json"))
+    try:
+        if manifest is None:
+            manifest = Manifest(os.path.join(input_fasta_dir, MANIFEST_NAME))
+        search_database = database
+        if prefilter is not None:
+            # Subset searches are cached and resumed apart from full searches of the same database
+            database = prefilter.label(database)
+        msa_params = {"package": package, "database": database, "iterations": iterations}
+        batch = os.path.basename(os.path.abspath(input_fasta_dir))
+        prepare_params = dict(msa_params, msa_filter=msa_filter, msa_gate=msa_gate)
+
+        # The manifest is consulted before the cache, so a resumed chain is neither searched nor fetched again
+        complexes = plan_fasta_files(input_fasta_dir, package=package, database=database, iterations=iterations)
+        for complex_info in complexes:
+            complex_info["chain_keys"] = []
+            pending = []
+            for job in complex_info["msa_jobs"]:
+                job["key"] = f"{complex_info['name']}/{job['name']}"
+                job["inputs"] = manifest.fingerprints([job["fasta"]])
+                complex_info["chain_keys"].append(job["key"])
+                if manifest.is_done("msa", job["key"], job["inputs"], msa_params):
+                    print(f"Skipping MSA for {job['key']}, already done")
+                    continue
+                if cache is not None and cache.fetch(read_fasta_sequence(job["fasta"]), package, database, iterations,
+                                                     complex_info["final_output_dir"], msa_filter=msa_filter):
+                    complex_info["chain_keys"].remove(job["key"])
+                    continue
+                pending.append(job)
+            complex_info["msa_jobs"] = pending
+
+        by_name = {complex_info["name"]: complex_info for complex_info in complexes}
+        remaining = {name: len(complex_info["msa_jobs"]) for name, complex_info in by_name.items()}
+        failed_chains = {name: [] for name in by_name}
+
+        msa_done = queue.Queue(maxsize=queue_size)
+        prepared = queue.Queue(maxsize=queue_size)
+        results = []
+        lock = threading.Lock()
+
+        def on_msa_done(job, result):
+            a3m_paths = find_chain_a3ms(job) if result["status"] == "ok" else []
+            if a3m_paths:
+                manifest.mark_done("msa", job["key"], job["inputs"], msa_params, outputs=a3m_paths)
+            else:
+                manifest.mark_failed("msa", job["key"], job["inputs"], msa_params,
+                                     result["error"] or "no .a3m produced")
+            with lock:
+                if not a3m_paths:
+                    failed_chains[job["complex"]].append(job["name"])
+                remaining[job["complex"]] -= 1
+                ready = remaining[job["complex"]] == 0
+            if ready:
+                by_name[job["complex"]]["queued_at"] = time.perf_counter()
+                msa_done.put(by_name[job["complex"]])
+
+        # Exception that stopped the MSA stage, re-raised once every thread has finished
+        errors = []
+
+        def msa_stage():
+            try:
+                # Complexes whose chains are all cached can go straight to preparation
+                for name, complex_info in by_name.items():
+                    if remaining[name] == 0:
+                        complex_info["queued_at"] = time.perf_counter()
+                        msa_done.put(complex_info)
+                msa_results = run_msa_jobs(_msa_order(complexes), total_cpus=total_cpus, max_threads=cpu_num,
+                                           script_path=script_path, package=package, database=search_database,
+                                           iterations=iterations, longest_first=False, on_done=on_msa_done,
+                                           prefilter=prefilter, supervisor=supervisor)
+                print_msa_report(msa_results)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # Sent whatever happened, or the later stages would wait for input forever
+                for _ in range(prepare_workers):
+                    msa_done.put(_DONE)
+
+        def record(complex_info, status, error=None, inference=None):
+            with lock:
+                results.append({
+                    "name": complex_info["name"],
+                    "status": status,
+                    "error": error,
+                    "inference": inference,
+                })
+
+        def prepare_one(complex_info):
+            record_wait(f"{complex_info['name']} -> prepare", complex_info.pop("queued_at", None))
+            if failed_chains[complex_info["name"]]:
+                record(complex_info, "failed", f"MSA failed for {', '.join(failed_chains[complex_info['name']])}")
+                return
+            name = complex_info["name"]
+            # The complex depends on its FASTA and on the A3M of every chain that was searched
+            a3m_paths = [p for key in complex_info["chain_keys"] for p in manifest.entry("msa", key)["outputs"]]
+            inputs = manifest.fingerprints([complex_info["fasta_path"]] + a3m_paths)
+            if manifest.is_done("prepare", name, inputs, prepare_params):
+                print(f"Skipping preparation of {name}, already done")
+                complex_info["queued_at"] = time.perf_counter()
+                prepared.put((complex_info, manifest.entry("prepare", name)["job"]))
+                return
+            try:
+                manifest.mark_running("prepare", name, inputs, prepare_params)
+                with span(name, "prepare"):
+                    job = prepare_complex(finalize_complex(complex_info), cache=cache, package=package,
+                                          database=database, iterations=iterations, msa_filter=msa_filter,
+                                          msa_gate=msa_gate)
+            except LowQualityMSAError as e:
+                manifest.mark_failed("prepare", name, inputs, prepare_params, str(e))
+                record(complex_info, "skipped", str(e))
+                return
+            except (OSError, RuntimeError, ValueError) as e:
+                manifest.mark_failed("prepare", name, inputs, prepare_params, str(e))
+                record(complex_info, "failed", str(e))
+                return
+            except Exception as e:
+                manifest.mark_failed("prepare", name, inputs, prepare_params, _describe(e))
+                raise
+            outputs = [job["fasta_file"]] + [str(p) for p in Path(job["msa_directory"]).glob("*.aligned.pqt")]
+            manifest.mark_done("prepare", name, inputs, prepare_params, outputs=outputs, job=job)
+            complex_info["queued_at"] = time.perf_counter()
+            prepared.put((complex_info, job))
+
+        def prepare_stage():
+            while True:
+                complex_info = msa_done.get()
+                if complex_info is _DONE:
+                    return
+                try:
+                    prepare_one(complex_info)
+                except Exception as e:
+                    # Only this complex fails: a thread that stopped would leave the MSA stage blocked on a full queue
+                    print(f"Preparation of {complex_info['name']} failed: {_describe(e)}")
+                    record(complex_info, "failed", _describe(e))
+
+        def begin_inference(complex_info, job):
+            """
+            Check the manifest and clear old outputs; returns (inputs, params), or None if already done.
+            """
+            name = complex_info["name"]
+            record_wait(f"{name} -> inference", complex_info.pop("queued_at", None))
+            inputs = manifest.fingerprints([job["fasta_file"]] + sorted(
+                str(p) for p in Path(job["msa_directory"]).glob("*.aligned.pqt")))
+            params = job.get("params", {})
+            if manifest.is_done("inference", name, inputs, params):
+                print(f"Skipping inference for {name}, already done")
+                record(complex_info, "ok", inference=manifest.entry("inference", name)["result"])
+                return None
+            # Outputs of an earlier failed attempt would be mixed with the new ones
+            shutil.rmtree(job["output_dir"], ignore_errors=True)
+            return inputs, params
+
+        def finish_inference(complex_info, job, inputs, params, result):
+            name = complex_info["name"]
+            if result["status"] == "ok":
+                manifest.mark_done("inference", name, inputs, params, outputs=result["cif_paths"], result=result)
+                print(f"Prediction completed. Output saved in: {job['output_dir']}")
+                record_outputs(name, result, batch, results_store, coordinate_store)
+            else:
+                manifest.mark_failed("inference", name, inputs, params, result["error"])
+                print(f"Prediction failed for {name}: {result['error']}")
+            record(complex_info, result["status"], result["error"], result)
+
+        def infer_one(complex_info, job, slot_worker):
+            name = complex_info["name"]
+            state = begin_inference(complex_info, job)
+            if state is None:
+                return slot_worker
+            inputs, params = state
+            if slot_worker is None:
+                # Only kept once started, so a worker that failed to start is tried again for the next complex
+                new_worker = worker_factory()
+                new_worker.start()
+                slot_worker = new_worker
+            manifest.mark_running("inference", name, inputs, params)
+            try:
+                with span(name, "inference") as fields:
+                    result = slot_worker.run(job)
+                    fields.update(status=result["status"], device=result.get("device"),
+                                  worker_max_rss_kb=result.get("max_rss_kb"),
+                                  peak_gpu_bytes=result.get("peak_gpu_bytes"))
+            except Exception as e:
+                manifest.mark_failed("inference", name, inputs, params, _describe(e))
+                raise
+            finish_inference(complex_info, job, inputs, params, result)
+            return slot_worker
+
+        def inference_stage():
+            # Started on first use, so a fully resumed batch never loads the model
+            slot_worker = None
+            try:
+                while True:
+                    item = prepared.get()
+                    if item is _DONE:
+                        return
+                    complex_info, job = item
+                    try:
+                        slot_worker = infer_one(complex_info, job, slot_worker)
+                    except Exception as e:
+                        # Only this complex fails: a thread that stopped would leave preparation blocked on a full queue
+                        print(f"Prediction failed for {complex_info['name']}: {_describe(e)}")
+                        record(complex_info, "failed", _describe(e))
+            finally:
+                if slot_worker is not None:
+                    slot_worker.close()
+
+        def dispatch_stage():
+            # Every prepared complex is submitted to the shared worker at once, so a dispatcher sees the whole
+            # ready set and can order it (longest predicted first) instead of one job per inference thread
+            in_flight = {}  # worker job_id -> (complex_info, job, inputs, params)
+            done = False
+            while not done or in_flight:
+                while not done:
+                    try:
+                        # Block only while nothing is running; otherwise results are collected below
+                        item = prepared.get(block=not in_flight)
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    complex_info, job = item
+                    state = None
+                    try:
+                        state = begin_inference(complex_info, job)
+                        if state is not None:
+                            manifest.mark_running("inference", complex_info["name"], *state)
+                            complex_info["submitted_at"] = time.perf_counter()
+                            in_flight[worker.submit(job)] = (complex_info, job) + state
+                    except Exception as e:
+                        print(f"Prediction failed for {complex_info['name']}: {_describe(e)}")
+                        if state is not None:
+                            manifest.mark_failed("inference", complex_info["name"], *state, _describe(e))
+                        record(complex_info, "failed", _describe(e))
+                if not in_flight:
+                    continue
+                try:
+                    finished = worker.poll(timeout=0.1)
+                except Exception as e:
+                    # The worker itself is broken, so none of the complexes handed to it will finish
+                    for complex_info, job, inputs, params in in_flight.values():
+                        manifest.mark_failed("inference", complex_info["name"], inputs, params, _describe(e))
+                        print(f"Prediction failed for {complex_info['name']}: {_describe(e)}")
+                        record(complex_info, "failed", _describe(e))
+                    in_flight.clear()
+                    continue
+                for result in finished:
+                    complex_info, job, inputs, params = in_flight.pop(result["job_id"])
+                    record_wait(complex_info["name"], complex_info.pop("submitted_at", None), category="inference")
+                    finish_inference(complex_info, job, inputs, params, result)
+
+        msa_thread = threading.Thread(target=msa_stage, name="msa")
+        prepare_threads = [threading.Thread(target=prepare_stage, name=f"prepare-{i}") for i in range(prepare_workers)]
+        if worker is not None:
+            inference_threads = [threading.Thread(target=dispatch_stage, name="dispatch")]
+        else:
+            inference_threads = [threading.Thread(target=inference_stage, name=f"inference-{i}")
+                                 for i in range(inference_workers)]
+        for thread in [msa_thread] + prepare_threads + inference_threads:
+            thread.start()
+
+        msa_thread.join()
+        for thread in prepare_threads:
+            thread.join()
+        for _ in inference_threads:
+            prepared.put(_DONE)
+        for thread in inference_threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        print(f"Pipeline finished: {sum(r['status'] == 'ok' for r in results)} of {len(results)} complexes predicted")
+        manifest.save()
+        print(f"Manifest {manifest.path}: {manifest.summary()}")
+        return results
+    finally:
+        # Also on failure: the trace matters most for the runs that went wrong
+        if trace_dir is not None:
+            stop_tracing().print_summary()
@@ -0,0 +1,125 @@
+"""
+Dry run of a batch: what each complex still needs, from the files already on disk.
+
+Nothing is split, searched, converted or written, and only light modules are
+imported (no numpy, pyarrow, torch or chai_lab), so a plan of a large batch
+takes a fraction of a second:
+
+    python cli.py plan /path/to/batch
+"""
+import glob
+import os
+
+from fasta_index import iter_fasta_records, sanitize_name
+from msa_cache import DEFAULT_CACHE_DIR, MSACache, sequence_hash
+
+# Complex states, from furthest along to least
+COMPLEX_STATES = ("predicted", "ready", "prepare", "msa", "invalid")
+
+
+def complex_paths(input_fasta_dir, fasta_file):
+    """
+    Directories the pipeline uses for one FASTA file of a batch.
+
+    :param fasta_file: File name of the complex's FASTA file within input_fasta_dir
+    :return: Dict with "name", "fasta_path", "split_dir" (per-chain FASTA files and A3Ms),
+             "final_output_dir" (staged A3Ms and FASTA) and "prepared_dir" (.aligned.pqt files,
+             the chai FASTA and predictions/)
+    """
+    base_name = os.path.splitext(fasta_file)[0]
+    final_output_dir = os.path.join(input_fasta_dir, f"{base_name}_final_output")
+    return {
+        "name": base_name,
+        "fasta_path": os.path.join(input_fasta_dir, fasta_file),
+        "split_dir": os.path.join(input_fasta_dir, f"{sanitize_name(base_name)}_out"),
+        "final_output_dir": final_output_dir,
+        "prepared_dir": os.path.join(final_output_dir, f"{base_name}_output"),
+    }
+
+
+def _chain_state(chain, sequence, paths, cache, cache_params):
+    pqt = f"{sequence_hash(sequence)}.aligned.pqt"  # a3m_to_pqt.pqt_name(), without importing pyarrow
+    if any(os.path.exists(os.path.join(paths["prepared_dir"], *parts)) for parts in ((pqt,), ("gated", pqt))):
+        return "pqt"
+    if cache is not None and cache.contains(sequence, **cache_params):
+        return "cached"
+    a3m_paths = [os.path.join(paths["split_dir"], f"{chain}.a3m"),
+                 os.path.join(paths["final_output_dir"], f"{chain}.a3m"),
+                 os.path.join(paths["final_output_dir"], chain, "uniref90.a3m")]
+    if any(os.path.exists(p) for p in a3m_paths):
+        return "a3m"
+    return "needs_msa"
+
+
+def plan_batch(input_fasta_dir, cache_dir=DEFAULT_CACHE_DIR, package="jackhmm", database="uniref90", iterations=3,
+               msa_filter=None):
+    """
+    Work left for every complex of a batch, without doing any of it.
+
+    Chains are "pqt" (converted for this complex), "cached" (in the MSACache),
+    "a3m" (searched, not converted yet) or "needs_msa". A complex is
+    "predicted" once chai wrote its models, "ready" for inference when all its
+    chains are converted, "prepare" when all are at least searched or cached,
+    "msa" otherwise, and "invalid" if its FASTA cannot be split.
+
+    :param cache_dir: MSACache directory to look chains up in (None: no cache)
+    :param package: The package of the cached MSAs (default: "jackhmm")
+    :param database: The database of the cached MSAs (default: "uniref90")
+    :param iterations: The number of iterations of the cached MSAs (default: 3)
+    :param msa_filter: filter_a3m() keyword arguments the cached MSAs must have been reduced with
+    :return: List of complex dicts with "name", "state", "chains" (list of dicts with "name", "length",
+             "state") and "error"
+    """
+    cache = MSACache(cache_dir) if cache_dir and os.path.isdir(cache_dir) else None
+    cache_params = {"package": package, "database": database, "iterations": iterations, "msa_filter": msa_filter}
+    complexes = []
+    for fasta_file in sorted(os.listdir(input_fasta_dir)):
+        if not fasta_file.endswith(".fasta"):
+            continue
+        paths = complex_paths(input_fasta_dir, fasta_file)
+        complex_plan = {"name": paths["name"], "state": None, "chains": [], "error": None}
+        complexes.append(complex_plan)
+        names = set()
+        for name, sequence in iter_fasta_records(paths["fasta_path"]):
+            chain = sanitize_name(name)
+            if chain in names:
+                complex_plan["error"] = f"FASTA names collide as '{chain}'"
+            names.add(chain)
+            complex_plan["chains"].append({"name": chain, "length": len(sequence),
+                                           "state": _chain_state(chain, sequence, paths, cache, cache_params)})
+
+        states = {chain["state"] for chain in complex_plan["chains"]}
+        if complex_plan["error"] or not states:
+            complex_plan["error"] = complex_plan["error"] or "no sequences"
+            complex_plan["state"] = "invalid"
+        elif glob.glob(os.path.join(paths["prepared_dir"], "predictions", "pred.model_idx_*.cif")):
+            complex_plan["state"] = "predicted"
+        elif states == {"pqt"} and os.path.exists(os.path.join(paths["prepared_dir"], f"{paths['name']}.chai.fasta")):
+            complex_plan["state"] = "ready"
+        elif "needs_msa" not in states:
+            complex_plan["state"] = "prepare"
+        else:
+            complex_plan["state"] = "msa"
+    return complexes
+
+
+def print_plan(complexes, verbose=False):
+    """
+    Print one line per complex, the chains still needing an MSA search, and totals.
+
+    :param verbose: Also list the chains that need no search
+    """
+    for complex_plan in complexes:
+        pending = [c for c in complex_plan["chains"] if c["state"] == "needs_msa"]
+        print("{:<10} {:<30} {:>3} chains  {}".format(
+            complex_plan["state"], complex_plan["name"][:30], len(complex_plan["chains"]),
+            complex_plan["error"] or (f"{len(pending)} need an MSA" if pending else "")))
+        for chain in complex_plan["chains"]:
+            if verbose or chain["state"] == "needs_msa":
+                print("    {:<10} {:>6} aa  {}".format(chain["state"], chain["length"], chain["name"]))
+
+    chains = [c for complex_plan in complexes for c in complex_plan["chains"]]
+    print(f"{len(complexes)} complexes: " + ", ".join(
+        f"{sum(c['state'] == state for c in complexes)} {state}" for state in COMPLEX_STATES))
+    print(f"{len(chains)} chains: " + ", ".join(
+        f"{sum(c['state'] == state for c in chains)} {state}" for state in ("pqt", "cached", "a3m", "needs_msa")))
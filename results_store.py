@@ -0,0 +1,237 @@
+"""
+Columnar store of prediction results across all complexes.
+
+Every completed prediction appends one row per model (pred.model_idx_*.cif)
+to a Parquet dataset partitioned by batch:
+
+    <root>/batch=<batch>/<complex>.<time>.parquet
+
+with the aggregate score, pTM, ipTM, per-chain pTM and mean pLDDT, the clash
+flag and the CIF path. Queries read the whole dataset once and rank it with
+Arrow compute kernels, so comparing thousands of complexes opens no per-complex
+npz or CIF file. compact() merges a batch's small files into one.
+
+    python cli.py results top results/ -k 20 [--batch run1] [--min-iptm 0.6]
+    python cli.py results compact results/ [--batch run1]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from fasta_index import sanitize_name
+from mmcif import chain_plddt, read_atom_site
+
+RESULTS_SCHEMA = pa.schema([
+    ("complex", pa.string()),
+    ("model_idx", pa.int32()),
+    ("aggregate_score", pa.float64()),
+    ("ptm", pa.float64()),
+    ("iptm", pa.float64()),
+    ("chain_ids", pa.list_(pa.string())),
+    ("per_chain_ptm", pa.list_(pa.float64())),
+    ("chain_plddt", pa.list_(pa.float64())),
+    ("plddt", pa.float64()),
+    ("has_inter_chain_clashes", pa.bool_()),
+    ("cif_path", pa.string()),
+    ("recorded_at", pa.float64()),
+])
+# Rows with the same key are the same model of the same complex; the latest recorded one wins
+KEY_COLUMNS = ["batch", "complex", "model_idx"]
+
+
+def _scalar(scores, key):
+    if key not in scores:
+        return None
+    return scores[key].reshape(-1)[0].item()
+
+
+def prediction_rows(name, cif_paths, aggregate_scores=None):
+    """
+    Build one results row per model from chai's output files.
+
+    Scores come from the scores.model_idx_<i>.npz next to each CIF and the
+    per-chain pLDDT from the CIF's B-factor column. Fields whose source is
+    missing (e.g. stub outputs) are null; the aggregate score then falls back
+    to aggregate_scores.
+    """
+    columns = {field.name: [] for field in RESULTS_SCHEMA}
+    now = time.time()
+    for i, cif_path in enumerate(cif_paths):
+        cif_path = Path(cif_path)
+        match = re.search(r"model_idx_(\d+)", cif_path.name)
+        model_idx = int(match.group(1)) if match else i
+        npz_path = cif_path.parent / f"scores.model_idx_{model_idx}.npz"
+        scores = dict(np.load(npz_path)) if npz_path.exists() else {}
+        chain_ids, plddt = chain_plddt(read_atom_site(cif_path))
+
+        aggregate = _scalar(scores, "aggregate_score")
+        if aggregate is None and aggregate_scores is not None and i < len(aggregate_scores):
+            aggregate = float(aggregate_scores[i])
+        clashes = _scalar(scores, "has_inter_chain_clashes")
+        columns["complex"].append(name)
+        columns["model_idx"].append(model_idx)
+        columns["aggregate_score"].append(aggregate)
+        columns["ptm"].append(_scalar(scores, "ptm"))
+        columns["iptm"].append(_scalar(scores, "iptm"))
+        columns["chain_ids"].append(chain_ids)
+        columns["per_chain_ptm"].append(scores["per_chain_ptm"].reshape(-1).tolist()
+                                        if "per_chain_ptm" in scores else None)
+        columns["chain_plddt"].append(plddt.tolist())
+        columns["plddt"].append(float(plddt.mean()) if len(plddt) else None)
+        columns["has_inter_chain_clashes"].append(None if clashes is None else bool(clashes))
+        columns["cif_path"].append(str(cif_path.resolve()))
+        columns["recorded_at"].append(now)
+    return pa.table(columns, schema=RESULTS_SCHEMA)
+
+
+def _write_table(table, path):
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".parquet.tmp", dir=path.parent)
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates the file owner-only
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _first_of_groups(table, columns):
+    """
+    Mask of the rows of a table sorted by columns whose key differs from the previous row.
+    """
+    if table.num_rows == 0:
+        return pa.array([], pa.bool_())
+    changed = None
+    for name in columns:
+        column = table.column(name)
+        differs = pc.fill_null(pc.not_equal(column.slice(1), column.slice(0, table.num_rows - 1)), True)
+        changed = differs if changed is None else pc.or_(changed, differs)
+    return pa.concat_arrays([pa.array([True])] + changed.chunks)
+
+
+def latest_rows(table):
+    """
+    Drop rows superseded by a later record of the same model (a complex predicted again).
+    """
+    order = [(name, "ascending") for name in KEY_COLUMNS] + [("recorded_at", "descending")]
+    table = table.take(pc.sort_indices(table, sort_keys=order))
+    return table.filter(_first_of_groups(table, KEY_COLUMNS))
+
+
+class ResultsStore:
+    """
+    Partitioned Parquet table of prediction results, see the module docstring.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def append(self, name, result, batch="default"):
+        """
+        Record a completed prediction.
+
+        :param name: Complex name
+        :param result: Inference result dict with "cif_paths" and optionally "aggregate_scores"
+        :param batch: Partition to record it in, e.g. the input directory of the run
+        :return: Path of the written file
+        """
+        table = prediction_rows(name, result["cif_paths"], result.get("aggregate_scores"))
+        partition = self.root / f"batch={sanitize_name(batch)}"
+        partition.mkdir(parents=True, exist_ok=True)
+        path = partition / f"{sanitize_name(name)}.{time.time_ns()}.parquet"
+        _write_table(table, path)
+        return path
+
+    def dataset(self):
+        if not self.root.exists():
+            return None
+        return ds.dataset(self.root, format="parquet", partitioning="hive",
+                          schema=RESULTS_SCHEMA.append(pa.field("batch", pa.string())))
+
+    def read(self, filter=None, columns=None):
+        """
+        Latest results as one Arrow table.
+
+        :param filter: Optional pyarrow.dataset expression, e.g. ds.field("iptm") > 0.6; it is applied after
+                       superseded rows are dropped, so an old record cannot stand in for a newer one
+        :param columns: Optional list of columns to read, including those the filter uses
+                        (the key columns are always read)
+        """
+        dataset = self.dataset()
+        if dataset is None:
+            return RESULTS_SCHEMA.append(pa.field("batch", pa.string())).empty_table()
+        if columns is not None:
+            columns = list(dict.fromkeys(KEY_COLUMNS + ["recorded_at"] + list(columns)))
+        table = latest_rows(dataset.to_table(columns=columns))
+        return table if filter is None else table.filter(filter)
+
+    def top_k(self, k=10, by="aggregate_score", filter=None, best_model_only=True, columns=None):
+        """
+        The k best results by a score column, highest first.
+
+        :param best_model_only: Keep only the best model of each complex
+        """
+        if columns is not None:
+            columns = list(dict.fromkeys([by] + list(columns)))
+        table = self.read(filter=filter, columns=columns)
+        table = table.filter(pc.is_valid(table.column(by)))
+        if best_model_only:
+            table = table.take(pc.sort_indices(table, sort_keys=[("batch", "ascending"), ("complex", "ascending"),
+                                                                  (by, "descending")]))
+            table = table.filter(_first_of_groups(table, ["batch", "complex"]))
+        return table.take(pc.select_k_unstable(table, k=min(k, table.num_rows), sort_keys=[(by, "descending")]))
+
+    def compact(self, batch=None):
+        """
+        Merge the files of each partition (or of one batch) into a single file of its latest rows.
+
+        :return: Number of files merged
+        """
+        merged = 0
+        partitions = [self.root / f"batch={sanitize_name(batch)}"] if batch else sorted(self.root.glob("batch=*"))
+        for partition in partitions:
+            files = sorted(partition.glob("*.parquet"))
+            if len(files) < 2:
+                continue
+            table = pa.concat_tables(pq.read_table(path, schema=RESULTS_SCHEMA) for path in files)
+            batch_name = partition.name.split("=", 1)[1]
+            table = latest_rows(table.append_column("batch", pa.array([batch_name] * table.num_rows)))
+            _write_table(table.drop_columns(["batch"]), partition / f"compacted.{time.time_ns()}.parquet")
+            for path in files:
+                path.unlink()
+            merged += len(files)
+        return merged
+
+
+def print_top(table):
+    """
+    Print the rows returned by ResultsStore.top_k() as a table.
+    """
+    print("{:<12} {:<30} {:>5} {:>9} {:>6} {:>6} {:>7}  {}".format(
+        "batch", "complex", "model", "aggregate", "pTM", "ipTM", "pLDDT", "cif"))
+    for row in table.to_pylist():
+        print("{:<12} {:<30} {:>5} {:>9} {:>6} {:>6} {:>7}  {}".format(
+            row["batch"][:12], row["complex"][:30], row["model_idx"],
+            *("-" if row[c] is None else f"{row[c]:.3f}" for c in ("aggregate_score", "ptm", "iptm")),
+            "-" if row["plddt"] is None else f"{row['plddt']:.1f}", row["cif_path"]))
+
+
+def main():
+    # Same as `python cli.py results ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["results"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
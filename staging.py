@@ -0,0 +1,142 @@
+"""
+Staging of pipeline artifacts into the layouts of later stages without copying them.
+
+A3Ms, .aligned.pqt files and FASTA files are placed where the next stage (or
+chai's msa_directory) expects them by, in order of preference,
+
+    reflink   a copy-on-write clone (FICLONE; btrfs, XFS, ...), an independent file sharing the data blocks
+    copy      a real copy, where the filesystem cannot clone
+
+and the source is always left where it is. A reflink is a file of its own, so
+a tool rewriting the source in place never changes what was staged from it.
+
+Hardlinks (methods=LINK_METHODS) and symlinks (methods=SYMLINK_METHODS) are
+available on request for files that are only ever replaced by a rename or
+unlinked before being written again, such as the .aligned.pqt files of
+a3m_to_pqt, files staged by stage_file() itself, and the A3Ms of
+A3M_TGT_Gen.sh, whose old output run_msa_job() unlinks before a search; a
+second name of a file that is later rewritten in place would change with it.
+"""
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+
+# ioctl request of Linux's FICLONE, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+DEFAULT_METHODS = ("reflink", "copy")
+LINK_METHODS = ("reflink", "hardlink", "copy")
+SYMLINK_METHODS = ("reflink", "hardlink", "symlink", "copy")
+
+
+def _reflink(src, dest):
+    with open(src, 'rb') as f_src, open(dest, 'xb') as f_dest:
+        fcntl.ioctl(f_dest.fileno(), FICLONE, f_src.fileno())
+    shutil.copystat(src, dest)
+
+
+def _symlink(src, dest):
+    os.symlink(os.path.abspath(src), dest)
+
+
+_STAGERS = {
+    "reflink": _reflink,
+    "hardlink": os.link,
+    "symlink": _symlink,
+    "copy": shutil.copy2,
+}
+
+
+def _same_file(src, dest):
+    try:
+        return os.path.samefile(src, dest)
+    except OSError:
+        return False
+
+
+def stage_file(src, dest, methods=DEFAULT_METHODS):
+    """
+    Make the file src available as dest without moving or modifying src.
+
+    The first of methods that works is used; copying is only reached when
+    nothing cheaper is possible (e.g. src and dest are on different
+    filesystems). dest is replaced atomically, so a reader never sees a
+    partial file, and is left alone if it already is src.
+
+    :param dest: Destination file path; its directory is created if missing
+    :param methods: Ordered subset of "reflink", "hardlink", "symlink" and "copy"
+    :return: The method used, or "existing" if dest already was src
+    :raises OSError: If no method works, e.g. src does not exist
+    """
+    src = os.fspath(src)
+    dest = os.fspath(dest)
+    os.stat(src)  # A missing source is an error, not a reason to try the next method
+    if _same_file(src, dest):
+        return "existing"
+    dest_dir = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(dest_dir, exist_ok=True)
+    # Staged under a temporary name next to dest, so the final step is a single rename
+    fd, tmp_path = tempfile.mkstemp(prefix=".stage-", dir=dest_dir)
+    os.close(fd)
+    error = OSError(errno.EINVAL, f"No staging method given for {src}")
+    try:
+        for method in methods:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)  # Every method creates the file itself
+            try:
+                _STAGERS[method](src, tmp_path)
+            except OSError as e:
+                error = e
+                continue
+            os.replace(tmp_path, dest)
+            return method
+        raise error
+    finally:
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def iter_files(root, suffixes):
+    """
+    Paths of all files under root whose names end in one of suffixes, from a single walk of the tree.
+
+    Hidden files (such as partially staged ones) and symlinked directories are skipped.
+    """
+    suffixes = (suffixes,) if isinstance(suffixes, str) else tuple(suffixes)
+    stack = [os.fspath(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(suffixes) and entry.is_file():
+                    yield entry.path
+
+
+def stage_tree(src_dir, dest_dir, suffixes, methods=DEFAULT_METHODS, flatten=True):
+    """
+    Stage every file under src_dir with one of the given suffixes into dest_dir.
+
+    :param flatten: Put all files directly in dest_dir (as copy_files() did); otherwise keep
+                    their paths relative to src_dir
+    :return: Dict of destination path -> method used, see stage_file()
+    """
+    staged = {}
+    for path in iter_files(src_dir, suffixes):
+        name = os.path.basename(path) if flatten else os.path.relpath(path, src_dir)
+        dest = os.path.join(dest_dir, name)
+        staged[dest] = stage_file(path, dest, methods)
+    return staged
+
+
+def summarize(staged):
+    """
+    Count of staged files per method, e.g. "3 hardlink, 1 copy".
+    """
+    counts = {}
+    for method in staged.values():
+        counts[method] = counts.get(method, 0) + 1
+    return ", ".join(f"{n} {method}" for method, n in sorted(counts.items())) or "nothing"
@@ -0,0 +1,284 @@
+"""
+Asyncio supervisor for the external tools of the pipeline.
+
+A3M_TGT_Gen.sh and the chai prediction script run as child processes with
+
+- a per-tool timeout, after which the child's whole process group is
+  terminated (and killed if it lingers), so a hung jackhmmer cannot stall a batch;
+- bounded retries with exponential backoff;
+- stdout and stderr written straight into a per-job log file;
+- an explicit interpreter and environment (see tool_environment()) instead of
+  `conda activate`, which only affects the shell it runs in.
+
+Children are reaped with os.wait4() (through a pidfd where available, so no
+thread blocks per child), and each run reports its own resource usage like
+tracing.run_command().
+
+    python cli.py supervise --tool msa --log job.log --timeout 3600 -- A3M_TGT_Gen.sh -i chain.fasta ...
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from fasta_index import sanitize_name
+
+# Per-tool defaults: seconds an attempt may run (None: no limit), attempts after the first one, and the delay
+# before the first retry, doubled for each further one
+TOOL_POLICIES = {
+    "msa": {"timeout": 6 * 3600, "retries": 1, "backoff": 30.0},
+    "predict": {"timeout": 4 * 3600, "retries": 1, "backoff": 60.0},
+    "default": {"timeout": None, "retries": 0, "backoff": 10.0},
+}
+# Seconds between SIGTERM and SIGKILL when an attempt times out
+TERMINATE_GRACE = 10.0
+
+
+def tool_environment(prefix=None, extra=None, base=None):
+    """
+    Environment for running tools of a conda env or virtualenv without activating it.
+
+    :param prefix: Root of the environment (e.g. ~/miniconda3/envs/chai); its bin/ goes first on PATH
+    :param extra: Optional dict of further variables
+    :param base: Environment to start from (default: os.environ)
+    """
+    env = dict(os.environ if base is None else base)
+    if prefix:
+        prefix = os.path.abspath(os.path.expanduser(prefix))
+        env["PATH"] = os.pathsep.join(p for p in (os.path.join(prefix, "bin"), env.get("PATH")) if p)
+        env["CONDA_PREFIX"] = prefix
+        env.pop("PYTHONHOME", None)
+    env.update(extra or {})
+    return env
+
+
+def interpreter(prefix=None):
+    """
+    Python interpreter of an environment, or the one running the pipeline if no prefix is given.
+
+    :raises FileNotFoundError: If the environment has no bin/python
+    """
+    if not prefix:
+        return sys.executable
+    path = os.path.join(os.path.abspath(os.path.expanduser(prefix)), "bin", "python")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No Python interpreter at {path}.")
+    return path
+
+
+def _signal_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def _wait(pid):
+    """
+    Reap a child without blocking the event loop.
+
+    :return: (wait status, rusage) from os.wait4()
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        # No pidfd (non-Linux or an old kernel): block an executor thread instead
+        _, status, usage = await loop.run_in_executor(None, os.wait4, pid, 0)
+        return status, usage
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    _, status, usage = os.wait4(pid, 0)
+    return status, usage
+
+
+def _tail(log_path, size=2048):
+    """
+    Last bytes of a log file as text, for error messages.
+    """
+    if not log_path or not os.path.exists(log_path):
+        return None
+    with open(log_path, 'rb') as f:
+        f.seek(max(0, os.path.getsize(log_path) - size))
+        return f.read().decode(errors="replace")
+
+
+async def _run_once(command, log_path, timeout, env, cwd, header):
+    log = open(log_path, 'ab') if log_path else open(os.devnull, 'wb')
+    with log:
+        log.write(header.encode())
+        log.flush()
+        # A session of its own, so a timeout also reaches the tools the command starts (jackhmmer under the script)
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                   env=env, cwd=cwd, start_new_session=True)
+    start = time.monotonic()
+    reaped = asyncio.ensure_future(_wait(process.pid))
+    try:
+        done, _ = await asyncio.wait({reaped}, timeout=timeout)
+        timed_out = not done
+        if timed_out:
+            _signal_group(process.pid, signal.SIGTERM)
+            done, _ = await asyncio.wait({reaped}, timeout=TERMINATE_GRACE)
+            if not done:
+                _signal_group(process.pid, signal.SIGKILL)
+        status, usage = await reaped
+    except BaseException:
+        # Cancelled or interrupted: do not leave the tool running in its own session
+        _signal_group(process.pid, signal.SIGKILL)
+        raise
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "returncode": process.returncode,
+        "timed_out": timed_out,
+        "seconds": time.monotonic() - start,
+        "max_rss_kb": usage.ru_maxrss,
+        "child_cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "child_read_bytes": usage.ru_inblock * 512,
+        "child_write_bytes": usage.ru_oublock * 512,
+    }
+
+
+async def supervise(command, log_path=None, timeout=None, retries=0, backoff=10.0, env=None, cwd=None, name=None):
+    """
+    Run a command to completion under a timeout, retrying failed attempts.
+
+    Every attempt appends to log_path under a header line. A command that
+    cannot be started at all (OSError) is not retried.
+
+    :param command: Argument list; nothing goes through a shell
+    :param log_path: File that receives the command's stdout and stderr (default: discarded)
+    :param timeout: Seconds an attempt may run before its process group is terminated (None: no limit)
+    :param retries: Attempts after the first one
+    :param backoff: Delay in seconds before the first retry, doubled for each further one
+    :param env: Environment of the command, e.g. from tool_environment() (default: inherited)
+    :param cwd: Working directory of the command
+    :param name: Job name used in messages (default: the command's basename)
+    :return: Dict with "returncode", "timed_out", "attempts", "seconds", "log_path" and the rusage of the
+             last attempt ("max_rss_kb", "child_cpu_seconds", "child_read_bytes", "child_write_bytes")
+    :raises subprocess.TimeoutExpired: If the last attempt timed out
+    :raises subprocess.CalledProcessError: If the last attempt exited non-zero
+    Either error carries the stats dict as .stats, like tracing.run_command() errors.
+    """
+    command = [str(arg) for arg in command]
+    name = name or os.path.basename(command[0])
+    if log_path:
+        log_path = str(log_path)
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+    for attempt in range(1, retries + 2):
+        header = f"### {time.strftime('%Y-%m-%d %H:%M:%S')} attempt {attempt}/{retries + 1}: {' '.join(command)}\n"
+        stats = await _run_once(command, log_path, timeout, env, cwd, header)
+        stats.update(attempts=attempt, log_path=log_path)
+        if stats["returncode"] == 0 and not stats["timed_out"]:
+            return stats
+        reason = f"timed out after {timeout} s" if stats["timed_out"] else f"exited with {stats['returncode']}"
+        if attempt <= retries:
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"{name}: attempt {attempt} {reason}, retrying in {delay:g} s")
+            await asyncio.sleep(delay)
+        else:
+            print(f"{name}: attempt {attempt} {reason}, giving up" + (f" (log: {log_path})" if log_path else ""))
+
+    if stats["timed_out"]:
+        error = subprocess.TimeoutExpired(command, timeout, output=_tail(log_path))
+    else:
+        error = subprocess.CalledProcessError(stats["returncode"], command, output=_tail(log_path))
+    error.stats = stats
+    raise error
+
+
+def run_tool(command, tool="default", **kwargs):
+    """
+    Run one command under the policy of a tool from synchronous code, see supervise().
+
+    :param tool: Key of TOOL_POLICIES whose timeout, retries and backoff apply unless given in kwargs
+    """
+    policy = dict(TOOL_POLICIES.get(tool, TOOL_POLICIES["default"]))
+    policy.update(kwargs)
+    return asyncio.run(supervise(command, **policy))
+
+
+class Supervisor:
+    """
+    Event loop in a background thread that supervises the commands of synchronous callers.
+
+    Worker threads (e.g. those of msa_scheduler.run_msa_jobs()) each call
+    run(), which blocks the caller while one loop waits on all running
+    commands, their timeouts and their backoff delays. Optional per-tool
+    limits cap how many commands of a tool run at once.
+
+    :param policies: Per-tool overrides of TOOL_POLICIES, e.g. {"msa": {"timeout": 3600, "retries": 2}}
+    :param log_dir: Directory of the logs of commands run without a log_path
+    :param limits: Optional dict of tool -> maximum number of concurrently running commands
+    :param env: Environment of all commands, e.g. from tool_environment() (default: inherited)
+    """
+
+    def __init__(self, policies=None, log_dir=None, limits=None, env=None):
+        self.policies = {tool: dict(policy) for tool, policy in TOOL_POLICIES.items()}
+        for tool, policy in (policies or {}).items():
+            self.policies.setdefault(tool, dict(TOOL_POLICIES["default"])).update(policy)
+        self.log_dir = log_dir
+        self.env = env
+        self._limits = {tool: asyncio.Semaphore(n) for tool, n in (limits or {}).items()}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="supervisor", daemon=True)
+        self._thread.start()
+
+    def policy(self, tool):
+        return self.policies.get(tool, self.policies["default"])
+
+    async def _run(self, command, tool, name, overrides):
+        kwargs = dict(self.policy(tool), env=self.env)
+        kwargs.update(overrides)
+        name = name or os.path.basename(str(command[0]))
+        if kwargs.get("log_path") is None and self.log_dir is not None:
+            kwargs["log_path"] = os.path.join(self.log_dir, f"{tool}.{sanitize_name(name)}.log")
+        limit = self._limits.get(tool)
+        if limit is None:
+            return await supervise(command, name=name, **kwargs)
+        async with limit:
+            return await supervise(command, name=name, **kwargs)
+
+    def submit(self, command, tool="default", name=None, **overrides):
+        """
+        Start supervising a command under the policy of a tool.
+
+        :param overrides: supervise() keyword arguments that take precedence over the policy, e.g. log_path
+        :return: concurrent.futures.Future of the supervise() stats
+        """
+        return asyncio.run_coroutine_threadsafe(self._run(command, tool, name, overrides), self._loop)
+
+    def run(self, command, tool="default", name=None, **overrides):
+        """
+        Supervise a command and wait for it, see submit() and supervise().
+        """
+        return self.submit(command, tool, name, **overrides).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    # Same as `python cli.py supervise ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["supervise"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The pipeline's modules live at the top of the repository, not in a package
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS_DIR = os.path.join(REPO_DIR, "benchmarks", "stubs")
+sys.path.insert(0, REPO_DIR)
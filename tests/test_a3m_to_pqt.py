@@ -0,0 +1,38 @@
+import os
+import shutil
+
+import pytest
+
+from a3m_to_pqt import a3m_to_pqt, compare_pqt, convert_a3m_dirs
+from conftest import REPO_DIR
+
+# A3Ms shipped with the repository whose chai-lab conversion is in test_output/
+A3M_DIRS = ["Cetuximab_heavy_chain_only", "Cetuximab_light_chain", "a3m_files"]
+
+
+@pytest.mark.parametrize("a3m_dir", A3M_DIRS)
+@pytest.mark.parametrize("row_group_size", [8192, 1000])
+def test_rows_match_chai_lab(tmp_path, a3m_dir, row_group_size):
+    chain_dir = tmp_path / a3m_dir
+    chain_dir.mkdir()
+    shutil.copy(os.path.join(REPO_DIR, a3m_dir, "uniref90.a3m"), chain_dir / "uniref90.a3m")
+
+    pqt_path = a3m_to_pqt(chain_dir, tmp_path / "out", row_group_size=row_group_size)
+    reference = os.path.join(REPO_DIR, "test_output", pqt_path.name)
+    assert os.path.exists(reference)
+    report = compare_pqt(pqt_path, reference)
+    assert report["schema_equal"]
+    assert report["rows"][0] == report["rows"][1]
+    assert report["num_mismatched_rows"] == 0
+
+
+def test_convert_a3m_dirs_keeps_order(tmp_path):
+    chain_dirs = []
+    for a3m_dir in A3M_DIRS:
+        chain_dir = tmp_path / a3m_dir
+        chain_dir.mkdir()
+        shutil.copy(os.path.join(REPO_DIR, a3m_dir, "uniref90.a3m"), chain_dir / "uniref90.a3m")
+        chain_dirs.append(chain_dir)
+    pqt_paths = convert_a3m_dirs(chain_dirs, tmp_path / "out")
+    assert [p.name for p in pqt_paths] == [a3m_to_pqt(d, tmp_path / "single").name for d in chain_dirs]
+    assert not [p for p in (tmp_path / "out").iterdir() if p.name.startswith(".")]
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import cli
+from conftest import REPO_DIR, STUBS_DIR
+
+
+@pytest.mark.parametrize("argv, func", [
+    (["pair", "--heavy", "h.fasta", "--light", "l.fasta"], cli.pair_command),
+    (["variants", "parent.fasta", "mutations.txt"], cli.variants_command),
+    (["queue", "local", "q/", "--cpu-workers", "3"], cli.queue_command),
+    (["convert", "a3m_dir/", "-o", "out/"], cli.convert_command),
+    (["kmer", "build", "db.fasta", "db.kmer", "--chunk-size", "100"], cli.kmer_command),
+    (["coords", "verify", "store/", "c", "a.cif"], cli.coords_command),
+    (["supervise", "--tool", "msa", "--", "true"], cli.supervise_command),
+])
+def test_commands_parse(argv, func):
+    assert cli.build_parser().parse_args(argv).func is func
+
+
+def test_module_mains_forward_to_cli(monkeypatch):
+    import kmer_index
+
+    calls = []
+    monkeypatch.setattr(cli, "main", calls.append)
+    monkeypatch.setattr(sys, "argv", ["kmer_index.py", "build", "db.fasta", "db.kmer"])
+    kmer_index.main()
+    assert calls == [["kmer", "build", "db.fasta", "db.kmer"]]
+
+
+def test_parser_does_not_import_heavy_modules():
+    # Every subcommand is registered, yet building the parser leaves numpy and pyarrow to the commands
+    code = "import sys, cli; cli.build_parser(); print(sorted({'numpy', 'pyarrow'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
+
+
+def test_msa_filter_options():
+    parser = cli.build_parser()
+    assert cli._msa_filter(parser.parse_args(["run"])) is None
+    assert cli._msa_filter(parser.parse_args(["run", "--max-depth", "100"])) == {"max_depth": 100}
+    args = parser.parse_args(["predict", "d/", "--max-identity", "0.8", "--min-coverage", "0.5"])
+    assert cli._msa_filter(args) == {"max_identity": 0.8, "min_coverage": 0.5}
+
+
+def test_predict_filters_msas(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(STUBS_DIR)
+    input_dir = tmp_path / "c_final_output"
+    input_dir.mkdir()
+    (input_dir / "c.fasta").write_text(">A\nMKTAYIAK\n")
+    rows = ["MKTAYIAK", "MKTAYLAK", "WKTAYLAK", "WWTAYLAK", "WWWAYLAK", "WWWWYLAK"]
+    (input_dir / "A.a3m").write_text("".join(f">r{i}\n{row}\n" for i, row in enumerate(rows)))
+
+    cli.main(["predict", str(input_dir), "--no-cache", "--max-depth", "3", "--device", "cpu"])
+
+    filtered = (input_dir / "A" / "filtered" / "uniref90.a3m").read_text()
+    assert filtered.count(">") == 3
+    assert list((input_dir / "c_output" / "predictions").glob("pred.model_idx_*.cif"))
+
+
+def test_msa_searches_the_prefiltered_database(tmp_path):
+    database = tmp_path / "db.fasta"
+    database.write_text(">hit\nMKTAYIAKQRQISFVKSHFSRQ\n>decoy\nWWWWWWWWWWWWWWWWWW\n")
+    cli.main(["kmer", "build", str(database), str(tmp_path / "index")])
+    batch = tmp_path / "batch"
+    batch.mkdir()
+    (batch / "c.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n")
+
+    cli.main(["msa", str(batch), "--no-cache", "--script", os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"),
+              "--total-cpus", "1", "--prefilter-index", str(tmp_path / "index"), "--min-shared", "2"])
+
+    candidates, = batch.glob("**/candidates.fasta")
+    assert candidates.read_text() == ">hit\nMKTAYIAKQRQISFVKSHFSRQ\n"
+    args = cli.build_parser().parse_args(["queue", "submit", "q/", "b/", "--prefilter-index", "i/",
+                                          "--max-candidates", "50"])
+    assert (args.prefilter_index, args.min_shared, args.max_candidates) == ("i/", 3, 50)
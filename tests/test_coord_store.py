@@ -0,0 +1,61 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from conftest import REPO_DIR
+from coord_store import CoordinateStore, verify_structure
+from mmcif import read_atom_site
+
+CIF_PATHS = sorted(glob.glob(os.path.join(REPO_DIR, "test_output", "pred.model_idx_*.cif")))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip_of_shipped_models(tmp_path, compress):
+    store = CoordinateStore(tmp_path, compress=compress)
+    store.write("cetuximab", CIF_PATHS)
+    assert store.names() == ["cetuximab"]
+
+    structure = store.open("cetuximab")
+    assert verify_structure(structure, CIF_PATHS) == []
+    assert structure.meta["models"] == list(range(len(CIF_PATHS)))
+
+    # The CA trace of each chain matches the CIF text directly, not only the store's own parser
+    atom_site = read_atom_site(CIF_PATHS[0])
+    for chain_id in structure.chain_ids:
+        rows = (atom_site["auth_asym_id"] == chain_id) & (atom_site["label_atom_id"] == "CA")
+        expected = np.stack([atom_site[f"Cartn_{axis}"][rows].astype(np.float32) for axis in "xyz"], axis=1)
+        coords, _ = structure.ca(chain_id, model=0)
+        assert np.allclose(coords, expected, atol=1e-3)
+
+
+def test_rewrite_replaces_earlier_copy(tmp_path):
+    store = CoordinateStore(tmp_path)
+    store.write("c", CIF_PATHS[:2])
+    store.write("c", CIF_PATHS)
+    assert store.open("c").coords.shape[0] == len(CIF_PATHS)
+    assert store.names() == ["c"]
+
+
+def test_long_names_are_stored_whole(tmp_path):
+    # A ligand from a CCD code of five characters, with atom names and an element past the PDB widths
+    fields = ["group_PDB", "id", "type_symbol", "label_atom_id", "label_comp_id", "label_seq_id", "auth_asym_id",
+              "Cartn_x", "Cartn_y", "Cartn_z", "B_iso_or_equiv"]
+    atoms = [("ATOM", "N", "N", "GLY", "1", "A"), ("ATOM", "C", "CA", "GLY", "1", "A"),
+             ("HETATM", "C", "C1001", "A1LIG", "1", "B"), ("HETATM", "XYZ", "CL12", "A1LIG", "1", "B")]
+    rows = [f"{group} {i + 1} {element} {name} {residue} {seq} {chain} {i}.5 0.0 -1.25 80.0"
+            for i, (group, element, name, residue, seq, chain) in enumerate(atoms)]
+    cif_path = tmp_path / "pred.model_idx_0.cif"
+    cif_path.write_text("data_ligand\nloop_\n" + "".join(f"_atom_site.{field}\n" for field in fields)
+                        + "\n".join(rows) + "\n#\n")
+
+    store = CoordinateStore(tmp_path / "store")
+    store.write("ligand", [cif_path])
+    structure = store.open("ligand")
+    assert verify_structure(structure, [cif_path]) == []
+    assert structure.atom_name.tolist() == [b"N", b"CA", b"C1001", b"CL12"]
+    assert structure.residue_name.tolist() == [b"GLY", b"GLY", b"A1LIG", b"A1LIG"]
+    assert structure.element.tolist() == [b"N", b"C", b"C", b"XYZ"]
+    assert structure.chain("B")["atom_name"].tolist() == [b"C1001", b"CL12"]
+    assert structure.ca("A", model=0)[0].tolist() == [[1.5, 0.0, -1.25]]
@@ -0,0 +1,87 @@
+from functools import partial
+
+from dispatcher import GiB, Device, InferenceDispatcher
+from inference_worker import stub_backend
+
+
+def _oom_below_30_gib(job):
+    # Module level, so the spawned workers can unpickle it
+    return job["name"].startswith("big") and job["params"]["device"] != "large"
+
+
+def _job(tmp_path, name, tokens):
+    return {"name": name, "fasta_file": "unused.fasta", "msa_directory": str(tmp_path),
+            "output_dir": str(tmp_path / name), "tokens": tokens}
+
+
+def _dispatcher(**kwargs):
+    devices = [Device("large", 40 * GiB), Device("small", 16 * GiB)]
+    # Every job is estimated to fit anywhere, so only an OOM sends a big one to the large device
+    return InferenceDispatcher(devices=devices, backend_factory=partial(stub_backend, num_models=1,
+                                                                        oom=_oom_below_30_gib),
+                               memory_model=lambda tokens: GiB, poll_interval=0.01, **kwargs)
+
+
+def test_oom_is_requeued_on_a_larger_device(tmp_path):
+    with _dispatcher() as dispatcher:
+        assert [d.name for d in dispatcher.devices] == ["small", "large"]
+        result = dispatcher.run(_job(tmp_path, "big", 2000))
+        small = dispatcher.run(_job(tmp_path, "small", 100))
+    assert result["status"] == "ok"
+    assert result["devices_tried"] == ["small", "large"] and result["device"] == "large"
+    assert result["attempts"] == 2
+    assert small["status"] == "ok" and small["devices_tried"] == ["small"]
+
+
+def test_oom_on_largest_device_fails(tmp_path):
+    with _dispatcher() as dispatcher:
+        dispatcher.devices[-1].name = "largest"  # The stub runs out of memory everywhere but on "large"
+        result = dispatcher.run(_job(tmp_path, "big", 2000))
+    assert result["status"] == "failed" and "out of memory" in result["error"]
+    assert result["devices_tried"] == ["small", "largest"]
+
+
+
+class TokenCostModel:
+    """
+    Cost model predicting one second per token and 1 GiB for any job.
+    """
+
+    def features(self, job):
+        return {"tokens": job["tokens"]}
+
+    def predict_seconds(self, features):
+        return float(features["tokens"])
+
+    def predict_memory(self, features):
+        return GiB
+
+    def record(self, job, features, predicted_seconds, actual_seconds, device=None):
+        pass
+
+
+def test_waiting_jobs_start_longest_predicted_first(tmp_path):
+    dispatcher = InferenceDispatcher(devices=[Device("only", 80 * GiB)],
+                                     backend_factory=partial(stub_backend, num_models=1),
+                                     poll_interval=0.01, cost_model=TokenCostModel())
+    with dispatcher:
+        # Submitted under the scheduler's lock, so all four are waiting when it first places a job
+        with dispatcher._cond:
+            for name, tokens in (("small", 100), ("tiny", 10), ("big", 900), ("medium", 400)):
+                dispatcher.submit(_job(tmp_path, name, tokens))
+        order = [result["name"] for result in dispatcher.results()]
+    assert order == ["big", "medium", "small", "tiny"]
+
+
+def test_token_budget_packs_small_jobs_on_one_device(tmp_path):
+    dispatcher = InferenceDispatcher(devices=[Device("only", 80 * GiB)], memory_model=lambda tokens: GiB,
+                                     workers_per_device=2, token_budget=1000)
+    device = dispatcher.devices[0]
+    # One worker busy with a 600-token job, without starting any process
+    device.workers = ["busy", "idle"]
+    device.busy.add("busy")
+    device.tokens = 600
+    small = {"tokens": 400, "memory": GiB, "min_device_memory": 0}
+    large = dict(small, tokens=600)
+    assert dispatcher._pick_device(small) is device
+    assert dispatcher._pick_device(large) is None
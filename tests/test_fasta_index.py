@@ -0,0 +1,52 @@
+import os
+
+from fasta_index import FastaIndex, build_fasta_index, index_matches, split_fasta
+from tgt_to_chai import plan_fasta_files
+
+
+def test_records_read_through_index(tmp_path):
+    fasta = tmp_path / "lib.fasta"
+    fasta.write_text(">a desc\nMKTA\nYIAK\nQR\n>b\nGSHM\n>c\nMS\nEQNN\n")
+    index = FastaIndex(fasta)
+    assert index.names == ["a desc", "b", "c"]
+    assert [record.sequence for record in index] == ["MKTAYIAKQR", "GSHM", "MSEQNN"]
+    assert (tmp_path / "lib.fasta.fai").exists()
+
+
+def test_stale_index_with_newer_mtime_is_rebuilt(tmp_path):
+    fasta = tmp_path / "lib.fasta"
+    fasta.write_text(">a\nMKTA\n>b\nGSHM\n")
+    FastaIndex(fasta)
+    # Rewritten with the old mtime, as a restore or a same-second rewrite would leave it
+    stat = os.stat(fasta)
+    fasta.write_text(">a\nMKTA\n>b\nGSHMLEDP\n>c\nMS\n")
+    os.utime(fasta, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.path.getmtime(str(fasta) + ".fai") >= os.path.getmtime(fasta)
+
+    index = FastaIndex(fasta)
+    assert index.names == ["a", "b", "c"]
+    assert index["b"].sequence == "GSHMLEDP"
+
+
+def test_index_matches_tolerates_trailing_blank_lines_and_missing_newline(tmp_path):
+    for text in (">a\nMKT\n>b\nGSHM\n\n\n", ">a\nMKT\n>b\nGSHM", ">a\nMK\nTAYIA\n>b\nGS\nHMLE\nD\n"):
+        fasta = tmp_path / "x.fasta"
+        fasta.write_text(text)
+        assert index_matches(fasta, build_fasta_index(fasta))
+
+
+def test_duplicate_names_skip_only_that_complex(tmp_path):
+    (tmp_path / "good.fasta").write_text(">A\nMKT\n>B\nGSH\n")
+    (tmp_path / "dup.fasta").write_text(">A\nMKT\n>A\nGSH\n")
+    (tmp_path / "collide.fasta").write_text(">A B\nMKT\n>A_B\nGSH\n")
+    complexes = plan_fasta_files(str(tmp_path))
+    assert [c["name"] for c in complexes] == ["good"]
+    assert [job["name"] for job in complexes[0]["msa_jobs"]] == ["A", "B"]
+
+
+def test_split_fasta_writes_one_file_per_record(tmp_path):
+    fasta = tmp_path / "c.fasta"
+    fasta.write_text(">heavy chain\nMKTA\nYI\n>light/1\nGSHM\n")
+    paths = split_fasta(str(fasta), str(tmp_path))
+    assert [os.path.basename(p) for p in paths] == ["heavy_chain.fasta", "light_1.fasta"]
+    assert open(paths[0]).read() == ">heavy chain\nMKTA\nYI\n"
@@ -0,0 +1,38 @@
+from functools import partial
+
+from inference_worker import InferenceWorker, stub_backend, stub_worker
+
+
+def _job(tmp_path, name, **extra):
+    return dict(name=name, fasta_file="unused.fasta", msa_directory=str(tmp_path),
+                output_dir=str(tmp_path / name), **extra)
+
+
+def test_jobs_run_in_one_worker_process(tmp_path):
+    with stub_worker(num_models=2) as worker:
+        results = [worker.run(_job(tmp_path, name)) for name in ("a", "b")]
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    assert len(results[1]["cif_paths"]) == 2
+    assert worker.restarts == 0
+
+
+def test_failure_and_crash_are_reported_per_job(tmp_path):
+    with stub_worker(fail_names=("bad",), crash_names=("crash",)) as worker:
+        bad = worker.run(_job(tmp_path, "bad"))
+        crash = worker.run(_job(tmp_path, "crash"))
+        good = worker.run(_job(tmp_path, "good"))
+    assert bad["status"] == "failed" and "stub failure" in bad["error"]
+    assert crash["status"] == "failed" and "crashed" in crash["error"] and crash["attempts"] == 2
+    assert good["status"] == "ok"
+
+
+def test_hung_job_is_killed_and_worker_restarted(tmp_path):
+    with InferenceWorker(backend_factory=partial(stub_backend, delay=60), job_timeout=0.5) as worker:
+        hung = worker.run(_job(tmp_path, "hung"))
+        assert hung["status"] == "failed" and hung["error"] == "timed out after 0.5 s"
+        assert hung["attempts"] == 2 and worker.restarts == 2
+        assert worker._process.is_alive()
+
+        # A per-job timeout takes precedence
+        short = worker.run(_job(tmp_path, "short", timeout=0.2))
+        assert short["error"] == "timed out after 0.2 s"
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from kmer_index import KmerIndex, build_kmer_index, evaluate, kmer_codes, seed_positions
+
+ALPHABET = list("ACDEFGHIKLMNPQRSTVWY")
+
+
+def _write_database(path, sequences):
+    with open(path, 'w') as f:
+        for i, sequence in enumerate(sequences):
+            f.write(f">s{i}\n{sequence}\n")
+
+
+def test_chunked_build_matches_reference(tmp_path):
+    rng = np.random.default_rng(0)
+    sequences = ["".join(rng.choice(ALPHABET, rng.integers(2, 120))) for _ in range(60)] + ["MKXXTAYIAK"]
+    _write_database(tmp_path / "db.fasta", sequences)
+    meta = build_kmer_index(tmp_path / "db.fasta", tmp_path / "index", seed="1101", chunk_size=7)
+
+    # Every posting list holds the sequences containing the k-mer, in database order
+    positions = seed_positions("1101")
+    offsets = np.load(tmp_path / "index" / "offsets.npy")
+    postings = np.load(tmp_path / "index" / "postings.npy")
+    expected = {}
+    for seq_id, sequence in enumerate(sequences):
+        for code in kmer_codes(sequence, positions):
+            expected.setdefault(int(code), []).append(seq_id)
+    assert meta["num_postings"] == len(postings) == sum(len(ids) for ids in expected.values())
+    for code, ids in expected.items():
+        assert list(postings[offsets[code]:offsets[code + 1]]) == ids
+
+
+def test_query_finds_database_sequence(tmp_path):
+    rng = np.random.default_rng(1)
+    sequences = ["".join(rng.choice(ALPHABET, 100)) for _ in range(30)]
+    _write_database(tmp_path / "db.fasta", sequences)
+    build_kmer_index(tmp_path / "db.fasta", tmp_path / "index", chunk_size=4)
+    index = KmerIndex(str(tmp_path / "index"), max_frequency=1.0)
+    assert index.candidates(sequences[12][10:80])[0] == 12
+
+
+def test_empty_database(tmp_path):
+    _write_database(tmp_path / "db.fasta", [])
+    meta = build_kmer_index(tmp_path / "db.fasta", tmp_path / "index")
+    assert meta["num_sequences"] == 0 and meta["num_postings"] == 0
+    assert KmerIndex(str(tmp_path / "index")).write_subset("MKTAYIAKQR", tmp_path / "subset.fasta") == 0
+
+
+def test_subset_and_evaluation_read_the_record_table(tmp_path):
+    rng = np.random.default_rng(2)
+    sequences = ["".join(rng.choice(ALPHABET, 90)) for _ in range(20)]
+    # Wrapped lines, descriptions after the name and a missing final newline all have to survive
+    records = [f">u{i} some description n=1\n{s[:60]}\n{s[60:]}\n" for i, s in enumerate(sequences)]
+    (tmp_path / "db.fasta").write_text("".join(records)[:-1])
+    meta = build_kmer_index(tmp_path / "db.fasta", tmp_path / "index", chunk_size=3)
+    index = KmerIndex(str(tmp_path / "index"), min_shared=1, max_frequency=1.0)
+
+    assert meta["num_sequences"] == 20
+    assert [index.name(i) for i in range(20)] == [f"u{i}" for i in range(20)]
+    assert list(np.diff(index.record_offsets)) == [len(r) for r in records[:-1]] + [len(records[-1]) - 1]
+
+    ids = index.candidates(sequences[5][:50] + sequences[17][40:])
+    assert index.write_subset(sequences[5][:50] + sequences[17][40:], tmp_path / "subset.fasta") == len(ids)
+    assert (tmp_path / "subset.fasta").read_text() == "".join(records[i] for i in sorted(ids))
+    assert {5, 17} <= set(ids)
+
+    report, = evaluate(index, [("q", sequences[5], {"u5", "missing"})])
+    assert report["recall"] == 0.5 and report["candidates"] == len(index.candidates(sequences[5]))
+
+
+def test_index_without_record_table_is_rejected(tmp_path):
+    _write_database(tmp_path / "db.fasta", ["MKTAYIAKQR"])
+    build_kmer_index(tmp_path / "db.fasta", tmp_path / "index")
+    os.remove(tmp_path / "index" / "record_offsets.npy")
+    with pytest.raises(FileNotFoundError, match="kmer build"):
+        KmerIndex(str(tmp_path / "index"))
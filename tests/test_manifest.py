@@ -0,0 +1,29 @@
+import json
+
+from manifest import Manifest
+
+
+def test_updates_are_journaled_and_replayed(tmp_path):
+    data = tmp_path / "data.txt"
+    data.write_text("x")
+    manifest = Manifest(str(tmp_path / "manifest.json"), compact_every=3)
+    inputs = manifest.fingerprints([data])
+    for i in range(3):
+        manifest.mark_done("msa", f"c/{i}", inputs, outputs=[data])
+    # No snapshot yet: every update is one journal line
+    assert not (tmp_path / "manifest.json").exists()
+    assert len((tmp_path / "manifest.json.journal").read_text().splitlines()) == 3
+
+    manifest.mark_failed("msa", "c/3", inputs, error="boom")  # The fourth update compacts
+    assert (tmp_path / "manifest.json.journal").read_text() == ""
+    manifest.mark_done("msa", "c/3", inputs, outputs=[data])
+    # A run killed mid-write leaves half a line, which is ignored
+    with open(tmp_path / "manifest.json.journal", 'a') as f:
+        f.write('{"stage": "msa", "key"')
+
+    reloaded = Manifest(str(tmp_path / "manifest.json"))
+    assert reloaded.summary() == {"msa": {"done": 4}}
+    assert all(reloaded.is_done("msa", f"c/{i}", inputs) for i in range(4))
+    assert reloaded.fingerprints([data]) == inputs
+    reloaded.save()
+    assert len(json.loads((tmp_path / "manifest.json").read_text())["stages"]["msa"]) == 4
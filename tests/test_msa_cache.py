@@ -0,0 +1,37 @@
+from msa_cache import MSACache
+
+
+def _put(cache, tmp_path, sequence, size):
+    pqt = tmp_path / f"{sequence}.aligned.pqt"
+    pqt.write_bytes(b"x" * size)
+    return cache.put(sequence, "jackhmm", "uniref90", 3, str(pqt))
+
+
+def test_put_scans_entries_only_when_over_budget(tmp_path, monkeypatch):
+    cache = MSACache(str(tmp_path / "cache"), max_bytes=1000)
+    _put(cache, tmp_path, "AAA", 100)  # Counts the (empty) cache once to start the counter
+
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or entries())
+    for sequence in ("CCC", "DDD", "EEE"):
+        _put(cache, tmp_path, sequence, 100)
+    assert scans == []
+    assert cache.size() == 400
+
+    # The next put goes over max_bytes and evicts the least recently used entries, down to 90%
+    _put(cache, tmp_path, "FFF", 700)
+    assert len(scans) == 2  # evict(), and the size() above
+    assert cache.size() <= 900
+    assert cache.get("FFF", "jackhmm", "uniref90", 3) is not None
+    assert cache.get("AAA", "jackhmm", "uniref90", 3) is None
+
+
+def test_fetch_miss_and_hit(tmp_path):
+    cache = MSACache(str(tmp_path / "cache"))
+    assert cache.fetch("MKT", "jackhmm", "uniref90", 3, str(tmp_path / "out")) is None
+    _put(cache, tmp_path, "MKT", 10)
+    assert cache.contains("MKT", "jackhmm", "uniref90", 3)
+    assert not cache.contains("MKT", "jackhmm", "uniref90", 5)
+    staged = cache.fetch("MKT", "jackhmm", "uniref90", 3, str(tmp_path / "out"))
+    assert [open(path, 'rb').read() for path in staged] == [b"x" * 10]
@@ -0,0 +1,45 @@
+import numpy as np
+
+from msa_filter import GAP, UNKNOWN, encode_alignment, filter_alignment
+
+
+def _greedy_filter(matrix, max_identity):
+    # Pair by pair, as hhfilter does
+    lengths = (matrix != GAP).sum(axis=1)
+    kept = [0]
+    for i in range(1, len(matrix)):
+        for j in kept:
+            matches = ((matrix[i] == matrix[j]) & (matrix[i] < UNKNOWN)).sum()
+            if matches / max(min(lengths[i], lengths[j]), 1) >= max_identity:
+                break
+        else:
+            kept.append(i)
+    return kept
+
+
+def test_encode_alignment_drops_insertions():
+    matrix = encode_alignment(["ARN-", "AaRN-", "A.R-X"])
+    assert matrix.shape == (3, 4)
+    assert (matrix[0] == matrix[1]).all()
+    assert matrix[2, 3] == UNKNOWN and matrix[0, 3] == GAP
+
+
+def test_filter_matches_greedy_reference_across_blocks():
+    rng = np.random.default_rng(0)
+    parents = rng.integers(0, 20, size=(8, 60))
+    # Noisy copies of a few parents, so many rows are close to an earlier one
+    rows = parents[rng.integers(0, len(parents), size=300)]
+    noise = rng.random(rows.shape) < rng.uniform(0.0, 0.3, size=(len(rows), 1))
+    matrix = np.where(noise, rng.integers(0, GAP + 1, size=rows.shape), rows).astype(np.uint8)
+    matrix = np.unique(matrix, axis=0)
+    rng.shuffle(matrix[1:])
+
+    kept, depths = filter_alignment(matrix, max_identity=0.8, block_size=16)
+    assert list(kept) == _greedy_filter(matrix, 0.8)
+    assert depths["input"] == len(matrix) and depths["output"] == len(kept)
+
+
+def test_filter_max_depth_keeps_query():
+    matrix = np.random.default_rng(1).integers(0, 20, size=(100, 30)).astype(np.uint8)
+    kept, depths = filter_alignment(matrix, max_identity=0.95, max_depth=10, block_size=8)
+    assert len(kept) == 10 and kept[0] == 0
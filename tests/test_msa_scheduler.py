@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+from conftest import STUBS_DIR
+from msa_scheduler import CpuBudget, find_chain_a3ms, print_msa_report, run_msa_jobs, threads_for_length
+
+
+def _acquire_in_thread(budget, n, granted, priority=0):
+    def run():
+        budget.acquire(n, priority)
+        granted.append(n)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    time.sleep(0.05)  # Let it queue up before the next one arrives
+    return thread
+
+
+def test_waiting_long_job_is_not_overtaken():
+    budget = CpuBudget(4)
+    budget.acquire(3)
+    granted = []
+    long_job = _acquire_in_thread(budget, 4, granted)
+    short_job = _acquire_in_thread(budget, 1, granted)
+    # One core is free, but the short job is behind the long one
+    assert granted == []
+
+    budget.release(3)
+    long_job.join(timeout=5)
+    assert granted == [4]
+    budget.release(4)
+    short_job.join(timeout=5)
+    assert granted == [4, 1]
+
+
+def test_priority_orders_waiting_jobs():
+    budget = CpuBudget(2)
+    budget.acquire(2)
+    granted = []
+    threads = [_acquire_in_thread(budget, n, granted, priority) for n, priority in ((1, 2), (2, 1), (1, 0))]
+    budget.release(2)
+    threads[2].join(timeout=5)
+    # Priority 0 took one core; priority 1 needs both and blocks priority 2
+    assert granted == [1]
+    budget.release(1)
+    threads[1].join(timeout=5)
+    budget.release(2)
+    threads[0].join(timeout=5)
+    assert granted == [1, 2, 1]
+
+
+def test_threads_for_length_halves_short_chains():
+    assert threads_for_length(100, 8) == 4
+    assert threads_for_length(400, 8) == 8
+    assert threads_for_length(100, 1) == 1
+
+
+def test_run_msa_jobs_with_stub_script(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "10")
+    monkeypatch.setenv("STUB_MSA_FAIL", "bad.fasta")
+    jobs = []
+    for name, sequence in (("short", "MKTAYIAKQR"), ("long", "MKTAYIAKQR" * 20), ("bad", "GSHMLEDPVD")):
+        fasta_path = tmp_path / f"{name}.fasta"
+        fasta_path.write_text(f">{name}\n{sequence}\n")
+        (tmp_path / name).mkdir()
+        jobs.append({"name": name, "fasta": str(fasta_path), "output_dir": str(tmp_path / name)})
+    done = []
+
+    results = run_msa_jobs(jobs, total_cpus=4, max_threads=4, script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"),
+                           on_done=lambda job, result: done.append(job["name"]))
+
+    assert [r["name"] for r in results] == ["short", "long", "bad"]
+    assert [r["status"] for r in results] == ["ok", "ok", "failed"]
+    assert results[0]["cpus"] == 2 and results[1]["cpus"] == 4
+    assert sorted(done) == ["bad", "long", "short"]
+    assert find_chain_a3ms(jobs[0]) == [str(tmp_path / "short.a3m")]
+    assert find_chain_a3ms(jobs[2]) == []
+
+    failed = print_msa_report(results)
+    assert [r["name"] for r in failed] == ["bad"]
+    assert "MSA jobs: 2 succeeded, 1 failed" in capsys.readouterr().out
@@ -0,0 +1,43 @@
+import numpy as np
+
+from msa_filter import encode_alignment
+from msa_stats import STATS_SUFFIX, alignment_stats, parse_a3m_buffer, route_msa
+from tgt_to_chai import prepare_complex
+
+A3M = ">A\nMKTAYIAK\n>hit1 desc\nMKTAYLAK\n>hit2\nMK-AYiaIAK\n#comment\n>hit3\n--WWWWW-\n"
+
+
+def test_parse_a3m_buffer_matches_encode_alignment():
+    buffer = np.frombuffer(A3M.encode(), dtype=np.uint8)
+    rows = ["MKTAYIAK", "MKTAYLAK", "MK-AYiaIAK", "--WWWWW-"]
+    assert (parse_a3m_buffer(buffer) == encode_alignment(rows)).all()
+
+
+def test_stats_and_route():
+    stats = alignment_stats(parse_a3m_buffer(np.frombuffer(A3M.encode(), dtype=np.uint8)))
+    assert stats["depth"] == 4 and stats["query_length"] == 8
+    # The query, hit1 and hit2 are within 80% of each other and count as one; hit3 is on its own
+    assert abs(stats["neff"] - 2.0) < 1e-6
+    assert route_msa(stats, min_neff=2.0) == "full"
+    assert route_msa(stats, min_neff=10.0) == "single_sequence"
+    assert route_msa(stats, skip_below_neff=10.0) == "skip"
+
+
+def _complex_dir(tmp_path):
+    input_dir = tmp_path / "c_final_output"
+    input_dir.mkdir(parents=True)
+    (input_dir / "c.fasta").write_text(">A\nMKTAYIAK\n")
+    (input_dir / "A.a3m").write_text(A3M)
+    return input_dir
+
+
+def test_stats_only_written_when_gated_or_asked(tmp_path):
+    job = prepare_complex(_complex_dir(tmp_path / "plain"))
+    assert not list((tmp_path / "plain").rglob(f"*{STATS_SUFFIX}"))
+
+    job = prepare_complex(_complex_dir(tmp_path / "asked"), msa_stats=True)
+    assert len(list((tmp_path / "asked").rglob(f"*{STATS_SUFFIX}"))) == 1
+
+    job = prepare_complex(_complex_dir(tmp_path / "gated"), msa_gate={"min_neff": 100.0})
+    assert len(list((tmp_path / "gated").rglob(f"gated/*{STATS_SUFFIX}"))) == 1
+    assert job["fasta_file"].endswith(".fasta")
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from a3m_to_pqt import pqt_name
+from conftest import STUBS_DIR
+from pairing import compute_chain_msas, layout_pairs, read_library, run_pairing, unique_sequences
+
+HEAVY = {"H1": "MKTAYIAKQRQISFVKSHFSRQ", "H2": "GSHMLEDPVDAFQGTLQLIRQA"}
+# L1 reuses the sequence of H2, so it is aligned once for both libraries
+LIGHT = {"L1": "GSHMLEDPVDAFQGTLQLIRQA", "L2": "MSEQNNTEMTFQIQRIYTKDIS"}
+
+
+def _fasta(path, chains):
+    path.write_text("".join(f">{name}\n{sequence}\n" for name, sequence in chains.items()))
+    return path
+
+
+def test_read_library_deduplicates(tmp_path):
+    first = _fasta(tmp_path / "a.fasta", {"H1": HEAVY["H1"], "H 2": HEAVY["H2"].lower()})
+    second = _fasta(tmp_path / "b.fasta", {"H1": HEAVY["H1"]})
+    assert read_library([first, second]) == [("H1", HEAVY["H1"]), ("H_2", HEAVY["H2"])]
+
+    conflicting = _fasta(tmp_path / "c.fasta", {"H1": HEAVY["H2"]})
+    with pytest.raises(ValueError, match="Chain H1 appears with two different sequences"):
+        read_library([first, conflicting])
+
+
+def test_chains_are_aligned_once_and_pairs_share_them(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "10")
+    heavy = read_library(_fasta(tmp_path / "heavy.fasta", HEAVY))
+    light = read_library(_fasta(tmp_path / "light.fasta", LIGHT))
+    sequences = unique_sequences(heavy, light)
+    assert len(sequences) == 3
+    script = os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh")
+
+    msa_dir = compute_chain_msas(sequences, tmp_path / "work", cpu_num=1, total_cpus=2, script_path=script)
+    assert "3 unique chains, 3 need an MSA search" in capsys.readouterr().out
+    assert sorted(p.name for p in msa_dir.glob("*.aligned.pqt")) == sorted(pqt_name(s) for s in sequences.values())
+    # A second run finds every chain in the store
+    compute_chain_msas(sequences, tmp_path / "work", cpu_num=1, total_cpus=2, script_path=script)
+    assert "3 unique chains, 0 need an MSA search" in capsys.readouterr().out
+
+    jobs = layout_pairs(heavy, light, msa_dir, tmp_path / "work" / "complexes")
+    assert [job["name"] for job in jobs] == ["H1__L1", "H1__L2", "H2__L1", "H2__L2"]
+    for job in jobs:
+        heavy_name, light_name = job["name"].split("__")
+        linked = sorted(p.name for p in (tmp_path / "work" / "complexes" / job["name"]).glob("*.aligned.pqt"))
+        assert linked == sorted({pqt_name(HEAVY[heavy_name]), pqt_name(LIGHT[light_name])})
+        assert open(job["fasta_file"]).read().startswith(f">protein|name={heavy_name}\n")
+
+    # A pair whose chain has no MSA is left out
+    os.unlink(msa_dir / pqt_name(LIGHT["L2"]))
+    assert [job["name"] for job in layout_pairs(heavy, light, msa_dir, tmp_path / "other")] == ["H1__L1", "H2__L1"]
+
+
+def test_run_pairing_with_stubs(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "10")
+    monkeypatch.syspath_prepend(STUBS_DIR)
+    results = run_pairing(_fasta(tmp_path / "heavy.fasta", HEAVY), _fasta(tmp_path / "light.fasta", LIGHT),
+                          tmp_path / "work", cpu_num=1, total_cpus=2,
+                          script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
+    assert [(r["name"], r["status"]) for r in results] == [
+        ("H1__L1", "ok"), ("H1__L2", "ok"), ("H2__L1", "ok"), ("H2__L2", "ok")]
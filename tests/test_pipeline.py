@@ -0,0 +1,142 @@
+import os
+import threading
+from functools import partial
+
+from conftest import STUBS_DIR
+from inference_worker import stub_worker
+from manifest import Manifest
+from pipeline import _msa_order, run_pipeline
+
+SEQUENCES = ["MKTAYIAKQRQISFVKSHFSRQ", "GSHMLEDPVDAFQGTLQLIRQA", "MSEQNNTEMTFQIQRIYTKDIS"]
+
+
+class BrokenWorker:
+    """
+    Shared inference worker whose submit() raises an exception the pipeline does not expect.
+    """
+
+    def start(self):
+        pass
+
+    def submit(self, job):
+        raise KeyError("device")
+
+    def poll(self, timeout=0.0):
+        return []
+
+    def close(self):
+        pass
+
+
+class BatchWorker:
+    """
+    Shared inference worker that finishes nothing until it holds every complex, as a dispatcher ordering the
+    whole ready set would; a pipeline waiting on one job at a time never gets there.
+    """
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.jobs = []
+
+    def start(self):
+        pass
+
+    def submit(self, job):
+        self.jobs.append(job)
+        return len(self.jobs) - 1
+
+    def poll(self, timeout=0.0):
+        if len(self.jobs) < self.expected:
+            return []
+        finished = [{"job_id": i, "status": "ok", "error": None, "cif_paths": [], "aggregate_scores": []}
+                    for i, job in enumerate(self.jobs) if job is not None]
+        self.jobs = [None] * len(self.jobs)
+        return finished
+
+    def close(self):
+        pass
+
+
+def _write_complexes(tmp_path):
+    for i, sequence in enumerate(SEQUENCES):
+        (tmp_path / f"complex{i}.fasta").write_text(f">A\n{sequence}\n>B\n{sequence[::-1]}\n")
+
+
+def _run_in_thread(tmp_path, worker, **kwargs):
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(run_pipeline(
+        str(tmp_path), cpu_num=1, total_cpus=2, script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"),
+        worker=worker, manifest=Manifest(str(tmp_path / "manifest.json")), **kwargs)), daemon=True)
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive(), "run_pipeline did not return"
+    return results
+
+
+def test_unexpected_inference_error_fails_complexes(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "20")
+    _write_complexes(tmp_path)
+
+    # One-slot queues: a stage that stopped on the error would block the stages before it
+    results = _run_in_thread(tmp_path, BrokenWorker(), queue_size=1)
+
+    assert sorted(r["name"] for r in results) == ["complex0", "complex1", "complex2"]
+    assert {r["status"] for r in results} == {"failed"}
+    assert all(r["error"] == "KeyError: 'device'" for r in results)
+
+
+def test_shared_worker_sees_every_ready_complex(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "20")
+    _write_complexes(tmp_path)
+
+    worker = BatchWorker(expected=len(SEQUENCES))
+    results = _run_in_thread(tmp_path, worker)
+
+    assert len(worker.jobs) == len(SEQUENCES)
+    assert sorted(r["name"] for r in results) == ["complex0", "complex1", "complex2"]
+    assert {r["status"] for r in results} == {"ok"}
+
+
+def test_msa_order_is_longest_complex_first():
+    complexes = [{"msa_jobs": [{"name": "s", "length": 50}]},
+                 {"msa_jobs": [{"name": "l1", "length": 300}, {"name": "l2", "length": 400}]},
+                 {"msa_jobs": [{"name": "m", "length": 200}]}]
+    assert [job["name"] for job in _msa_order(complexes)] == ["l2", "l1", "m", "s"]
+
+
+def test_rerun_skips_completed_stages_and_redoes_changed_inputs(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "20")
+    monkeypatch.syspath_prepend(STUBS_DIR)
+    _write_complexes(tmp_path)
+
+    def run():
+        results = run_pipeline(str(tmp_path), cpu_num=1, total_cpus=2,
+                               script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"),
+                               worker_factory=partial(stub_worker, num_models=1),
+                               manifest=Manifest(str(tmp_path / "manifest.json")))
+        assert {r["status"] for r in results} == {"ok"}
+        return capsys.readouterr().out
+
+    first = run()
+    assert "Skipping" not in first
+
+    second = run()
+    for i in range(len(SEQUENCES)):
+        assert f"Skipping MSA for complex{i}/A, already done" in second
+        assert f"Skipping preparation of complex{i}, already done" in second
+        assert f"Skipping inference for complex{i}, already done" in second
+    assert "Running command" not in second
+
+    # A new chain sequence is searched again; an edited A3M is converted and predicted again
+    (tmp_path / "complex0.fasta").write_text(f">A\nMKTAYIAKQRQ\n>B\n{SEQUENCES[0][::-1]}\n")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    a3m_path = manifest.entry("msa", "complex1/B")["outputs"][0]
+    with open(a3m_path, 'a') as f:
+        f.write(">extra\n" + "-" * len(SEQUENCES[1]) + "\n")
+    third = run()
+    assert "Skipping MSA for complex0/A" not in third and "Skipping MSA for complex0/B" in third
+    assert "Skipping MSA for complex1/B" in third
+    for name in ("complex0", "complex1"):
+        assert f"Skipping preparation of {name}" not in third
+        assert f"Skipping inference for {name}" not in third
+    assert "Skipping inference for complex2, already done" in third
@@ -0,0 +1,89 @@
+import json
+import os
+from functools import partial
+
+import cli
+from conftest import STUBS_DIR
+from inference_worker import stub_worker
+from msa_cache import MSACache, sequence_hash
+from planner import complex_paths, plan_batch
+from tgt_to_chai import prepare_complex, process_fasta_files1, process_fasta_files2
+
+SEQUENCES = {"A": "MKTAYIAKQRQISFVKSHFSRQ", "B": "GSHMLEDPVDAFQGTLQLIRQA", "C": "MSEQNNTEMTFQIQRIYTKDIS"}
+
+
+def _tree(root):
+    return sorted(os.path.relpath(os.path.join(path, name), root)
+                  for path, dirs, files in os.walk(root) for name in dirs + files)
+
+
+def _states(batch, **kwargs):
+    return {c["name"]: (c["state"], [chain["state"] for chain in c["chains"]], c["error"])
+            for c in plan_batch(str(batch), **kwargs)}
+
+
+def test_states_from_files_on_disk(tmp_path, capsys):
+    batch = tmp_path / "batch"
+    batch.mkdir()
+    for name in ("fresh", "searched", "converted", "done"):
+        (batch / f"{name}.fasta").write_text(f">A\n{SEQUENCES['A']}\n>B\n{SEQUENCES['B']}\n")
+    (batch / "cached.fasta").write_text(f">A\n{SEQUENCES['A']}\n>C\n{SEQUENCES['C']}\n")
+    (batch / "clash.fasta").write_text(f">a b\n{SEQUENCES['A']}\n>a_b\n{SEQUENCES['B']}\n")
+    (batch / "empty.fasta").write_text("")
+
+    paths = {name: complex_paths(str(batch), f"{name}.fasta") for name in ("searched", "converted", "done")}
+    os.makedirs(paths["searched"]["split_dir"])
+    open(os.path.join(paths["searched"]["split_dir"], "A.a3m"), 'w').close()
+    os.makedirs(os.path.join(paths["searched"]["final_output_dir"], "B"))
+    open(os.path.join(paths["searched"]["final_output_dir"], "B", "uniref90.a3m"), 'w').close()
+    cache = MSACache(str(tmp_path / "cache"))
+    (tmp_path / "x.aligned.pqt").write_bytes(b"pqt")
+    cache.put(SEQUENCES["C"], "jackhmm", "uniref90", 3, str(tmp_path / "x.aligned.pqt"))
+    # Converted chains count only with the chai FASTA beside them
+    prepared_dir = paths["converted"]["prepared_dir"]
+    os.makedirs(os.path.join(prepared_dir, "gated"))
+    for chain in ("A", "B"):
+        pqt = f"{sequence_hash(SEQUENCES[chain])}.aligned.pqt"
+        open(os.path.join(prepared_dir, *(("gated",) if chain == "B" else ()), pqt), 'w').close()
+    open(os.path.join(prepared_dir, "converted.chai.fasta"), 'w').close()
+    os.makedirs(os.path.join(paths["done"]["prepared_dir"], "predictions"))
+    open(os.path.join(paths["done"]["prepared_dir"], "predictions", "pred.model_idx_0.cif"), 'w').close()
+
+    before = _tree(tmp_path)
+    states = _states(batch, cache_dir=str(tmp_path / "cache"))
+    assert states == {
+        "cached": ("msa", ["needs_msa", "cached"], None),
+        "clash": ("invalid", ["needs_msa", "needs_msa"], "FASTA names collide as 'a_b'"),
+        "converted": ("ready", ["pqt", "pqt"], None),
+        "done": ("predicted", ["needs_msa", "needs_msa"], None),
+        "empty": ("invalid", [], "no sequences"),
+        "fresh": ("msa", ["needs_msa", "needs_msa"], None),
+        "searched": ("prepare", ["a3m", "a3m"], None),
+    }
+    # Another search configuration does not see the cached chain
+    assert _states(batch, cache_dir=str(tmp_path / "cache"), iterations=5)["cached"][1] == ["needs_msa"] * 2
+    assert _states(batch, cache_dir=None)["cached"][1] == ["needs_msa"] * 2
+
+    cli.main(["plan", str(batch), "--cache-dir", str(tmp_path / "cache"), "--json"])
+    assert json.loads(capsys.readouterr().out) == plan_batch(str(batch), cache_dir=str(tmp_path / "cache"))
+    cli.main(["plan", str(batch), "--no-cache", "-v"])
+    out = capsys.readouterr().out
+    assert "7 complexes: 1 predicted, 1 ready, 1 prepare, 2 msa, 2 invalid" in out
+    assert "12 chains: 2 pqt, 0 cached, 2 a3m, 8 needs_msa" in out
+    # A dry run: nothing was written, not even a .fai index
+    assert _tree(tmp_path) == before
+
+
+def test_plan_follows_a_run(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(STUBS_DIR)
+    monkeypatch.setenv("STUB_MSA_DEPTH", "5")
+    (tmp_path / "c.fasta").write_text(f">A\n{SEQUENCES['A']}\n>B\n{SEQUENCES['B']}\n")
+    assert _states(tmp_path, cache_dir=None)["c"][0] == "msa"
+
+    final_output_dir, = process_fasta_files1(str(tmp_path), total_cpus=1,
+                                             script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
+    assert _states(tmp_path, cache_dir=None)["c"][:2] == ("prepare", ["a3m", "a3m"])
+    prepare_complex(final_output_dir)
+    assert _states(tmp_path, cache_dir=None)["c"][:2] == ("ready", ["pqt", "pqt"])
+    process_fasta_files2(final_output_dir, worker=partial(stub_worker, num_models=1)())
+    assert _states(tmp_path, cache_dir=None)["c"][0] == "predicted"
@@ -0,0 +1,82 @@
+import glob
+import os
+import shutil
+
+import numpy as np
+import pyarrow.dataset as ds
+
+from conftest import REPO_DIR, STUBS_DIR
+from results_store import ResultsStore
+
+CIF_PATHS = sorted(glob.glob(os.path.join(REPO_DIR, "test_output", "pred.model_idx_*.cif")))
+
+
+def _predict(monkeypatch, output_dir, scores):
+    """
+    Run the stub chai and give its models the (aggregate score, ipTM) pairs of scores.
+    """
+    monkeypatch.syspath_prepend(STUBS_DIR)
+    from chai_lab.chai1 import run_inference
+
+    output_dir.mkdir(parents=True)
+    (output_dir / "in.fasta").write_text(">protein|name=A\nMKTAYIAK\n")
+    candidates = run_inference(output_dir / "in.fasta", output_dir, num_models=len(scores))
+    for i, (aggregate, iptm) in enumerate(scores):
+        np.savez(output_dir / f"scores.model_idx_{i}.npz", aggregate_score=np.array([aggregate]),
+                 ptm=np.array([aggregate]), iptm=np.array([iptm]), per_chain_ptm=np.array([[aggregate, iptm]]),
+                 has_inter_chain_clashes=np.array([iptm < 0.3]))
+    return {"cif_paths": [str(path) for path in candidates.cif_paths],
+            "aggregate_scores": [r.aggregate_score for r in candidates.ranking_data]}
+
+
+def _keys(table):
+    return sorted(zip(table.column("batch").to_pylist(), table.column("complex").to_pylist(),
+                      table.column("model_idx").to_pylist(), table.column("aggregate_score").to_pylist()))
+
+
+def test_append_rank_supersede_and_compact(tmp_path, monkeypatch):
+    store = ResultsStore(tmp_path / "results")
+    store.append("c1", _predict(monkeypatch, tmp_path / "c1", [(0.4, 0.5), (0.7, 0.2)]), batch="run1")
+    store.append("c2", _predict(monkeypatch, tmp_path / "c2", [(0.6, 0.9), (0.5, 0.8)]), batch="run1")
+    store.append("c3", _predict(monkeypatch, tmp_path / "c3", [(0.9, 0.1)]), batch="run2")
+
+    table = store.read()
+    assert table.num_rows == 5
+    c2 = [row for row in table.to_pylist() if row["complex"] == "c2"]
+    assert [row["per_chain_ptm"] for row in c2] == [[0.6, 0.9], [0.5, 0.8]]
+    assert [row["has_inter_chain_clashes"] for row in table.to_pylist() if row["complex"] == "c1"] == [False, True]
+
+    top = store.top_k(k=2)
+    assert list(zip(top.column("complex").to_pylist(), top.column("model_idx").to_pylist())) == [("c3", 0), ("c1", 1)]
+    good = store.top_k(k=10, by="iptm", filter=ds.field("iptm") > 0.6, best_model_only=False)
+    assert list(zip(good.column("complex").to_pylist(), good.column("iptm").to_pylist())) == [("c2", 0.9),
+                                                                                              ("c2", 0.8)]
+
+    # c1 predicted again: its new rows replace the old ones everywhere
+    store.append("c1", _predict(monkeypatch, tmp_path / "c1_again", [(0.95, 0.5), (0.1, 0.5)]), batch="run1")
+    latest = store.read()
+    assert latest.num_rows == 5
+    assert store.top_k(k=1).column("complex").to_pylist() == ["c1"]
+
+    assert store.compact(batch="run2") == 0
+    assert store.compact() == 3
+    assert len(list((tmp_path / "results" / "batch=run1").glob("*.parquet"))) == 1
+    assert _keys(store.read()) == _keys(latest)
+    assert store.read(columns=["iptm"]).column_names[:4] == ["batch", "complex", "model_idx", "recorded_at"]
+
+
+def test_rows_from_shipped_models_and_missing_scores(tmp_path, monkeypatch):
+    result = _predict(monkeypatch, tmp_path / "c", [(0.5, 0.5)] * len(CIF_PATHS))
+    for cif_path, shipped in zip(result["cif_paths"], CIF_PATHS):
+        shutil.copyfile(shipped, cif_path)
+    os.remove(tmp_path / "c" / "scores.model_idx_1.npz")
+    result["aggregate_scores"] = [0.5, 0.25] + [0.5] * (len(CIF_PATHS) - 2)
+
+    store = ResultsStore(tmp_path / "results")
+    store.append("c", result)
+    rows = store.read().to_pylist()
+    assert [row["model_idx"] for row in rows] == list(range(len(CIF_PATHS)))
+    assert all(row["chain_ids"] and len(row["chain_plddt"]) == len(row["chain_ids"]) for row in rows)
+    assert all(0 < row["plddt"] <= 100 for row in rows)
+    # Without its npz a model keeps the aggregate score chai returned, and nothing else
+    assert (rows[1]["aggregate_score"], rows[1]["ptm"], rows[1]["has_inter_chain_clashes"]) == (0.25, None, None)
@@ -0,0 +1,75 @@
+import errno
+import os
+from pathlib import Path
+
+import staging
+from conftest import STUBS_DIR
+from msa_cache import MSACache
+from msa_scheduler import run_msa_job
+from staging import stage_file, stage_tree
+from tgt_to_chai import prepare_complex, process_fasta_files1
+
+
+def test_staged_file_survives_in_place_rewrite(tmp_path):
+    src = tmp_path / "split" / "A.a3m"
+    src.parent.mkdir()
+    src.write_text(">A\nMKT\n")
+    method = stage_file(src, tmp_path / "final" / "A.a3m")
+    assert method in ("reflink", "copy")
+
+    # A rerun of the search writes the same name again, in place
+    with open(src, "r+") as f:
+        f.write(">A\nGSH\n")
+    assert (tmp_path / "final" / "A.a3m").read_text() == ">A\nMKT\n"
+
+
+def test_stage_tree_flattens_and_skips_hidden(tmp_path):
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    (tmp_path / "src" / "sub" / "A.a3m").write_text("a")
+    (tmp_path / "src" / ".stage-tmp.a3m").write_text("partial")
+    (tmp_path / "src" / "A.fasta").write_text(">A\n")
+    staged = stage_tree(tmp_path / "src", tmp_path / "dest", ".a3m")
+    assert list(staged) == [str(tmp_path / "dest" / "A.a3m")]
+
+
+def test_cache_entry_independent_of_rewritten_a3m(tmp_path):
+    cache = MSACache(str(tmp_path / "cache"))
+    a3m = tmp_path / "A.a3m"
+    a3m.write_text(">A\nMKT\n>hit\nMKS\n")
+    pqt = tmp_path / "A.aligned.pqt"
+    pqt.write_bytes(b"pqt")
+    cache.put("MKT", "jackhmm", "uniref90", 3, str(pqt), a3m_path=str(a3m))
+
+    # The chain's sequence changed under the same name, and the search rewrote A.a3m
+    with open(a3m, "r+") as f:
+        f.write(">A\nGSH\n>hit\nGSS\n")
+    staged = cache.fetch("MKT", "jackhmm", "uniref90", 3, str(tmp_path / "out"), a3m=True)
+    a3m_paths = [path for path in staged if path.endswith(".a3m")]
+    assert len(a3m_paths) == 1
+    with open(a3m_paths[0]) as f:
+        assert f.read() == ">A\nMKT\n>hit\nMKS\n"
+
+
+def test_a3ms_are_hardlinked_and_survive_a_new_search(tmp_path, monkeypatch):
+    def no_reflink(src, dest):
+        raise OSError(errno.EOPNOTSUPP, "no reflink")
+
+    # As on ext4 or NFS
+    monkeypatch.setitem(staging._STAGERS, "reflink", no_reflink)
+    monkeypatch.setenv("STUB_MSA_DEPTH", "3")
+    (tmp_path / "c.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n")
+    script_path = os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh")
+    final_output_dir, = process_fasta_files1(str(tmp_path), total_cpus=1, script_path=script_path)
+    prepare_complex(final_output_dir)
+
+    searched = tmp_path / "c_out" / "A.a3m"
+    staged = Path(final_output_dir) / "A.a3m"
+    assert os.path.samefile(searched, staged)
+    assert os.path.samefile(staged, Path(final_output_dir) / "A" / "uniref90.a3m")
+
+    # A new search of the chain writes a new file; both staged names keep the first alignment
+    monkeypatch.setenv("STUB_MSA_DEPTH", "6")
+    job = {"name": "A", "fasta": str(tmp_path / "c_out" / "A.fasta"), "output_dir": str(tmp_path / "A")}
+    assert run_msa_job(job, 1, script_path)["status"] == "ok"
+    assert searched.read_text().count(">") == 6
+    assert staged.read_text().count(">") == (Path(final_output_dir) / "A" / "uniref90.a3m").read_text().count(">") == 3
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+import supervisor
+from supervisor import Supervisor, run_tool, supervise
+
+
+def _alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _wait_dead(pid, seconds=5.0):
+    # The orphaned grandchild is reaped by init, which may take a moment
+    deadline = time.monotonic() + seconds
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _alive(pid)
+
+
+@pytest.mark.parametrize("ignore_term", [False, True])
+def test_timeout_ends_the_whole_process_group(tmp_path, monkeypatch, ignore_term):
+    monkeypatch.setattr(supervisor, "TERMINATE_GRACE", 0.3)
+    # The script starts a grandchild, as A3M_TGT_Gen.sh starts jackhmmer; with TERM ignored only SIGKILL ends them
+    script = ("trap '' TERM; " if ignore_term else "") + "sleep 30 & echo $! > sleep.pid; wait"
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired) as error:
+        run_tool(["sh", "-c", script], timeout=0.3, cwd=tmp_path)
+    elapsed = time.monotonic() - start
+
+    stats = error.value.stats
+    assert stats["timed_out"] and stats["attempts"] == 1
+    assert stats["returncode"] == (-9 if ignore_term else -15)
+    assert 0.3 <= elapsed < (0.6 + 2 if ignore_term else 0.3 + 2)
+    assert _wait_dead(int((tmp_path / "sleep.pid").read_text()))
+
+
+def test_failed_attempts_are_retried_with_backoff(tmp_path):
+    # Fails twice, then succeeds
+    script = "echo attempt >> tries; [ $(wc -l < tries) -ge 3 ] || exit 3"
+    start = time.monotonic()
+    stats = run_tool(["sh", "-c", script], retries=2, backoff=0.2, cwd=tmp_path)
+    assert time.monotonic() - start >= 0.2 + 0.4
+    assert (stats["returncode"], stats["attempts"], stats["timed_out"]) == (0, 3, False)
+
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        run_tool(["false"], retries=1, backoff=0.05)
+    assert error.value.returncode == 1
+    assert (error.value.stats["returncode"], error.value.stats["attempts"]) == (1, 2)
+    assert "max_rss_kb" in error.value.stats
+
+
+def test_attempts_append_to_the_log(tmp_path):
+    log_path = tmp_path / "logs" / "job.log"
+    (tmp_path / "tries").write_text("")
+    script = "echo out-$(wc -l < tries); echo err >&2; echo x >> tries; [ $(wc -l < tries) -ge 2 ] || exit 1"
+    run_tool(["sh", "-c", script], log_path=log_path, retries=1, backoff=0.0, cwd=tmp_path)
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        run_tool(["sh", "-c", "echo last words; exit 2"], log_path=log_path)
+
+    log = log_path.read_text()
+    assert [line.split(": ")[0].split(" attempt ")[1] for line in log.splitlines() if line.startswith("###")] == \
+        ["1/2", "2/2", "1/1"]
+    assert log.index("out-0") < log.index("out-1") < log.index("last words")
+    assert log.splitlines().count("err") == 2
+    assert error.value.stats["log_path"] == str(log_path)
+    assert error.value.output.endswith("last words\n")
+
+
+def test_commands_that_cannot_start_are_not_retried(tmp_path):
+    start = time.monotonic()
+    with pytest.raises(FileNotFoundError):
+        run_tool([str(tmp_path / "missing")], retries=3, backoff=10.0)
+    assert time.monotonic() - start < 5
+
+
+def test_supervisor_applies_policies_limits_and_log_dir(tmp_path):
+    with Supervisor(policies={"msa": {"timeout": 0.2, "retries": 0}}, log_dir=tmp_path, limits={"slow": 1},
+                    env={"PATH": os.environ["PATH"], "GREETING": "hi"}) as runner:
+        stats = runner.run(["sh", "-c", "echo $GREETING"], tool="msa", name="c/A")
+        assert stats["attempts"] == 1
+        assert "hi" in (tmp_path / "msa.c_A.log").read_text()
+        with pytest.raises(subprocess.TimeoutExpired):
+            runner.run(["sleep", "5"], tool="msa")
+
+        # At most one "slow" command runs at a time
+        start = time.monotonic()
+        futures = [runner.submit(["sleep", "0.3"], tool="slow", name=str(i)) for i in range(2)]
+        assert [future.result()["returncode"] for future in futures] == [0, 0]
+        assert time.monotonic() - start >= 0.6
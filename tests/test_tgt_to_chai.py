@@ -0,0 +1,30 @@
+import os
+from functools import partial
+
+from conftest import STUBS_DIR
+from inference_worker import stub_worker
+from tgt_to_chai import process_fasta_files1, process_fasta_files2
+
+
+def test_prediction_replaces_outputs_of_an_earlier_attempt(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "5")
+    (tmp_path / "c.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n")
+    final_output_dir, = process_fasta_files1(str(tmp_path), total_cpus=1,
+                                             script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
+    predictions = tmp_path / "c_final_output" / "c_output" / "predictions"
+    predictions.mkdir(parents=True)
+    (predictions / "pred.model_idx_4.cif").write_text("data_stale\n")
+
+    result = process_fasta_files2(final_output_dir, worker=partial(stub_worker, num_models=2)())
+    assert result["status"] == "ok"
+    assert sorted(p.name for p in predictions.iterdir()) == ["pred.model_idx_0.cif", "pred.model_idx_1.cif"]
+
+
+def test_run_tgt_gathers_into_tgt_output_by_default(tmp_path, monkeypatch):
+    import run_TGT
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "batch").mkdir()
+    (tmp_path / "batch" / "c.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n")
+    run_TGT.process_fasta_files("batch", total_cpus=1, script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
+    assert sorted(os.listdir(tmp_path / "TGT_output")) == ["A.a3m", "c.fasta"]
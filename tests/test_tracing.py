@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import tracing
+from conftest import STUBS_DIR
+from manifest import Manifest
+from pipeline import run_pipeline
+from tracing import record_wait, run_command, span, start_tracing, stop_tracing
+
+
+def test_spans_are_recorded_only_while_tracing(tmp_path):
+    with span("before", "stage") as fields:
+        fields["ignored"] = True
+    tracer = start_tracing(str(tmp_path / "trace.jsonl"), str(tmp_path / "trace.json"))
+    try:
+        with span("a", "msa", cpus=2) as fields:
+            fields["status"] = "ok"
+        with pytest.raises(KeyError):
+            with span("b", "prepare"):
+                raise KeyError("b")
+        record_wait("c", tracing.time.perf_counter() - 0.5)
+    finally:
+        assert stop_tracing() is tracer
+    with span("after", "stage"):
+        pass
+
+    assert [(r["name"], r["category"]) for r in tracer.spans] == [("a", "msa"), ("b", "prepare"),
+                                                                 ("c", "queue_wait")]
+    assert tracer.spans[0]["cpus"] == 2 and tracer.spans[0]["status"] == "ok"
+    assert tracer.spans[2]["wall_seconds"] >= 0.5
+    lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["a", "b", "c"]
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [e["name"] for e in events if e["ph"] == "X"] == ["a", "b", "c"]
+    assert [e["args"]["name"] for e in events if e["ph"] == "M"] == ["MainThread"]
+    summary = tracer.summary()
+    assert summary["categories"]["msa"]["count"] == 1
+    assert "c" not in [record["name"] for record in summary["slowest"]]
+
+
+def test_run_command_reports_child_usage():
+    code = "x = bytearray(64 * 1024 * 1024)"
+    returncode, stats = run_command([sys.executable, "-c", code])
+    assert returncode == 0
+    assert stats["max_rss_kb"] > 64 * 1024
+    assert stats["child_cpu_seconds"] >= 0
+
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        run_command([sys.executable, "-c", "raise SystemExit(3)"])
+    assert error.value.returncode == 3 and "max_rss_kb" in error.value.stats
+
+
+class BrokenPrefilter:
+    """
+    Prefilter that fails in a way no stage expects.
+    """
+
+    def label(self, database):
+        return f"{database}@broken"
+
+    def write_subset(self, sequence, output_fasta):
+        raise KeyError("index")
+
+
+def test_failed_pipeline_still_writes_its_trace(tmp_path):
+    (tmp_path / "c.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n")
+    with pytest.raises(KeyError):
+        run_pipeline(str(tmp_path), cpu_num=1, total_cpus=1, script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"),
+                     manifest=Manifest(str(tmp_path / "manifest.json")), trace_dir=str(tmp_path),
+                     prefilter=BrokenPrefilter())
+    assert tracing._active is None
+    events = json.loads((tmp_path / "pipeline_trace.json").read_text())["traceEvents"]
+    assert any(e["name"] == "A" and e.get("cat") == "msa" for e in events)
@@ -0,0 +1,63 @@
+import os
+
+import pyarrow.parquet as pq
+import pytest
+
+from a3m_to_pqt import a3m_to_pqt, pqt_name
+from conftest import STUBS_DIR
+from variants import apply_mutations, derive_variant_pqt, parse_mutations, run_variant_screen
+
+PARENT = [("heavy", "MKTAYIAKQR"), ("light", "GSHMLEDPVD")]
+
+
+def test_parse_mutations():
+    assert parse_mutations("A:Y32F, B:N93A") == [("A", "Y", 32, "F"), ("B", "N", 93, "A")]
+    for bad in ("Y32F", "A:Y32", "A:y32F", "A:Y32F;B:N93A"):
+        with pytest.raises(ValueError, match="Invalid mutation"):
+            parse_mutations(bad)
+
+
+def test_apply_mutations():
+    assert apply_mutations(PARENT, [("A", "K", 2, "R"), ("B", "D", 10, "E")]) == [
+        ("heavy", "MRTAYIAKQR"), ("light", "GSHMLEDPVE")]
+    with pytest.raises(ValueError, match="does not match the parent sequence of heavy"):
+        apply_mutations(PARENT, [("A", "Y", 2, "R")])
+    with pytest.raises(ValueError, match="does not match"):
+        apply_mutations(PARENT, [("A", "M", 11, "R")])
+    with pytest.raises(ValueError, match="Chain C does not exist"):
+        apply_mutations(PARENT, [("C", "M", 1, "R")])
+
+
+def test_derive_variant_pqt(tmp_path):
+    (tmp_path / "a3m").mkdir()
+    (tmp_path / "a3m" / "uniref90.a3m").write_text(">q\nMKTAYIAKQR\n>h1\nMKTAYLAKQR\n>h2\n-KTAYIAkKQR\n")
+    parent_pqt = a3m_to_pqt(tmp_path / "a3m")
+
+    variant_pqt = derive_variant_pqt(parent_pqt, "MRTAYIAKQR", tmp_path)
+
+    assert variant_pqt.name == pqt_name("MRTAYIAKQR")
+    parent, variant = pq.read_table(parent_pqt), pq.read_table(variant_pqt)
+    assert variant.schema.equals(parent.schema)
+    assert variant.column("sequence").to_pylist() == ["MRTAYIAKQR"] + parent.column("sequence").to_pylist()[1:]
+    for name in ("source_database", "pairing_key", "comment"):
+        assert variant.column(name).equals(parent.column(name))
+    with pytest.raises(ValueError, match="Only substitutions"):
+        derive_variant_pqt(parent_pqt, "MKTAYIAKQRR", tmp_path)
+
+
+def test_parent_msa_failure_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MSA_DEPTH", "5")
+    monkeypatch.setenv("STUB_MSA_FAIL", "light.fasta")
+    (tmp_path / "parent.fasta").write_text("".join(f">{name}\n{sequence}\n" for name, sequence in PARENT))
+    (tmp_path / "mutations.txt").write_text("A:K2R\n")
+    with pytest.raises(RuntimeError, match="failed for chain\\(s\\) light"):
+        run_variant_screen(tmp_path / "parent.fasta", tmp_path / "mutations.txt", tmp_path / "work", cpu_num=1,
+                           total_cpus=2, script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
+
+
+def test_unsplittable_parent_is_reported(tmp_path):
+    (tmp_path / "parent.fasta").write_text(">A\nMKTAYIAKQR\n>A\nGSHMLEDPVD\n")
+    (tmp_path / "mutations.txt").write_text("A:K2R\n")
+    with pytest.raises(ValueError, match="could not be split"):
+        run_variant_screen(tmp_path / "parent.fasta", tmp_path / "mutations.txt", tmp_path / "work",
+                           script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
@@ -0,0 +1,80 @@
+import os
+
+from conftest import STUBS_DIR
+from kmer_index import KmerIndex, build_kmer_index
+from work_queue import WorkQueue, cpu_worker, run_local, submit_batch
+
+
+def test_stalled_worker_cannot_touch_new_claim(tmp_path):
+    stalled = WorkQueue(tmp_path, lease_seconds=60)
+    stalled.put("msa", "c1__A", {"name": "A"})
+    old_lease = stalled.claim("msa")
+    # The stalled worker's heartbeat stopped long enough for the lease to expire
+    os.utime(old_lease.path, (0, 0))
+
+    other = WorkQueue(tmp_path, lease_seconds=60)
+    new_lease = other.claim("msa")
+    assert new_lease is not None and new_lease.job_id == "c1__A"
+    assert new_lease.path != old_lease.path
+
+    assert old_lease.complete({"status": "ok"}) is False
+    assert old_lease.fail("late") is None
+    assert new_lease.path.exists()
+    assert other.jobs("msa", "claimed") == ["c1__A"]
+    assert new_lease.complete({"status": "ok"}) is True
+    assert other.counts("msa") == {"pending": 0, "claimed": 0, "done": 1, "failed": 0}
+
+
+def test_put_is_idempotent_while_claimed(tmp_path):
+    work_queue = WorkQueue(tmp_path)
+    assert work_queue.put("prepare", "c1", {})
+    lease = work_queue.claim("prepare")
+    assert not work_queue.put("prepare", "c1", {})
+    lease.complete()
+    assert not work_queue.put("prepare", "c1", {})
+
+
+def test_run_local_drains_batch(tmp_path, monkeypatch):
+    # Spawned workers inherit sys.path, and with it the stand-in for chai_lab
+    monkeypatch.syspath_prepend(STUBS_DIR)
+    monkeypatch.setenv("STUB_MSA_DEPTH", "20")
+    batch = tmp_path / "batch"
+    batch.mkdir()
+    (batch / "c1.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n>B\nGSHMLEDPVDAFQGTLQLIRQA\n")
+    (batch / "c2.fasta").write_text(">A\nMSEQNNTEMTFQIQRIYTKDIS\n")
+
+    queue_dir = tmp_path / "queue"
+    submit_batch(str(queue_dir), str(batch), script_path=os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh"))
+    counts = run_local(str(queue_dir), cpu_workers=2, inference_workers=1, cpus=1, poll_interval=0.1)
+
+    assert counts["msa"] == {"pending": 0, "claimed": 0, "done": 3, "failed": 0}
+    assert counts["prepare"] == {"pending": 0, "claimed": 0, "done": 2, "failed": 0}
+    assert counts["inference"] == {"pending": 0, "claimed": 0, "done": 2, "failed": 0}
+    for name in ("c1", "c2"):
+        predictions = batch / f"{name}_final_output" / f"{name}_output" / "predictions"
+        assert sorted(p.name for p in predictions.glob("*.cif"))[0] == "pred.model_idx_0.cif"
+
+
+def test_cpu_worker_searches_the_prefiltered_database(tmp_path):
+    database = tmp_path / "db.fasta"
+    database.write_text(">hit\nMKTAYIAKQRQISFVKSHFSRQ\n>decoy\nWWWWWWWWWWWWWWWWWW\n")
+    build_kmer_index(database, tmp_path / "index")
+    prefilter = KmerIndex(str(tmp_path / "index"), min_shared=2)
+    batch = tmp_path / "batch"
+    batch.mkdir()
+    (batch / "c.fasta").write_text(">A\nMKTAYIAKQRQISFVKSHFSRQ\n")
+
+    script_path = os.path.join(STUBS_DIR, "A3M_TGT_Gen.sh")
+    cache_dir = str(tmp_path / "cache")
+    work_queue = submit_batch(str(tmp_path / "queue"), str(batch), script_path=script_path, cache_dir=cache_dir,
+                              prefilter=prefilter)
+    assert work_queue.config()["prefilter"] == prefilter.settings()
+    cpu_worker(str(tmp_path / "queue"), cpus=1, poll_interval=0.1)
+
+    candidates, = batch.glob("**/candidates.fasta")
+    assert candidates.read_text() == ">hit\nMKTAYIAKQRQISFVKSHFSRQ\n"
+    # The subset search was cached under the prefilter's label only
+    again = submit_batch(str(tmp_path / "again"), str(batch), script_path=script_path, cache_dir=cache_dir,
+                         prefilter=prefilter)
+    full = submit_batch(str(tmp_path / "full"), str(batch), script_path=script_path, cache_dir=cache_dir)
+    assert again.counts("msa")["pending"] == 0 and full.counts("msa")["pending"] == 1
@@ -1,266 +1,351 @@
 import os
-import subprocess
-from pathlib import Path
 import shutil
+import sys
+from pathlib import Path
 
+from a3m_to_pqt import convert_a3m_dirs
+from fasta_index import FastaIndex, iter_fasta_records, sanitize_name, split_fasta
+from inference_worker import InferenceWorker
+from msa_cache import read_a3m_query
+from msa_filter import filter_a3m
+from msa_scheduler import TGT_SCRIPT, run_msa_jobs, print_msa_report
+from msa_stats import LowQualityMSAError, gate_msa_directory, write_msa_stats
+from planner import complex_paths
+from staging import LINK_METHODS, stage_file, stage_tree, summarize
+from tracing import span
 
-def sanitize_name(name):
-    # Function to sanitize the name (you can adjust this depending on your needs)
-    return name.replace(" ", "_").replace("/", "_")
 
-def split_fasta(fasta_path, output_dir):
+def read_fasta_records(fasta_path):
     """
-    Split a FASTA file into individual sequences and save them as separate files.
-    Each sequence file name is sanitized before saving.
+    Read a multi-record FASTA file into a list of (name, sequence) tuples.
     """
-    individual_fasta_files = []
-    with open(fasta_path, 'r') as f:
-        lines = f.readlines()
-        seq_name = None
-        seq_data = []
-        
-        for line in lines:
-            if line.startswith('>'):
-                if seq_name:  # If there's a sequence accumulated, write it out
-                    sanitized_name = sanitize_name(seq_name)  # Sanitize the sequence name
-                    seq_file_path = os.path.join(output_dir, f"{sanitized_name}.fasta")
-                    with open(seq_file_path, 'w') as seq_file:
-                        seq_file.write(f">{seq_name}\n")
-                        seq_file.writelines(seq_data)
-                    individual_fasta_files.append(seq_file_path)
-                seq_name = line.strip().lstrip('>')
-                seq_data = []
-            else:
-                seq_data.append(line)
-        if seq_name:  # Write the last sequence
-            sanitized_name = sanitize_name(seq_name)  # Sanitize the sequence name
-            seq_file_path = os.path.join(output_dir, f"{sanitized_name}.fasta")
-            with open(seq_file_path, 'w') as seq_file:
-                seq_file.write(f">{seq_name}\n")
-                seq_file.writelines(seq_data)
-            individual_fasta_files.append(seq_file_path)
-
-    return individual_fasta_files
-
-
-def copy_files(src_dir, dest_dir, file_extension):
-    # Function to copy all files with the given extension from src_dir to dest_dir recursively
-    for root, dirs, files in os.walk(src_dir):
-        for file in files:
-            if file.endswith(file_extension):
-                src_file = os.path.join(root, file)
-                shutil.copy(src_file, dest_dir)
-                print(f"Copied {src_file} to {dest_dir}")
-
-def process_fasta_files1(input_fasta_dir, cpu_num=12, package="jackhmm", database="uniref90", iterations=3):
+    return list(iter_fasta_records(fasta_path))
+
+
+def plan_fasta_files(input_fasta_dir, package="jackhmm", database="uniref90", iterations=3, cache=None, msa_filter=None):
     """
-    Process each FASTA file in the given directory by running the A3M_TGT_Gen.sh script.
-    
+    Split each FASTA file in the given directory and list the MSA jobs of its chains.
+
+    A FASTA file whose record names repeat or collide once sanitized is reported and left out,
+    without stopping the rest of the batch.
+
     :param input_fasta_dir: Directory containing the FASTA files to process
-    :param cpu_num: Number of CPUs to use (default: 12)
     :param package: The package to use (default: "jackhmm")
     :param database: The database to use (default: "uniref90")
     :param iterations: The number of iterations to run (default: 3)
-    :param final_output_dir: Directory where the copied .a3m files and input .fasta files will be stored
+    :param cache: Optional MSACache; chains found in it get their .pqt staged and no MSA job
+    :param msa_filter: filter_a3m() keyword arguments the cached MSAs must have been reduced with
+    :return: List of complex dicts with "name", "fasta_path", "split_dir", "final_output_dir" and "msa_jobs"
     """
+    complexes = []
 
-    directory_list=[]
-    # Ensure the input directory exists
-    if not os.path.isdir(input_fasta_dir):
-        print(f"Error: The directory {input_fasta_dir} does not exist.")
-        return
-    
     # Process each FASTA file in the input directory
     for fasta_file in os.listdir(input_fasta_dir):
         if fasta_file.endswith(".fasta"):  # Only process .fasta files
-            fasta_path = os.path.join(input_fasta_dir, fasta_file)
-
-            # Extract the base name of the FASTA file (without extension)
-            base_name = os.path.splitext(fasta_file)[0]
+            # The same layout planner.plan_batch() inspects
+            paths = complex_paths(input_fasta_dir, fasta_file)
+            fasta_path = paths["fasta_path"]
+            base_name = paths["name"]
 
             # Create the final output directory as the basename + '_final_output'
-            final_output_dir = os.path.join(input_fasta_dir, f"{base_name}_final_output")
-            
-            # Ensure the final output directory exists
+            final_output_dir = paths["final_output_dir"]
             os.makedirs(final_output_dir, exist_ok=True)
 
             # Create the output directory based on the FASTA file name
-            output_dir = os.path.join(input_fasta_dir, f"{sanitize_name(base_name)}_out")
+            output_dir = paths["split_dir"]
             os.makedirs(output_dir, exist_ok=True)
 
-            # Split the input FASTA file into individual FASTA files
-            individual_fasta_files = split_fasta(fasta_path, output_dir)
-            
-            # Process each individual FASTA file
-            for individual_fasta in individual_fasta_files:
+            # Split the input FASTA file into individual FASTA files, copied straight from the indexed source
+            try:
+                with span(base_name, "split"):
+                    index = FastaIndex(fasta_path)
+                    individual_fasta_files = split_fasta(fasta_path, output_dir, index)
+            except ValueError as e:
+                # Duplicate or colliding names: only this complex is left out (planner.plan_batch() calls it invalid)
+                print(f"Skipping {base_name}: {e}")
+                continue
+
+            msa_jobs = []
+            # Queue each individual FASTA file for the MSA scheduler
+            for record, individual_fasta in zip(index, individual_fasta_files):
                 # Extract the individual sequence's name from the file name
                 sequence_name = os.path.splitext(os.path.basename(individual_fasta))[0]
 
+                # Reuse the .aligned.pqt of a chain that was already aligned with the same parameters
+                if cache is not None:
+                    if cache.fetch(record.sequence, package, database, iterations, final_output_dir,
+                                   msa_filter=msa_filter):
+                        continue
+
                 # Create a directory for the sequence under the final output directory
                 sequence_output_dir = os.path.join(final_output_dir, sanitize_name(sequence_name))
                 os.makedirs(sequence_output_dir, exist_ok=True)
 
-                # Construct the command to run the A3M_TGT_Gen.sh script
-                command = [
-                    "/home2/TGT_Package/A3M_TGT_Gen.sh",
-                    "-c", str(cpu_num),        # Set CPU cores to 12
-                    "-i", individual_fasta,    # Input individual FASTA file
-                    "-o", sequence_output_dir, # Output directory
-                    "-h", package,             # Package (e.g., jackhmm)
-                    "-d", database,            # Database (e.g., uniref90)
-                    "-n", str(iterations)      # Number of iterations (default: 3)
-                ]
-                # Print the command for debugging
-                print("Running command: {}".format(" ".join(command)))            
-
-                # Run the shell script
-                try:
-                    subprocess.run(command, check=True)
-                    print(f"Successfully processed {individual_fasta} and saved results to {sequence_output_dir}.")
-                except subprocess.CalledProcessError as e:
-                    print(f"Error processing {individual_fasta}: {e}")
-            
-            # After processing, copy .a3m files and the original .fasta file to the final output directory
-            copy_files(output_dir, final_output_dir, ".a3m")
-            shutil.copy(fasta_path, final_output_dir)  # Copy the original .fasta file to the final output directory
-            directory_list.append(final_output_dir)
-    return directory_list
-
-
-
-def process_fasta_files2(input_dir):
+                msa_jobs.append({
+                    "name": sequence_name,
+                    "complex": base_name,
+                    "fasta": individual_fasta,
+                    "output_dir": sequence_output_dir,
+                    "length": record.length,
+                })
+            complexes.append({
+                "name": base_name,
+                "fasta_path": fasta_path,
+                "split_dir": output_dir,
+                "final_output_dir": final_output_dir,
+                "msa_jobs": msa_jobs,
+            })
+    return complexes
+
+
+def finalize_complex(complex_info):
+    """
+    Collect the .a3m files and the original .fasta file of a complex into its final output directory.
+
+    The files stay where they are. The A3Ms are hardlinked where possible: a later search unlinks its old
+    A3M before writing a new one (see msa_scheduler.run_msa_job()), so it never changes the staged file.
+    """
+    final_output_dir = complex_info["final_output_dir"]
+    with span(complex_info["name"], "stage"):
+        staged = stage_tree(complex_info["split_dir"], final_output_dir, ".a3m", LINK_METHODS)
+        fasta_path = complex_info["fasta_path"]
+        staged[os.path.join(final_output_dir, os.path.basename(fasta_path))] = stage_file(
+            fasta_path, os.path.join(final_output_dir, os.path.basename(fasta_path)))
+    print(f"Staged {len(staged)} files into {final_output_dir} ({summarize(staged)})")
+    return final_output_dir
+
+
+def process_fasta_files1(input_fasta_dir, cpu_num=8, package="jackhmm", database="uniref90", iterations=3,
+                         total_cpus=None, script_path=TGT_SCRIPT, cache=None, msa_filter=None, prefilter=None,
+                         supervisor=None):
+    """
+    Process each FASTA file in the given directory by running the A3M_TGT_Gen.sh script.
+    
+    :param input_fasta_dir: Directory containing the FASTA files to process
+    :param cpu_num: Maximum number of CPUs given to a single chain (default: 8)
+    :param package: The package to use (default: "jackhmm")
+    :param database: The database to use (default: "uniref90")
+    :param iterations: The number of iterations to run (default: 3)
+    :param total_cpus: Core budget shared by all concurrently running chains (default: all cores)
+    :param script_path: Path of the A3M_TGT_Gen.sh script
+    :param cache: Optional MSACache; chains found in it are not searched again
+    :param msa_filter: filter_a3m() keyword arguments the cached MSAs must have been reduced with
+    :param prefilter: Optional kmer_index.KmerIndex over the database; each chain is then searched against its
+                      candidate subset only, and cached under prefilter.label(database), which is also the
+                      database to pass to process_fasta_files2
+    :param supervisor: Optional supervisor.Supervisor that runs A3M_TGT_Gen.sh with a timeout and retries,
+                       logging each chain to <output_dir>/msa.log
+    """
+    # Ensure the input directory exists
+    if not os.path.isdir(input_fasta_dir):
+        print(f"Error: The directory {input_fasta_dir} does not exist.")
+        return
+
+    # MSAs searched against a candidate subset must not be mistaken for full searches in the cache
+    cache_database = prefilter.label(database) if prefilter is not None else database
+    complexes = plan_fasta_files(input_fasta_dir, package=package, database=cache_database, iterations=iterations,
+                                 cache=cache, msa_filter=msa_filter)
+    msa_jobs = [job for complex_info in complexes for job in complex_info["msa_jobs"]]
+
+    # Run the MSA generation for every chain of every FASTA file concurrently
+    results = run_msa_jobs(msa_jobs, total_cpus=total_cpus, max_threads=cpu_num, script_path=script_path,
+                           package=package, database=database, iterations=iterations, prefilter=prefilter,
+                           supervisor=supervisor)
+    print_msa_report(results)
+
+    # After processing, stage the .a3m files and the original .fasta file in the final output directory
+    return [finalize_complex(complex_info) for complex_info in complexes]
+
+
+def gather_outputs(directory_list, gather_dir):
+    """
+    Stage the A3Ms and FASTA files of several <name>_final_output directories into one directory.
+
+    This is the flat layout the old run_TGT.py produced; the per-complex directories stay as they are.
+    """
+    os.makedirs(gather_dir, exist_ok=True)
+    staged = {}
+    for directory in directory_list:
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith((".a3m", ".fasta")):
+                destination = os.path.join(gather_dir, file_name)
+                staged[destination] = stage_file(os.path.join(directory, file_name), destination)
+    print(f"Staged {len(staged)} files into {gather_dir} ({summarize(staged)})")
+    return staged
+
+
+def prepare_complex(input_dir, cache=None, package="jackhmm", database="uniref90", iterations=3, msa_filter=None,
+                    msa_gate=None, msa_stats=False):
+    """
+    Convert the A3Ms of one complex to .aligned.pqt files and build its inference job.
+
+    :param input_dir: A <name>_final_output directory produced by process_fasta_files1
+    :param cache: Optional MSACache that newly converted MSAs are stored in
+    :param package: The package the MSAs were generated with, used for the cache key
+    :param database: The database the MSAs were generated against, used for the cache key
+    :param iterations: The number of search iterations, used for the cache key
+    :param msa_filter: Optional filter_a3m() keyword arguments (max_identity, min_coverage, max_depth)
+                       used to reduce each A3M before conversion
+    :param msa_gate: Optional msa_stats.route_msa() keyword arguments (min_neff, min_coverage, skip_below_neff);
+                     chains with a poor MSA are then predicted without it, or the complex is skipped
+    :param msa_stats: Write the depth, coverage and Neff of every chain (<pqt>.stats.json) even without a gate;
+                      Neff compares all pairs of rows, so it is only computed when asked for or gated on
+    :return: Inference job dict for InferenceWorker
+    :raises msa_stats.LowQualityMSAError: If the gate skips the complex
+    """
     # Ensure input_dir is a Path object
     input_dir = Path(input_dir)
 
-    # Step 1: Find the fasta file and a3m files in the input directory
+    # Step 1: Find the fasta file, a3m files and already converted (cached) pqt files in the input directory
     fasta_file = None
     a3m_files = []
+    pqt_files = []
 
     for file in input_dir.iterdir():
         if file.suffix == ".fasta":
             fasta_file = file
         elif file.suffix == ".a3m":
             a3m_files.append(file)
+        elif file.suffix == ".pqt":
+            pqt_files.append(file)
 
     if not fasta_file:
         raise FileNotFoundError("No .fasta file found in the input directory.")
     
-    if not a3m_files:
-        raise FileNotFoundError("No .a3m files found in the input directory.")
+    if not a3m_files and not pqt_files and not any(input_dir.glob("*/uniref90.a3m")):
+        raise FileNotFoundError("No .a3m or .pqt files found in the input directory.")
 
-    # Step 2: Run chai-lab a3m-to-pqt for each a3m file
-    try:
+    # Create an output directory based on the fasta file name (without the extension)
+    output_dir = fasta_file.parent / f"{fasta_file.stem}_output"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Inputs are staged rather than moved, so input_dir stays intact and a rerun finds the same files
+    with span(fasta_file.stem, "stage"):
+        # Cached pqt files need no conversion
+        for pqt_file in pqt_files:
+            stage_file(pqt_file, output_dir / pqt_file.name, LINK_METHODS)
+
+        # Step 2: Give each .a3m file its own directory, named uniref90.a3m as chai expects
         print(f"Processing {a3m_files}...")
-        
+        a3m_dirs = []
         for a3m_file in a3m_files:
-            # Step 3: Create a new directory for each .a3m file
             a3m_dir = input_dir / a3m_file.stem
-            a3m_dir.mkdir(parents=True, exist_ok=True)
-
-            # Step 4: Move the a3m file into its respective directory and rename it to uniref90.a3m
-            new_a3m_path = a3m_dir / "uniref90.a3m"
-            shutil.move(a3m_file, new_a3m_path)
-
-            # Step 5: Run chai-lab a3m-to-pqt for the renamed a3m file
-            try:
-                print(f"Running chai-lab a3m-to-pqt on {new_a3m_path}...")
-                subprocess.run(["chai-lab", "a3m-to-pqt", str(a3m_dir)], check=True)
-            except subprocess.CalledProcessError as e:
-                raise RuntimeError(f"Error processing {new_a3m_path}: {str(e)}")
+            # finalize_complex() only ever replaces a3m_file by a rename, so a second name of it is safe
+            stage_file(a3m_file, a3m_dir / "uniref90.a3m", LINK_METHODS)
+            a3m_dirs.append(a3m_dir)
+    # A3Ms moved into place by runs before inputs were staged
+    for a3m_path in sorted(input_dir.glob("*/uniref90.a3m")):
+        if a3m_path.parent not in a3m_dirs:
+            a3m_dirs.append(a3m_path.parent)
+
+    # Optionally drop redundant rows first; the reduced copy goes to <a3m_dir>/filtered and the original stays put
+    if msa_filter:
+        for i, a3m_dir in enumerate(a3m_dirs):
+            filter_a3m(a3m_dir / "uniref90.a3m", a3m_dir / "filtered" / "uniref90.a3m", **msa_filter)
+            a3m_dirs[i] = a3m_dir / "filtered"
+
+    # Step 3: Convert all a3m directories in-process, writing the .pqt files straight to the output directory
+    try:
+        pqt_paths = convert_a3m_dirs(a3m_dirs, output_dir)
+    except (OSError, ValueError) as e:
+        raise RuntimeError(f"Error processing a3m files: {str(e)}")
 
-            # Step 6: Create an output directory based on the fasta file name (without the extension)
-            output_dir = fasta_file.parent / f"{fasta_file.stem}_output"
-            output_dir.mkdir(parents=True, exist_ok=True)  # Create the output directory
+    for a3m_dir, pqt_path in zip(a3m_dirs, pqt_paths):
+        print(f"Converted {a3m_dir / 'uniref90.a3m'} to {pqt_path}")
+        # Depth, coverage and Neff go next to the pqt as <pqt>.stats.json, from the A3M while it is at hand
+        if msa_gate is not None or msa_stats:
+            write_msa_stats(pqt_path, a3m_dir / "uniref90.a3m")
+        # Keep a copy in the cache for later runs
+        if cache is not None:
+            a3m_path = a3m_dir / "uniref90.a3m"
+            with span(pqt_path.name, "cache_put"):
+                cache.put(read_a3m_query(a3m_path), package, database, iterations, pqt_path, a3m_path=a3m_path,
+                          msa_filter=msa_filter)
+
+    # Step 4: Keep poor MSAs away from the GPU
+    routes = {}
+    if msa_gate is not None:
+        routes = {name: route for name, (route, _) in gate_msa_directory(output_dir, **msa_gate).items()}
+
+    # Step 5: Write the FASTA with chai-style headers next to the .pqt files
+    chai_fasta_path = output_dir / f"{fasta_file.stem}.chai.fasta"
+    chai_fasta_path.write_text(to_chai_fasta(fasta_file.read_text()))
+
+    job = {
+        "name": fasta_file.stem,
+        "fasta_file": str(chai_fasta_path),
+        "msa_directory": str(output_dir),
+        "output_dir": str(output_dir / "predictions"),
+    }
+    if routes:
+        job["msa_routes"] = routes
+    return job
+
+
+def to_chai_fasta(fasta_text):
+    """
+    Rewrite FASTA headers into the ">protein|name=..." form chai expects.
+    """
+    modified_fasta = []
+    for line in fasta_text.splitlines():
+        if line.startswith(">"):
+            protein_name = line[1:]  # Remove '>' symbol to get the protein name
+            modified_fasta.append(f">protein|name={protein_name}")
+        else:
+            modified_fasta.append(line)
 
-            # Step 7: Move the .pqt files to the output directory
-            pqt_files = a3m_dir.glob("*.pqt")
-            for pqt_file in pqt_files:
-                shutil.move(pqt_file, output_dir / pqt_file.name)
+    # Join the modified lines back into a single string
+    return "\n".join(modified_fasta)
 
-            print(f"Moved .pqt files to {output_dir}")
 
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Error processing a3m files: {str(e)}")
-    # Step 4: Modify the FASTA headers and write to the predict_with_msas.py script
+def process_fasta_files2(input_dir, cache=None, package="jackhmm", database="uniref90", iterations=3, worker=None,
+                         msa_filter=None, msa_gate=None, results_store=None, params=None):
+    """
+    Prepare the MSAs of one complex and run chai inference on it.
+
+    :param input_dir: A <name>_final_output directory produced by process_fasta_files1
+    :param cache: Optional MSACache that newly converted MSAs are stored in
+    :param package: The package the MSAs were generated with, used for the cache key
+    :param database: The database the MSAs were generated against, used for the cache key
+    :param iterations: The number of search iterations, used for the cache key
+    :param worker: InferenceWorker to run the prediction on; a one-off worker is started if omitted
+    :param msa_filter: Optional filter_a3m() keyword arguments used to reduce each A3M before conversion
+    :param msa_gate: Optional msa_stats.route_msa() keyword arguments applied before inference
+    :param results_store: Optional ResultsStore the prediction is appended to, in a batch named after input_dir
+    :param params: Optional run_inference keyword arguments for this prediction, e.g. {"device": "cuda:1"}
+    :return: Result dict with "status", "cif_paths" and "aggregate_scores"
+    """
     try:
-        # Read the original FASTA content
-        example_fasta = fasta_file.read_text()
-
-        # Modify headers (all lines starting with '>')
-        modified_fasta = []
-        for line in example_fasta.splitlines():
-            if line.startswith(">"):
-                protein_name = line[1:]  # Remove '>' symbol to get the protein name
-                #modified_fasta.append(f">name={protein_name}")
-                modified_fasta.append(f">protein|name={protein_name}")
-            else:
-                modified_fasta.append(line)
-
-        # Join the modified lines back into a single string
-        modified_fasta_content = "\n".join(modified_fasta)
-
-        # Create the predict_with_msas.py script
-        predict_file_path = output_dir / "predict_with_msas.py"
-        
-        # Escape triple quotes and insert them correctly in the string
-        predict_script = f"""
-import tempfile
-from pathlib import Path
-import numpy as np
-
-from chai_lab.chai1 import run_inference
-
-tmp_dir = Path(tempfile.mkdtemp())
-
-# Prepare input fasta
-example_fasta = '''{modified_fasta_content}'''
-
-fasta_path = tmp_dir / "example.fasta"
-fasta_path.write_text(example_fasta)
-
-# Generate structure
-output_dir = tmp_dir / "outputs"
-candidates = run_inference(
-    fasta_file=fasta_path,
-    output_dir=output_dir,
-    num_trunk_recycles=3,
-    num_diffn_timesteps=200,
-    seed=42,
-    device="cuda:0",
-    use_esm_embeddings=True,
-    msa_directory=Path(__file__).parent,
-    use_msa_server=False,
-)
-cif_paths = candidates.cif_paths
-scores = [rd.aggregate_score for rd in candidates.ranking_data]
-
-# Load pTM, ipTM, pLDDTs and clash scores for sample 2
-scores = np.load(output_dir.joinpath("scores.model_idx_2.npz"))
-"""
-        predict_file_path.write_text(predict_script)
-        
-        # Step 5: Run the predict_with_msas.py script in the activated conda environment
-        subprocess.run(["conda", "activate", "chai"], shell=True)  # Activate chai environment
-        subprocess.run(["python", str(predict_file_path)], check=True)  # Run the script
-        print(f"Prediction completed. Output saved in: {output_dir}")
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        job = prepare_complex(input_dir, cache=cache, package=package, database=database, iterations=iterations,
+                              msa_filter=msa_filter, msa_gate=msa_gate)
+    except LowQualityMSAError as e:
+        print(f"Skipping inference: {e}")
+        return {"status": "skipped", "error": str(e), "cif_paths": [], "aggregate_scores": []}
+    if params:
+        job["params"] = dict(job.get("params", {}), **params)
+
+    # Outputs of an earlier attempt would be mixed with the new ones
+    shutil.rmtree(job["output_dir"], ignore_errors=True)
+    own_worker = worker is None
+    if own_worker:
+        worker = InferenceWorker()
+    try:
+        result = worker.run(job)
     finally:
-        # Ensure any temporary directories or resources are cleaned up (if necessary)
-        pass
-
+        if own_worker:
+            worker.close()
 
+    if result["status"] == "ok":
+        print(f"Prediction completed. Output saved in: {job['output_dir']}")
+        if results_store is not None:
+            results_store.append(job["name"], result, batch=Path(input_dir).resolve().name)
+    else:
+        print(f"An error occurred: {result['error']}")
+    return result
 
 
 if __name__ == "__main__":
-    # Example usage:
-    #final_output_dir="./TGT_output"
-    #process_fasta_files(input_fasta_dir=".", final_output_dir=final_output_dir)
-    directorylist=process_fasta_files1(input_fasta_dir=".")
-
+    # Same as `python cli.py run [input_fasta_dir] --trace-dir .`; see cli.py for the other commands
+    from cli import main
 
-    #input_dir = Path(".")  # Replace this with your input directory
-    #input_dir = final_output_dir  # Replace this with your input directory
-    for dir in directorylist:
-        process_fasta_files2(dir)
+    main(["run", "--trace-dir", "."] + sys.argv[1:])
@@ -0,0 +1,212 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# Tracer that span() records into; None disables tracing
+_active = None
+
+
+def read_proc_io():
+    """
+    Bytes this process has read from and written to storage so far, from /proc/self/io.
+
+    Returns zeros where /proc/self/io is unavailable (non-Linux, restricted containers).
+    """
+    counters = {"read_bytes": 0, "write_bytes": 0}
+    try:
+        with open("/proc/self/io", 'r') as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in counters:
+                    counters[key] = int(value)
+    except OSError:
+        pass
+    return counters
+
+
+class Tracer:
+    """
+    Collects timed spans and writes them as JSONL and as a Chrome trace.
+
+    Each span has its wall and thread CPU time, the bytes read and written by
+    the process while it was open, and any extra fields the instrumented code
+    adds (child peak RSS, queue wait, ...). The JSONL file is appended to as
+    spans end, so it survives a crash; the Chrome trace is written by close()
+    and opens in chrome://tracing or https://ui.perfetto.dev.
+
+    Bytes read/written come from process-wide counters, so spans that overlap
+    in other threads share each other's I/O.
+    """
+
+    def __init__(self, jsonl_path=None, trace_path=None):
+        self.jsonl_path = jsonl_path
+        self.trace_path = trace_path
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        if jsonl_path:
+            open(jsonl_path, 'w').close()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def chrome_trace(self):
+        events = []
+        threads = {}
+        for record in self.spans:
+            threads.setdefault(record["thread"], len(threads) + 1)
+            args = {k: v for k, v in record.items() if k not in ("name", "category", "start", "wall_seconds", "thread")}
+            events.append({
+                "name": record["name"],
+                "cat": record["category"],
+                "ph": "X",
+                "ts": record["start"] * 1e6,
+                "dur": record["wall_seconds"] * 1e6,
+                "pid": os.getpid(),
+                "tid": threads[record["thread"]],
+                "args": args,
+            })
+        for thread, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def close(self):
+        if self.trace_path:
+            with open(self.trace_path, 'w') as f:
+                json.dump(self.chrome_trace(), f)
+
+    def summary(self, top=10):
+        """
+        Totals per category and the slowest individual spans.
+        """
+        categories = {}
+        for record in self.spans:
+            stats = categories.setdefault(record["category"], {"count": 0, "wall_seconds": 0.0, "max_seconds": 0.0,
+                                                               "cpu_seconds": 0.0})
+            stats["count"] += 1
+            stats["wall_seconds"] += record["wall_seconds"]
+            stats["max_seconds"] = max(stats["max_seconds"], record["wall_seconds"])
+            stats["cpu_seconds"] += record["cpu_seconds"] + record.get("child_cpu_seconds", 0.0)
+        slowest = sorted((r for r in self.spans if r["category"] != "queue_wait"),
+                         key=lambda r: r["wall_seconds"], reverse=True)[:top]
+        return {"categories": categories, "slowest": slowest}
+
+    def print_summary(self, top=10):
+        summary = self.summary(top)
+        print("{:<14} {:>6} {:>11} {:>10} {:>10}".format("stage", "count", "total s", "max s", "cpu s"))
+        for category, stats in sorted(summary["categories"].items(), key=lambda item: -item[1]["wall_seconds"]):
+            print("{:<14} {:>6} {:>11.2f} {:>10.2f} {:>10.2f}".format(
+                category, stats["count"], stats["wall_seconds"], stats["max_seconds"], stats["cpu_seconds"]))
+        print(f"Slowest {len(summary['slowest'])} spans:")
+        for record in summary["slowest"]:
+            rss = f"  peak RSS {record['max_rss_kb'] / 1024:.0f} MiB" if record.get("max_rss_kb") else ""
+            print("  {:<14} {:>9.2f} s  {}{}".format(record["category"], record["wall_seconds"], record["name"], rss))
+
+
+def start_tracing(jsonl_path=None, trace_path=None):
+    """
+    Start recording spans into a new Tracer, which is returned.
+    """
+    global _active
+    _active = Tracer(jsonl_path, trace_path)
+    return _active
+
+
+def stop_tracing():
+    """
+    Stop recording, write the Chrome trace and return the Tracer (None if tracing was off).
+    """
+    global _active
+    tracer, _active = _active, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+@contextmanager
+def span(name, category="stage", **fields):
+    """
+    Time a block of code as one span.
+
+    Yields a dict that the block may add fields to, e.g. the rusage returned
+    by run_command(). Costs almost nothing while tracing is off.
+    """
+    tracer = _active
+    if tracer is None:
+        yield fields
+        return
+    io_before = read_proc_io()
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield fields
+    finally:
+        io_after = read_proc_io()
+        record = {
+            "name": name,
+            "category": category,
+            "start": start - tracer._origin,
+            "wall_seconds": time.perf_counter() - start,
+            "cpu_seconds": time.thread_time() - cpu_start,
+            "read_bytes": io_after["read_bytes"] - io_before["read_bytes"],
+            "write_bytes": io_after["write_bytes"] - io_before["write_bytes"],
+            "thread": threading.current_thread().name,
+        }
+        record.update(fields)
+        tracer.add(record)
+
+
+def record_wait(name, queued_at, category="queue_wait"):
+    """
+    Record the time an item spent in a queue, from time.perf_counter() at put() until now.
+    """
+    tracer = _active
+    if tracer is None or queued_at is None:
+        return
+    now = time.perf_counter()
+    tracer.add({
+        "name": name,
+        "category": category,
+        "start": queued_at - tracer._origin,
+        "wall_seconds": now - queued_at,
+        "cpu_seconds": 0.0,
+        "thread": threading.current_thread().name,
+    })
+
+
+def run_command(command, **kwargs):
+    """
+    Run a command like subprocess.run(command, check=True) and also return its resource usage.
+
+    The child is reaped with os.wait4(), which gives the rusage of that child
+    alone rather than of all children together.
+
+    :return: (returncode, dict with "max_rss_kb", "child_cpu_seconds", "child_read_bytes", "child_write_bytes")
+    :raises subprocess.CalledProcessError: If the command exits non-zero
+    """
+    process = subprocess.Popen(command, **kwargs)
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    process.returncode = os.waitstatus_to_exitcode(status)
+    stats = {
+        "max_rss_kb": usage.ru_maxrss,
+        "child_cpu_seconds": usage.ru_utime + usage.ru_stime,
+        "child_read_bytes": usage.ru_inblock * 512,
+        "child_write_bytes": usage.ru_oublock * 512,
+    }
+    if process.returncode:
+        error = subprocess.CalledProcessError(process.returncode, command)
+        error.stats = stats
+        raise error
+    return process.returncode, stats
@@ -0,0 +1,188 @@
+import os
+import re
+import string
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from a3m_to_pqt import pqt_name
+from inference_worker import InferenceWorker
+from msa_scheduler import TGT_SCRIPT
+from staging import LINK_METHODS, stage_file
+from tgt_to_chai import process_fasta_files1, prepare_complex, read_fasta_records, sanitize_name, to_chai_fasta
+
+# <chain letter>:<wild-type residue><1-based position><mutant residue>, e.g. A:Y32F
+MUTATION_RE = re.compile(r"^([A-Z]):([A-Z])(\d+)([A-Z])$")
+
+
+def parse_mutations(mutation_string):
+    """
+    Parse "A:Y32F,B:N93A" into [("A", "Y", 32, "F"), ("B", "N", 93, "A")].
+
+    Chains are lettered A, B, ... in the order they appear in the parent FASTA.
+    """
+    mutations = []
+    for token in mutation_string.split(","):
+        match = MUTATION_RE.match(token.strip())
+        if not match:
+            raise ValueError(f"Invalid mutation '{token}', expected e.g. A:Y32F")
+        chain, wt, pos, mut = match.groups()
+        mutations.append((chain, wt, int(pos), mut))
+    return mutations
+
+
+def read_mutation_list(mutation_file):
+    """
+    Read a mutation list file.
+
+    Each non-empty line that does not start with '#' is either "<name> <mutations>"
+    or just "<mutations>", in which case the name is derived from the mutations.
+
+    :return: List of (variant name, parsed mutations)
+    """
+    variants = []
+    with open(mutation_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            mutation_string = fields[-1]
+            name = fields[0] if len(fields) > 1 else mutation_string.replace(":", "").replace(",", "_")
+            variants.append((sanitize_name(name), parse_mutations(mutation_string)))
+    return variants
+
+
+def apply_mutations(chains, mutations):
+    """
+    Apply parsed mutations to the parent chains.
+
+    :param chains: List of (name, sequence) of the parent complex, in FASTA order
+    :return: List of (name, sequence) of the variant
+    """
+    sequences = [list(sequence) for _, sequence in chains]
+    for chain, wt, pos, mut in mutations:
+        index = string.ascii_uppercase.index(chain)
+        if index >= len(chains):
+            raise ValueError(f"Chain {chain} does not exist; the parent has {len(chains)} chains.")
+        if not 1 <= pos <= len(sequences[index]) or chains[index][1][pos - 1] != wt:
+            raise ValueError(f"Mutation {chain}:{wt}{pos}{mut} does not match the parent sequence of {chains[index][0]}.")
+        sequences[index][pos - 1] = mut
+    return [(name, "".join(sequence)) for (name, _), sequence in zip(chains, sequences)]
+
+
+def derive_variant_pqt(parent_pqt, variant_sequence, output_dir):
+    """
+    Derive the MSA of a point mutant from the parent's .aligned.pqt.
+
+    The homologs of a point mutant are effectively those of its parent, so only
+    the query row is replaced; the file is named after the mutant's own hash as
+    chai expects.
+    """
+    table = pq.read_table(parent_pqt)
+    sequences = table.column("sequence").combine_chunks()
+    parent_query = sequences[0].as_py()
+    if len(parent_query) != len(variant_sequence):
+        raise ValueError("Only substitutions are supported; the variant length differs from the parent.")
+    sequences = pa.concat_arrays([pa.array([variant_sequence], type=pa.string()), sequences.slice(1)])
+    table = table.set_column(table.schema.get_field_index("sequence"), "sequence", sequences)
+
+    pqt_path = Path(output_dir) / pqt_name(variant_sequence)
+    # Written under a temporary name and renamed, as pqt files may be hardlinked (see staging.LINK_METHODS)
+    tmp_path = pqt_path.with_name(f".{pqt_path.name}.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, pqt_path)
+    return pqt_path
+
+
+def prepare_variants(parent_chains, parent_msa_dir, variants, variants_dir):
+    """
+    Lay out one inference job directory per variant using the parent's MSAs.
+
+    Unmutated chains share the parent's .aligned.pqt (hardlinked where possible), and
+    mutated chains get a pqt derived by derive_variant_pqt().
+
+    :param parent_chains: List of (name, sequence) of the parent complex
+    :param parent_msa_dir: Directory holding the parent's .aligned.pqt files
+    :param variants: List of (variant name, parsed mutations)
+    :param variants_dir: Directory under which <variant name>/ directories are created
+    :return: List of inference job dicts
+    """
+    jobs = []
+    for name, mutations in variants:
+        variant_chains = apply_mutations(parent_chains, mutations)
+        variant_dir = Path(variants_dir) / name
+        variant_dir.mkdir(parents=True, exist_ok=True)
+        for (_, parent_sequence), (_, sequence) in zip(parent_chains, variant_chains):
+            parent_pqt = Path(parent_msa_dir) / pqt_name(parent_sequence)
+            if sequence == parent_sequence:
+                stage_file(parent_pqt, variant_dir / parent_pqt.name, LINK_METHODS)
+            else:
+                derive_variant_pqt(parent_pqt, sequence, variant_dir)
+
+        fasta_text = "".join(f">{chain_name}\n{sequence}\n" for chain_name, sequence in variant_chains)
+        fasta_path = variant_dir / f"{name}.chai.fasta"
+        fasta_path.write_text(to_chai_fasta(fasta_text))
+        jobs.append({
+            "name": name,
+            "fasta_file": str(fasta_path),
+            "msa_directory": str(variant_dir),
+            "output_dir": str(variant_dir / "predictions"),
+        })
+    return jobs
+
+
+def run_variant_screen(parent_fasta, mutation_file, work_dir, cpu_num=8, total_cpus=None, script_path=TGT_SCRIPT,
+                       package="jackhmm", database="uniref90", iterations=3, cache=None, msa_filter=None,
+                       worker=None, supervisor=None):
+    """
+    Screen point mutants of one complex, running the MSA search for the parent only.
+
+    :param parent_fasta: FASTA file of the parent complex
+    :param mutation_file: Mutation list, see read_mutation_list()
+    :param work_dir: Directory for the parent run (<work_dir>/parent) and the variants (<work_dir>/variants)
+    :param worker: InferenceWorker to run the predictions on; one is started if omitted
+    :param supervisor: Optional supervisor.Supervisor for the parent's MSA searches
+    :return: List of inference result dicts, the parent's first
+    :raises ValueError: If the parent FASTA cannot be split (e.g. repeated chain names)
+    :raises RuntimeError: If the MSA search failed for a chain of the parent
+    """
+    variants = read_mutation_list(mutation_file)
+    parent_chains = read_fasta_records(parent_fasta)
+
+    # MSAs for the parent, exactly as for any other complex
+    parent_dir = Path(work_dir) / "parent"
+    parent_dir.mkdir(parents=True, exist_ok=True)
+    stage_file(parent_fasta, parent_dir / Path(parent_fasta).name)
+    directory_list = process_fasta_files1(str(parent_dir), cpu_num=cpu_num, package=package, database=database,
+                                          iterations=iterations, total_cpus=total_cpus, script_path=script_path,
+                                          cache=cache, msa_filter=msa_filter, supervisor=supervisor)
+    if not directory_list:
+        raise ValueError(f"The parent {parent_fasta} could not be split into chains; see the message above.")
+    try:
+        parent_job = prepare_complex(directory_list[0], cache=cache, package=package, database=database,
+                                     iterations=iterations, msa_filter=msa_filter)
+    except FileNotFoundError as e:
+        raise RuntimeError(f"No MSA for the parent {parent_fasta}: {e}") from e
+    # Variants of a chain without an MSA would have nothing to derive theirs from
+    missing = [name for name, sequence in parent_chains
+               if not (Path(parent_job["msa_directory"]) / pqt_name(sequence)).exists()]
+    if missing:
+        raise RuntimeError(f"MSA search failed for chain(s) {', '.join(missing)} of the parent {parent_fasta}.")
+
+    jobs = [parent_job] + prepare_variants(parent_chains, parent_job["msa_directory"], variants,
+                                           Path(work_dir) / "variants")
+    print(f"Prepared {len(jobs) - 1} variants of {Path(parent_fasta).stem} from the parent MSAs")
+
+    own_worker = worker is None
+    if own_worker:
+        worker = InferenceWorker()
+    try:
+        for job in jobs:
+            worker.submit(job)
+        results = sorted(worker.results(), key=lambda r: r["job_id"])
+    finally:
+        if own_worker:
+            worker.close()
+    return results
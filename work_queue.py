@@ -0,0 +1,473 @@
+"""
+Work queue on a shared filesystem, so workers on many hosts can drain one batch.
+
+There is no broker: every job is a JSON file that moves between directories
+
+    <queue_dir>/<stage>/pending/<job>.json   waiting
+                        claimed/<job>.<owner>.json   held by a worker, which touches it as a heartbeat
+                        done/<job>.json      finished, with its result
+                        failed/<job>.json    gave up after max_attempts
+
+and a worker claims a job by renaming it from pending/ to claimed/ under a
+name carrying a token of its own. rename() is atomic on a local filesystem and
+on NFS, so exactly one worker wins each job. A claimed job whose heartbeat is
+older than the lease is moved back to pending/ by whichever worker notices
+first, so the jobs of crashed hosts are picked up again; the stalled worker's
+later heartbeat, completion or failure finds its own claim file gone and
+cannot touch the claim of the job's next owner. Lease ages are measured against the filesystem's own clock
+(the mtime of a freshly touched file), so clock skew between hosts does not
+matter.
+
+Stages are "msa" (one job per chain), "prepare" (a3m -> pqt, queued when the
+last chain of a complex is done) and "inference". A job's successor is always
+queued before the job itself is completed, so a worker never sees every stage
+drained while a complex still has work ahead of it. CPU hosts run cpu workers,
+GPU hosts run inference workers:
+
+    python cli.py queue submit /shared/queue /shared/batch1 --script /home2/TGT_Package/A3M_TGT_Gen.sh
+    python cli.py queue cpu-worker /shared/queue --cpus 16          # on each CPU node
+    python cli.py queue inference-worker /shared/queue              # on each GPU node
+    python cli.py queue status /shared/queue
+"""
+import json
+import multiprocessing as mp
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from msa_scheduler import TGT_SCRIPT, find_chain_a3ms, run_msa_job, threads_for_length
+from msa_stats import LowQualityMSAError
+from supervisor import Supervisor
+from tgt_to_chai import finalize_complex, plan_fasta_files, prepare_complex
+
+STAGES = ("msa", "prepare", "inference")
+STATES = ("pending", "claimed", "done", "failed")
+CONFIG_NAME = "config.json"
+
+
+def _write_json(path, data):
+    # Written under a dot name first; listings skip dot files, and the rename publishes it whole
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    """
+    A claimed job. A background thread touches the claim file every lease_seconds / 3 until
+    the lease is completed or failed; if the file disappears, the job was reclaimed (lost).
+    """
+
+    def __init__(self, work_queue, stage, job_id, payload, path):
+        self.queue = work_queue
+        self.stage = stage
+        self.job_id = job_id
+        self.payload = payload
+        self.path = path
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, name=f"heartbeat-{job_id}", daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            try:
+                os.utime(self.path, None)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def complete(self, result=None):
+        """
+        Move the job to done/, recording result with it.
+
+        :return: False if the lease had been lost to another worker
+        """
+        self._stop.set()
+        self._thread.join()
+        try:
+            os.rename(self.path, self.queue.path(self.stage, "done", self.job_id))
+        except FileNotFoundError:
+            # Our lease expired and another worker took the job over
+            self.lost = True
+            print(f"Lease on {self.stage}/{self.job_id} was lost; its result is discarded")
+            return False
+        _write_json(self.queue.path(self.stage, "done", self.job_id),
+                    dict(self.payload, result=result, finished_by=worker_name(), finished_at=time.time()))
+        return True
+
+    def fail(self, error):
+        """
+        Return the job to pending/ for another attempt, or move it to failed/ after max_attempts.
+
+        :return: The state the job was moved to, or None if the lease had been lost
+        """
+        self._stop.set()
+        self._thread.join()
+        holding = self.queue.root / self.stage / "reclaim" / f"{self.job_id}.{uuid.uuid4().hex}"
+        try:
+            os.rename(self.path, holding)
+        except FileNotFoundError:
+            self.lost = True
+            print(f"Lease on {self.stage}/{self.job_id} was lost; its failure is discarded")
+            return None
+        payload = dict(self.payload, attempts=self.payload.get("attempts", 0) + 1, error=error)
+        state = "pending" if payload["attempts"] < self.queue.max_attempts else "failed"
+        _write_json(self.queue.path(self.stage, state, self.job_id), payload)
+        holding.unlink()
+        return state
+
+
+class WorkQueue:
+    """
+    Directory-based job queue shared by worker processes on any number of hosts; see the module docstring.
+    """
+
+    def __init__(self, root, lease_seconds=120.0, max_attempts=3):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        for stage in STAGES:
+            for state in STATES + ("reclaim",):
+                (self.root / stage / state).mkdir(parents=True, exist_ok=True)
+        (self.root / "complexes").mkdir(exist_ok=True)
+
+    def path(self, stage, state, job_id):
+        return self.root / stage / state / f"{job_id}.json"
+
+    def jobs(self, stage, state):
+        if state == "claimed":
+            return sorted(job_id for job_id, _ in self.claims(stage))
+        return sorted(name[:-5] for name in os.listdir(self.root / stage / state)
+                      if name.endswith(".json") and not name.startswith("."))
+
+    def claims(self, stage):
+        """
+        (job id, claim file path) of every claimed job of a stage; claim files are named <job>.<owner>.json.
+        """
+        claimed_dir = self.root / stage / "claimed"
+        for name in os.listdir(claimed_dir):
+            if name.endswith(".json") and not name.startswith("."):
+                yield name[:-5].rpartition(".")[0], claimed_dir / name
+
+    def counts(self, stage):
+        return {state: len(self.jobs(stage, state)) for state in STATES}
+
+    def is_drained(self, *stages):
+        return all(not self.jobs(stage, "pending") and not self.jobs(stage, "claimed") for stage in stages)
+
+    def now(self):
+        """
+        Current time according to the shared filesystem.
+        """
+        clock = self.root / ".clock"
+        clock.touch()
+        os.utime(clock, None)
+        return clock.stat().st_mtime
+
+    def put(self, stage, job_id, payload):
+        """
+        Queue a job unless a job with the same id was already queued in this stage.
+
+        :return: True if the job was queued
+        """
+        if job_id in self.jobs(stage, "claimed") or any(
+                self.path(stage, state, job_id).exists() for state in ("pending", "done", "failed")):
+            return False
+        _write_json(self.path(stage, "pending", job_id), dict(payload, job_id=job_id, attempts=0))
+        return True
+
+    def claim(self, stage):
+        """
+        Claim the first pending job of a stage, reclaiming expired leases first.
+
+        :return: Lease, or None if nothing is pending
+        """
+        self.reclaim(stage)
+        for job_id in self.jobs(stage, "pending"):
+            # Only this worker knows the token, so only it can renew, complete or fail this claim
+            claim_path = self.root / stage / "claimed" / f"{job_id}.{uuid.uuid4().hex}.json"
+            try:
+                os.rename(self.path(stage, "pending", job_id), claim_path)
+            except FileNotFoundError:
+                continue  # Another worker was faster
+            try:
+                os.utime(claim_path, None)  # The lease starts now, not when the job was queued
+                payload = json.loads(claim_path.read_text())
+            except FileNotFoundError:
+                continue  # Reclaimed in between, as its old mtime looked expired
+            return Lease(self, stage, job_id, payload, claim_path)
+        return None
+
+    def reclaim(self, stage):
+        """
+        Return claimed jobs whose heartbeat is older than the lease to pending/ (or failed/).
+
+        :return: Number of jobs reclaimed
+        """
+        reclaimed = 0
+        now = None
+        for job_id, claim_path in self.claims(stage):
+            try:
+                mtime = claim_path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            now = now or self.now()
+            if now - mtime <= self.lease_seconds:
+                continue
+            # Only the worker whose rename succeeds handles the expired job
+            holding = self.root / stage / "reclaim" / f"{job_id}.{uuid.uuid4().hex}"
+            try:
+                os.rename(claim_path, holding)
+            except FileNotFoundError:
+                continue
+            payload = json.loads(holding.read_text())
+            payload["attempts"] = payload.get("attempts", 0) + 1
+            payload["error"] = f"lease expired after {now - mtime:.0f} s"
+            state = "pending" if payload["attempts"] < self.max_attempts else "failed"
+            _write_json(self.path(stage, state, job_id), payload)
+            holding.unlink()
+            print(f"Reclaimed {stage}/{job_id} ({payload['error']}) -> {state}")
+            reclaimed += 1
+        return reclaimed
+
+    def create_marker(self, name):
+        """
+        Atomically create <queue_dir>/complexes/<name>; True for the one caller that created it.
+        """
+        try:
+            os.close(os.open(self.root / "complexes" / name, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def config(self):
+        return json.loads((self.root / CONFIG_NAME).read_text())
+
+
+def submit_batch(queue_dir, input_fasta_dir, script_path=TGT_SCRIPT, package="jackhmm", database="uniref90",
+                 iterations=3, cache_dir=None, msa_filter=None, msa_gate=None, results_dir=None, msa_timeout=None,
+                 prefilter=None, **queue_kwargs):
+    """
+    Split a batch and queue an MSA job per chain (or a prepare job for complexes that need no search).
+
+    All paths are made absolute, so workers on other hosts find them on the shared filesystem.
+
+    :param msa_timeout: Seconds an MSA search may run before the worker kills it and fails the attempt
+                        (default: the "msa" policy of supervisor.TOOL_POLICIES); failed attempts are
+                        retried by the queue, up to max_attempts
+    :param prefilter: Optional kmer_index.KmerIndex over the database; the workers open the same index and
+                      search each chain against its candidate subset only
+
+    :return: The WorkQueue
+    """
+    from msa_cache import MSACache
+
+    work_queue = WorkQueue(queue_dir, **queue_kwargs)
+    config = {
+        "script_path": script_path,
+        "package": package,
+        "database": database,
+        "iterations": iterations,
+        "cache_dir": cache_dir,
+        "msa_filter": msa_filter,
+        "msa_gate": msa_gate,
+        "results_dir": results_dir and os.path.abspath(results_dir),
+        "msa_timeout": msa_timeout,
+        "prefilter": prefilter.settings() if prefilter is not None else None,
+        "batch": os.path.basename(os.path.abspath(input_fasta_dir)),
+    }
+    _write_json(work_queue.root / CONFIG_NAME, config)
+
+    cache = MSACache(cache_dir) if cache_dir else None
+    # MSAs searched against a candidate subset must not be mistaken for full searches in the cache
+    cache_database = prefilter.label(database) if prefilter is not None else database
+    complexes = plan_fasta_files(os.path.abspath(input_fasta_dir), package=package, database=cache_database,
+                                 iterations=iterations, cache=cache, msa_filter=msa_filter)
+    queued = 0
+    for complex_info in complexes:
+        chain_ids = [f"{complex_info['name']}__{job['name']}" for job in complex_info["msa_jobs"]]
+        complex_record = {key: complex_info[key] for key in ("name", "fasta_path", "split_dir", "final_output_dir")}
+        complex_record["chain_ids"] = chain_ids
+        _write_json(work_queue.root / "complexes" / f"{complex_info['name']}.json", complex_record)
+        for job_id, job in zip(chain_ids, complex_info["msa_jobs"]):
+            queued += work_queue.put("msa", job_id, dict(job, complex=complex_info["name"]))
+        if not chain_ids:
+            _queue_prepare(work_queue, complex_info["name"])
+    print(f"Queued {queued} MSA jobs for {len(complexes)} complexes in {work_queue.root}")
+    return work_queue
+
+
+def _queue_prepare(work_queue, complex_name):
+    """
+    Queue the prepare job of a complex once all its chains are done; exactly one worker does it.
+
+    A chain counts as done once its <job>.aligned marker exists, which run_msa_lease() creates before
+    completing the lease: of two chains finishing together, the second to create its marker queues
+    the job, and does so while its own lease still keeps the msa stage from looking drained.
+    """
+    complex_record = json.loads((work_queue.root / "complexes" / f"{complex_name}.json").read_text())
+    states = [next((state for state, path in (("done", work_queue.root / "complexes" / f"{job_id}.aligned"),
+                                              ("failed", work_queue.path("msa", "failed", job_id)))
+                    if path.exists()), None)
+              for job_id in complex_record["chain_ids"]]
+    if None in states:
+        return
+    if "failed" in states:
+        if work_queue.create_marker(f"{complex_name}.failed"):
+            print(f"Complex {complex_name} failed: an MSA job gave up")
+        return
+    if work_queue.create_marker(f"{complex_name}.ready"):
+        work_queue.put("prepare", complex_name, complex_record)
+
+
+def run_msa_lease(work_queue, lease, config, cpus, supervisor=None, prefilter=None):
+    job = lease.payload
+    result = run_msa_job(job, cpus, config["script_path"], config["package"], config["database"],
+                         config["iterations"], prefilter=prefilter, supervisor=supervisor)
+    if result["status"] == "ok" and find_chain_a3ms(job):
+        work_queue.create_marker(f"{lease.job_id}.aligned")
+        _queue_prepare(work_queue, job["complex"])
+        lease.complete(result)
+    elif lease.fail(result["error"] or "no .a3m produced") == "failed":
+        # A complex with a failed chain needs no further work; this only reports it
+        _queue_prepare(work_queue, job["complex"])
+
+
+def run_prepare_lease(work_queue, lease, config, prefilter=None):
+    from msa_cache import MSACache
+
+    complex_info = lease.payload
+    cache = MSACache(config["cache_dir"]) if config["cache_dir"] else None
+    database = prefilter.label(config["database"]) if prefilter is not None else config["database"]
+    try:
+        job = prepare_complex(finalize_complex(complex_info), cache=cache, package=config["package"],
+                              database=database, iterations=config["iterations"],
+                              msa_filter=config["msa_filter"], msa_gate=config["msa_gate"])
+    except LowQualityMSAError as e:
+        lease.complete({"status": "skipped", "error": str(e)})
+        return
+    except (OSError, RuntimeError, ValueError) as e:
+        lease.fail(str(e))
+        return
+    # Queued before the lease is completed, or an inference worker could see every stage drained in between
+    work_queue.put("inference", complex_info["name"], job)
+    lease.complete({"status": "ok", "job": job})
+
+
+def cpu_worker(queue_dir, cpus=8, poll_interval=5.0, exit_when_drained=True, **queue_kwargs):
+    """
+    Run prepare and MSA jobs until the queue has none left.
+
+    Prepare jobs go first, so complexes whose chains are aligned reach the GPUs early.
+    """
+    work_queue = WorkQueue(queue_dir, **queue_kwargs)
+    config = work_queue.config()
+    # The queue retries failed searches itself, possibly on another host
+    policy = {"retries": 0}
+    if config.get("msa_timeout") is not None:
+        policy["timeout"] = config["msa_timeout"]
+    prefilter = None
+    if config.get("prefilter"):
+        from kmer_index import KmerIndex
+
+        prefilter = KmerIndex(**config["prefilter"])
+    print(f"CPU worker {worker_name()} on {work_queue.root}")
+    with Supervisor(policies={"msa": policy}) as supervisor:
+        while True:
+            lease = work_queue.claim("prepare")
+            if lease is not None:
+                run_prepare_lease(work_queue, lease, config, prefilter)
+                continue
+            lease = work_queue.claim("msa")
+            if lease is not None:
+                run_msa_lease(work_queue, lease, config, threads_for_length(lease.payload["length"], cpus),
+                              supervisor, prefilter)
+                continue
+            if exit_when_drained and work_queue.is_drained("msa", "prepare"):
+                return
+            time.sleep(poll_interval)
+
+
+def inference_worker(queue_dir, worker=None, poll_interval=5.0, exit_when_drained=True, **queue_kwargs):
+    """
+    Run inference jobs until the MSA and prepare stages are drained and no inference job is left.
+
+    :param worker: InferenceWorker or InferenceDispatcher; an InferenceWorker is started if omitted
+    """
+    from inference_worker import InferenceWorker
+    from results_store import ResultsStore
+
+    work_queue = WorkQueue(queue_dir, **queue_kwargs)
+    config = work_queue.config()
+    results_store = ResultsStore(config["results_dir"]) if config["results_dir"] else None
+    own_worker = worker is None
+    worker = worker or InferenceWorker()
+    print(f"Inference worker {worker_name()} on {work_queue.root}")
+    try:
+        while True:
+            lease = work_queue.claim("inference")
+            if lease is None:
+                if exit_when_drained and work_queue.is_drained("msa", "prepare", "inference"):
+                    return
+                time.sleep(poll_interval)
+                continue
+            result = worker.run(dict(lease.payload))
+            if result["status"] == "ok":
+                if lease.complete(result) and results_store is not None:
+                    results_store.append(lease.job_id, result, batch=config["batch"])
+            else:
+                lease.fail(result["error"])
+    finally:
+        if own_worker:
+            worker.close()
+
+
+def print_status(work_queue):
+    print("{:<10} {:>8} {:>8} {:>8} {:>8}".format("stage", *STATES))
+    for stage in STAGES:
+        counts = work_queue.counts(stage)
+        print("{:<10} {:>8} {:>8} {:>8} {:>8}".format(stage, *(counts[state] for state in STATES)))
+    for stage in STAGES:
+        for job_id in work_queue.jobs(stage, "failed"):
+            error = json.loads(work_queue.path(stage, "failed", job_id).read_text()).get("error") or ""
+            print(f"  FAILED {stage}/{job_id}: {error.strip().splitlines()[-1] if error.strip() else ''}")
+
+
+def run_local(queue_dir, cpu_workers=2, inference_workers=1, cpus=2, poll_interval=0.2, **queue_kwargs):
+    """
+    Drain a submitted queue with worker processes on this host, as separate hosts would.
+
+    :return: Dict of stage -> state counts once every worker has exited
+    """
+    ctx = mp.get_context("spawn")
+    processes = [ctx.Process(target=cpu_worker, args=(queue_dir, cpus, poll_interval), kwargs=queue_kwargs,
+                             name=f"cpu-{i}") for i in range(cpu_workers)]
+    processes += [ctx.Process(target=inference_worker, args=(queue_dir, None, poll_interval), kwargs=queue_kwargs,
+                              name=f"inference-{i}") for i in range(inference_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    work_queue = WorkQueue(queue_dir, **queue_kwargs)
+    print_status(work_queue)
+    return {stage: work_queue.counts(stage) for stage in STAGES}
+
+
+def main():
+    # Same as `python cli.py queue ...`, where the options are defined
+    from cli import main as cli_main
+
+    cli_main(["queue"] + sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()